@@ -38,6 +38,9 @@ ANOMALY_MAP = {
     'messages': 30
 }
 
+# number of functions (e.g. logins) waiting for a process of the cpu pool
+CPU_POOL_BACKLOG_THRESHOLD = 8
+
 
 def update_AnomalyQ(event_matrix, alarm_level):
     State.RecentAnomaliesQ.update({
@@ -181,6 +184,11 @@ class AlarmClass(object):
                               current_event_matrix[event_name],
                               threshold, self.number_of_anomalies)
 
+        cpu_pool_backlog = State.cpu_pool.get_backlog()
+        if cpu_pool_backlog > CPU_POOL_BACKLOG_THRESHOLD:
+            current_event_matrix['cpu_pool_backlog'] = cpu_pool_backlog
+            self.number_of_anomalies += 1
+
         previous_activity_sl = self.stress_levels['activity']
 
         # Behavior: once the activity has reach a peek, the stress level
@@ -306,7 +314,7 @@ class AlarmClass(object):
                      old_accept_submissions, accept_submissions)
 
             # Must invalidate the cache here becuase accept_subs served in /public has changed
-            ApiCache.invalidate()
+            ApiCache.invalidate('node')
 
 # Alarm is a singleton class exported once
 Alarm = AlarmClass()
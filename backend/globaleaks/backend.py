@@ -8,17 +8,22 @@ import traceback
 from datetime import datetime
 
 from twisted.application import service
-from twisted.internet import reactor, defer
+from twisted.internet import reactor, defer, threads
 from twisted.python import log as txlog, logfile as txlogfile
 from twisted.web.http import _escape
 from twisted.web.server import Site
 
 from globaleaks.state import State
+from globaleaks.orm import close_store_pools
 from globaleaks.db import init_db, update_db, \
     sync_refresh_memory_variables, sync_clean_untracked_files
 from globaleaks.rest.api import APIResourceWrapper
+from globaleaks.security import PGPKeyring
 from globaleaks.settings import Settings
+from globaleaks.utils.assets import AssetsManifest
+from globaleaks.utils.multipart import StreamingRequest
 from globaleaks.utils.process import disable_swap
+from globaleaks.utils.smtppool import SMTPPool
 from globaleaks.utils.sock import listen_tcp_on_sock, reserve_port_for_ip
 from globaleaks.utils.utility import log, timedelta_to_milliseconds, GLLogObserver, deferred_sleep
 from globaleaks.workers.supervisor import ProcessSupervisor
@@ -54,7 +59,7 @@ class Service(service.Service):
         self.state = State
 
         self.arw = APIResourceWrapper()
-        self.api_factory = Site(self.arw, logFormatter=timedLogFormatter)
+        self.api_factory = Site(self.arw, requestFactory=StreamingRequest, logFormatter=timedLogFormatter)
 
     def startService(self):
         mask = 0
@@ -93,6 +98,11 @@ class Service(service.Service):
     def shutdown(self):
         def _shutdown(_):
             self.state.orm_tp.stop()
+            self.state.orm_ro_tp.stop()
+            self.state.cpu_pool.stop()
+            SMTPPool.close()
+            close_store_pools()
+            PGPKeyring.reset()
 
         d = defer.Deferred()
         d.addBoth(_shutdown)
@@ -130,6 +140,9 @@ class Service(service.Service):
         return defer.DeferredList(deferred_list)
 
     def _deferred_start(self):
+        # the pool processes are forked before any database connection is opened
+        self.state.cpu_pool.start(Settings.cpu_pool_processes, Settings.cpu_pool_timeout)
+
         ret = update_db()
 
         if ret == -1:
@@ -143,12 +156,16 @@ class Service(service.Service):
         sync_refresh_memory_variables()
 
         self.state.orm_tp.start()
+        self.state.orm_ro_tp.adjustPoolsize(1, Settings.orm_ro_threads)
+        self.state.orm_ro_tp.start()
 
         reactor.addSystemEventTrigger('before', 'shutdown', self.shutdown)
 
         for sock in self.state.http_socks:
             listen_tcp_on_sock(reactor, sock.fileno(), self.api_factory)
 
+        threads.deferToThread(AssetsManifest.load, Settings.client_path)
+
         self.state.process_supervisor = ProcessSupervisor(self.state.https_socks,
                                                           '127.0.0.1',
                                                           8082)
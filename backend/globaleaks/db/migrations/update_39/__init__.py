@@ -0,0 +1,11 @@
+# -*- coding: utf-8
+from globaleaks.db.migrations.update import MigrationBase
+
+
+class MigrationScript(MigrationBase):
+    """
+    The schema is left untouched by this migration; the new database is
+    created from sqlite.sql and gets the secondary indexes defined there on
+    the foreign keys and flags used by the scheduler and the tip handlers.
+    """
+    pass
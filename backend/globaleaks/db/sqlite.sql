@@ -414,3 +414,25 @@ CREATE TABLE customtexts (
     texts BLOB NOT NULL,
     PRIMARY KEY (lang)
 );
+
+CREATE INDEX idx_comment_internaltip_id ON comment (internaltip_id);
+CREATE INDEX idx_comment_new ON comment (new);
+CREATE INDEX idx_message_receivertip_id ON message (receivertip_id);
+CREATE INDEX idx_message_new ON message (new);
+CREATE INDEX idx_internalfile_internaltip_id ON internalfile (internaltip_id);
+CREATE INDEX idx_internalfile_new ON internalfile (new);
+CREATE INDEX idx_receiverfile_internalfile_id ON receiverfile (internalfile_id);
+CREATE INDEX idx_receiverfile_receivertip_id ON receiverfile (receivertip_id);
+CREATE INDEX idx_receiverfile_new ON receiverfile (new);
+CREATE INDEX idx_whistleblowerfile_receivertip_id ON whistleblowerfile (receivertip_id);
+CREATE INDEX idx_internaltip_expiration_date ON internaltip (expiration_date);
+CREATE INDEX idx_internaltip_questionnaire_hash ON internaltip (questionnaire_hash);
+CREATE INDEX idx_identityaccessrequest_receivertip_id ON identityaccessrequest (receivertip_id);
+CREATE INDEX idx_mail_processing_attempts ON mail (processing_attempts);
+CREATE INDEX idx_receivertip_internaltip_id ON receivertip (internaltip_id);
+CREATE INDEX idx_receivertip_receiver_id ON receivertip (receiver_id);
+CREATE INDEX idx_receivertip_new ON receivertip (new);
+CREATE INDEX idx_stats_start ON stats (start);
+CREATE INDEX idx_fieldanswer_internaltip_id ON fieldanswer (internaltip_id);
+CREATE INDEX idx_fieldanswer_fieldanswergroup_id ON fieldanswer (fieldanswergroup_id);
+CREATE INDEX idx_fieldanswergroup_fieldanswer_id ON fieldanswergroup (fieldanswer_id);
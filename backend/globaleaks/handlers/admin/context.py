@@ -163,7 +163,8 @@ def update_context(store, context_id, request, language):
 class ContextsCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'contexts'}
+    invalidate_cache = {'contexts'}
 
     def get(self):
         """
@@ -189,7 +190,7 @@ class ContextsCollection(BaseHandler):
 
 class ContextInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'contexts'}
 
     def put(self, context_id):
         """
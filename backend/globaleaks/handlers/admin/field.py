@@ -228,7 +228,8 @@ def get_fieldtemplate_list(store, language):
 class FieldTemplatesCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'questionnaires'}
+    invalidate_cache = {'questionnaires'}
 
     def get(self):
         """
@@ -252,7 +253,7 @@ class FieldTemplatesCollection(BaseHandler):
 
 class FieldTemplateInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'questionnaires'}
 
     def put(self, field_id):
         """
@@ -286,7 +287,8 @@ class FieldsCollection(BaseHandler):
     """
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'questionnaires'}
+    invalidate_cache = {'questionnaires'}
 
     def post(self):
         """
@@ -310,7 +312,7 @@ class FieldInstance(BaseHandler):
     /admin/fields
     """
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'questionnaires'}
 
     def put(self, field_id):
         """
@@ -43,7 +43,7 @@ def get_file(store, key):
 
 class FileInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'node'}
 
     key = None
 
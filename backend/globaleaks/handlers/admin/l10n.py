@@ -31,7 +31,7 @@ def update(store, lang, request):
 
 class AdminL10NHandler(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'l10n'}
 
     def get(self, lang):
         return get(lang)
@@ -9,12 +9,19 @@ import base64
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.orm import transact
+from globaleaks.rest.apicache import ApiCache
 
 model_map = {
   'users': models.User,
   'contexts': models.Context
 }
 
+# the cached resources affected by a change of the picture of the model
+model_cache_tags = {
+  'users': {'users', 'receivers'},
+  'contexts': {'contexts'}
+}
+
 
 def db_get_model_img(store, model, obj_id):
     obj = store.find(model, model.id == obj_id).one()
@@ -52,7 +59,6 @@ def del_model_img(store, model, obj_id):
 
 class ModelImgInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
 
     def post(self, obj_key, obj_id):
         uploaded_file = self.get_file_upload()
@@ -64,7 +70,11 @@ class ModelImgInstance(BaseHandler):
         # pylint: disable=assignment-from-no-return
         d = add_model_img(model_map[obj_key], obj_id, uploaded_file['body'].read())
         d.addBoth(lambda ignore: uploaded_file['body'].close)
+        d.addCallback(lambda ignore: ApiCache.invalidate(model_cache_tags[obj_key]))
         return d
 
     def delete(self, obj_key, obj_id):
-        return del_model_img(model_map[obj_key], obj_id)
+        # pylint: disable=assignment-from-no-return
+        d = del_model_img(model_map[obj_key], obj_id)
+        d.addCallback(lambda ignore: ApiCache.invalidate(model_cache_tags[obj_key]))
+        return d
@@ -110,6 +110,7 @@ def update_node(*args):
 class NodeInstance(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
+    cache_tags = {'node', 'contexts'}
     invalidate_cache = True
 
     def get(self):
@@ -65,6 +65,7 @@ class NotificationInstance(BaseHandler):
     Manage Notification settings (account details and template)
     """
     check_roles = 'admin'
+    invalidate_cache = {'notification'}
 
     def get(self):
         """
@@ -110,7 +110,8 @@ def update_questionnaire(store, questionnaire_id, request, language):
 class QuestionnairesCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'questionnaires'}
+    invalidate_cache = {'questionnaires'}
 
     def get(self):
         """
@@ -140,7 +141,7 @@ class QuestionnairesCollection(BaseHandler):
 
 class QuestionnaireInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'questionnaires'}
 
     def put(self, questionnaire_id):
         """
@@ -57,6 +57,7 @@ def update_receiver(store, receiver_id, request, language):
 class ReceiversCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
+    cache_tags = {'receivers'}
 
     def get(self):
         """
@@ -71,7 +72,7 @@ class ReceiversCollection(BaseHandler):
 
 class ReceiverInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'receivers'}
 
     def put(self, receiver_id):
         """
@@ -32,7 +32,8 @@ def create_shorturl(store, request):
 class ShortURLCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'shorturls'}
+    invalidate_cache = {'shorturls'}
 
     def get(self):
         """
@@ -51,6 +52,7 @@ class ShortURLCollection(BaseHandler):
 
 class ShortURLInstance(BaseHandler):
     check_roles = 'admin'
+    invalidate_cache = {'shorturls'}
 
     def delete(self, shorturl_id):
         """
@@ -12,8 +12,15 @@ from storm.expr import Desc, And
 from globaleaks.state import State
 from globaleaks.event import EventTrackQueue, events_monitored
 from globaleaks.handlers.base import BaseHandler
+from globaleaks.handlers.submission import ArchivedSchemaCache
 from globaleaks.models import Stats, Anomalies
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro, get_store_pools_stats
+from globaleaks.rest.apicache import ApiCache
+from globaleaks.security import PGPKeyring
+from globaleaks.utils.assets import AssetsManifest
+from globaleaks.utils.multipart import UploadsMonitor
+from globaleaks.utils.smtppool import SMTPPool
+from globaleaks.utils.templating import TemplateCache
 from globaleaks.utils.utility import datetime_to_ISO8601, datetime_now, \
     iso_to_gregorian
 
@@ -30,7 +37,7 @@ def weekmap_to_heatmap(week_map):
     return retlist
 
 
-@transact
+@transact_ro
 def get_stats(store, week_delta):
     """
     :param week_delta: commonly is 0, mean that you're taking this
@@ -201,3 +208,25 @@ class JobsTiming(BaseHandler):
             })
 
         return response
+
+
+class Metrics(BaseHandler):
+    """
+    This handler returns the performance counters of the backend subsystems
+    """
+    check_roles = 'admin'
+
+    def get(self):
+        return {
+            'orm': get_store_pools_stats(),
+            'cpu_pool': State.cpu_pool.get_stats(),
+            'apicache': ApiCache.get_stats(),
+            'pgp_keyring': PGPKeyring.get_stats(),
+            'archived_schema_cache': ArchivedSchemaCache.get_stats(),
+            'assets': AssetsManifest.get_stats(),
+            'templates': TemplateCache.get_stats(),
+            'smtp_pool': SMTPPool.get_stats(),
+            'uploads': UploadsMonitor.get_stats(),
+            'https_proxy': State.process_supervisor.get_stats(),
+            'jobs': {job.name: job.metrics for job in State.jobs if job.metrics is not None}
+        }
@@ -75,7 +75,8 @@ class StepCollection(BaseHandler):
     """
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'questionnaires'}
+    invalidate_cache = {'questionnaires'}
 
     def post(self):
         """
@@ -98,7 +99,7 @@ class StepInstance(BaseHandler):
     /admin/step
     """
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'questionnaires'}
 
     def put(self, step_id):
         """
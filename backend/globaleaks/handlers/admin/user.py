@@ -209,7 +209,8 @@ def get_user_list(store, language):
 class UsersCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'users'}
+    invalidate_cache = {'users', 'receivers', 'contexts'}
 
     def get(self):
         """
@@ -237,7 +238,7 @@ class UsersCollection(BaseHandler):
 
 class UserInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'users', 'receivers', 'contexts'}
 
     def put(self, user_id):
         """
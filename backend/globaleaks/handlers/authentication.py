@@ -13,7 +13,7 @@ from globaleaks import security
 from globaleaks.handlers.base import BaseHandler, Sessions, new_session
 from globaleaks.models import User
 from globaleaks.models import WhistleblowerTip
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import errors, requests
 from globaleaks.settings import Settings
 from globaleaks.state import State
@@ -37,7 +37,9 @@ def random_login_delay():
            | x > 42          | 42             |
             ----------------------------------
     """
-    failed_attempts = Settings.failed_login_attempts
+    # the logins waiting for the key derivation are accounted as failures
+    # in order to slow down the bursts of login attempts
+    failed_attempts = Settings.failed_login_attempts + State.cpu_pool.get_backlog()
 
     if failed_attempts >= 5:
         n = failed_attempts * failed_attempts
@@ -50,18 +52,19 @@ def random_login_delay():
     return 0
 
 
+def db_get_wbtip_by_receipt_hash(store, receipt_hash):
+    return store.find(WhistleblowerTip,
+                     WhistleblowerTip.receipt_hash == unicode(receipt_hash)).one()
+
+
 def db_get_wbtip_by_receipt(store, receipt):
     hashed_receipt = security.hash_password(receipt, State.tenant_cache[1].private.receipt_salt)
-    return store.find(WhistleblowerTip,
-                     WhistleblowerTip.receipt_hash == unicode(hashed_receipt)).one()
+    return db_get_wbtip_by_receipt_hash(store, hashed_receipt)
 
 
 @transact
-def login_whistleblower(store, receipt, client_using_tor):
-    """
-    login_whistleblower returns the WhistleblowerTip.id
-    """
-    wbtip = db_get_wbtip_by_receipt(store, receipt)
+def db_login_whistleblower(store, receipt_hash, client_using_tor):
+    wbtip = db_get_wbtip_by_receipt_hash(store, receipt_hash)
     if not wbtip:
         log.debug("Whistleblower login: Invalid receipt")
         Settings.failed_login_attempts += 1
@@ -76,26 +79,80 @@ def login_whistleblower(store, receipt, client_using_tor):
     return wbtip.id
 
 
-@transact
-def login(store, username, password, client_using_tor):
+@inlineCallbacks
+def login_whistleblower(receipt, client_using_tor):
     """
-    login returns a tuple (user_id, state, pcn)
+    login_whistleblower returns the WhistleblowerTip.id
+
+    The receipt is hashed on the cpu pool before accessing the database.
     """
+    receipt_hash = yield State.cpu_pool.run(security.hash_password,
+                                            receipt,
+                                            State.tenant_cache[1].private.receipt_salt)
+
+    wbtip_id = yield db_login_whistleblower(receipt_hash, client_using_tor)
+
+    returnValue(wbtip_id)
+
+
+@transact_ro
+def get_user_credentials(store, username):
     user = store.find(User, And(User.username == username,
                                 User.state != u'disabled')).one()
 
-    if not user or not security.check_password(password, user.salt, user.password):
+    if not user:
+        return None
+
+    return {
+        'id': user.id,
+        'salt': user.salt,
+        'password': user.password,
+        'role': user.role
+    }
+
+
+@transact
+def db_login(store, user_id, password):
+    # the user could have been disabled or its password could have been
+    # changed while the credentials were verified out of the transaction
+    user = store.find(User, And(User.id == user_id,
+                                User.password == password,
+                                User.state != u'disabled')).one()
+    if not user:
+        log.debug("Login: Invalid credentials")
+        raise errors.InvalidAuthentication
+
+    log.debug("Login: Success (%s)" % user.role)
+    user.last_login = datetime_now()
+    return user.id, user.state, user.role, user.password_change_needed
+
+
+@inlineCallbacks
+def login(username, password, client_using_tor):
+    """
+    login returns a tuple (user_id, state, pcn)
+
+    The credentials are fetched from the database and then verified on the
+    cpu pool so that the key derivation does not hold the ORM thread.
+    """
+    user = yield get_user_credentials(username)
+
+    valid = False
+    if user is not None:
+        valid = yield State.cpu_pool.run(security.check_password, password, user['salt'], user['password'])
+
+    if not valid:
         log.debug("Login: Invalid credentials")
         Settings.failed_login_attempts += 1
         raise errors.InvalidAuthentication
 
-    if not client_using_tor and not State.tenant_cache[1].accept_tor2web_access[user.role]:
-        log.err("Denied login request over Web for role '%s'" % user.role)
+    if not client_using_tor and not State.tenant_cache[1].accept_tor2web_access[user['role']]:
+        log.err("Denied login request over Web for role '%s'" % user['role'])
         raise errors.TorNetworkRequired
 
-    log.debug("Login: Success (%s)" % user.role)
-    user.last_login = datetime_now()
-    return user.id, user.state, user.role, user.password_change_needed
+    ret = yield db_login(user['id'], user['password'])
+
+    returnValue(ret)
 
 
 class AuthenticationHandler(BaseHandler):
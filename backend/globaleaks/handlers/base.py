@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 import base64
 import collections
-import json
 import mimetypes
 import os
 import re
@@ -10,31 +9,63 @@ from datetime import datetime
 
 from cryptography.hazmat.primitives import constant_time
 
-from twisted.internet import defer
+from twisted.internet import defer, tcp
 from twisted.internet.defer import inlineCallbacks
+from twisted.web.http import datetimeToString
 
 from globaleaks.event import track_handler
-from globaleaks.rest import errors, requests
-from globaleaks.security import SecureTemporaryFile, directory_traversal_check, generateRandomKey, sha512
+from globaleaks.rest import errors, requests, validators
+from globaleaks.rest.codec import codec
+from globaleaks.security import directory_traversal_check, generateRandomKey, sha512
 from globaleaks.settings import Settings
 from globaleaks.transactions import schedule_email_for_all_admins
+from globaleaks.utils.assets import AssetsManifest
 from globaleaks.utils.mailutils import schedule_exception_email
+from globaleaks.utils.multipart import Uploads, get_file_upload
+from globaleaks.utils.sock import sendfile, sendfile_available
 from globaleaks.utils.tempdict import TempDict
 from globaleaks.utils.utility import log, deferred_sleep
 
 HANDLER_EXEC_TIME_THRESHOLD = 120
 
-Uploads = TempDict(timeout=60*HANDLER_EXEC_TIME_THRESHOLD)
+# https://tools.ietf.org/html/rfc7233#section-2.1
+byte_range_regexp = re.compile(r'^bytes=(\d*)-(\d*)$')
 
 
 class SessionsFactory(TempDict):
-    """Extends TempDict to provide session management functions ontop of temp session keys"""
+    """
+    Extends TempDict to provide session management functions ontop of temp session keys
+
+    The ids of the sessions are indexed by user in order to revoke the
+    sessions of a user without scanning all the sessions.
+    """
+    def __init__(self, *args, **kwargs):
+        self.user_sessions = {}
+        TempDict.__init__(self, *args, **kwargs)
+
+    def set(self, key, session):
+        TempDict.set(self, key, session)
+        self.user_sessions.setdefault(session.user_id, set()).add(key)
+
+    def __delitem__(self, key):
+        user_id = self[key].user_id
+        TempDict.__delitem__(self, key)
+
+        session_ids = self.user_sessions.get(user_id)
+        if session_ids is not None:
+            session_ids.discard(key)
+            if not session_ids:
+                del self.user_sessions[user_id]
+
+    def clear(self):
+        TempDict.clear(self)
+        self.user_sessions.clear()
 
     def revoke_all_sessions(self, user_id):
-        for other_session in Sessions.values():
-            if other_session.user_id == user_id:
+        for session_id in list(self.user_sessions.get(user_id, ())):
+            if session_id in self and self[session_id].user_id == user_id:
                 log.debug("Revoking old session for %s", user_id)
-                Sessions.delete(other_session.id)
+                self.delete(session_id)
 
 
 Sessions = SessionsFactory(timeout=Settings.authentication_lifetime)
@@ -95,19 +126,34 @@ class StaticFileProducer(object):
     """
     Streaming producer for files
 
+    The file is copied to the socket with sendfile(2) when the request is
+    served on a plain TCP connection; otherwise it is read in chunks whose
+    size is doubled at every write, as long as the transport keeps up with
+    them, up to Settings.file_chunk_max_size.
+
     @ivar request: The L{IRequest} to write the contents of the file to.
     @ivar fileObject: The file the contents of which to write to the request.
     """
-    bufferSize = Settings.file_chunk_size
-
-    def __init__(self, request, filePath):
+    def __init__(self, request, filePath, offset=0, size=None):
         self.finish = defer.Deferred()
         self.request = request
-        self.fileSize = os.stat(filePath).st_size
         self.fileObject = open(filePath, "rb")
-        self.bytesWritten = 0
+        self.offset = offset
+        self.remaining = size if size is not None else os.fstat(self.fileObject.fileno()).st_size - offset
+        self.bufferSize = Settings.file_chunk_size
+        self.transport = None
 
     def start(self):
+        self.fileObject.seek(self.offset)
+
+        transport = getattr(self.request, 'transport', None)
+        if isinstance(transport, tcp.Connection) and sendfile_available() and \
+           self.request.responseHeaders.hasHeader(b'content-length'):
+            # write the headers that are going to be sent before the file
+            self.request.write(b'')
+            if not self.request.chunked:
+                self.transport = transport
+
         self.request.registerProducer(self, False)
         return self.finish
 
@@ -116,28 +162,59 @@ class StaticFileProducer(object):
             return
 
         try:
-            data = self.fileObject.read(self.bufferSize)
-            if data:
-                self.bytesWritten += len(data)
-                self.request.write(data)
+            if self.remaining > 0:
+                if self.transport is not None:
+                    self.send_file()
+                else:
+                    self.send_chunk()
 
-            if self.bytesWritten == self.fileSize:
+            if self.remaining <= 0:
                 self.stopProducing()
         except:
             self.stopProducing()
             raise
 
+    def send_chunk(self):
+        data = self.fileObject.read(min(self.bufferSize, self.remaining))
+        if not data:
+            self.remaining = 0
+            return
+
+        self.remaining -= len(data)
+        self.request.write(data)
+
+        self.bufferSize = min(self.bufferSize * 2, Settings.file_chunk_max_size)
+
+    def send_file(self):
+        if self.transport.dataBuffer or self.transport._tempDataLen:
+            # the producer is resumed once the data buffered by the transport is sent
+            return
+
+        n = sendfile(self.transport.fileno(), self.fileObject.fileno(), self.offset, self.remaining)
+        if n == 0:
+            raise IOError("Unexpected end of file %s" % self.fileObject.name)
+
+        if n is not None:
+            self.offset += n
+            self.remaining -= n
+            self.request.sentLength += n
+
+        if self.remaining > 0:
+            # the producer is resumed when the socket is writable again
+            self.transport.startWriting()
+
     def stopProducing(self):
         if self.request is not None:
             self.fileObject.close()
             self.request.unregisterProducer()
             self.request.finish()
             self.request = None
+            self.transport = None
             self.finish.callback(None)
 
 
 class Session(object):
-    expireCall = None # attached to object by tempDict
+    __slots__ = ('id', 'user_id', 'user_role', 'user_status')
 
     def __init__(self, user_id, user_role, user_status):
         self.id = generateRandomKey(42)
@@ -146,10 +223,10 @@ class Session(object):
         self.user_status = user_status
 
     def getTime(self):
-        return self.expireCall.getTime()
+        return Sessions.get_expiration(self.id)
 
     def __repr__(self):
-        return "%s %s expire in %s" % (self.user_role, self.user_id, self.expireCall)
+        return "%s %s expire in %s" % (self.user_role, self.user_id, self.getTime())
 
 
 def new_session(user_id, user_role, user_status):
@@ -162,6 +239,7 @@ class BaseHandler(object):
     handler_exec_time_threshold = HANDLER_EXEC_TIME_THRESHOLD
     uniform_answer_time = False
     cache_resource = False
+    cache_tags = set()
     invalidate_cache = False
     bypass_basic_auth = False
 
@@ -367,11 +445,11 @@ class BaseHandler(object):
     @staticmethod
     def validate_message(message, message_template):
         try:
-            jmessage = json.loads(message)
+            jmessage = codec.loads(message)
         except ValueError:
             raise errors.InvalidInputFormat("Invalid JSON format")
 
-        if BaseHandler.validate_jmessage(jmessage, message_template):
+        if validators.get_validator(message_template)(jmessage):
             return jmessage
 
         raise errors.InvalidInputFormat("Unexpected condition!?")
@@ -389,7 +467,7 @@ class BaseHandler(object):
         if mime_type:
             self.request.setHeader("Content-Type", mime_type)
 
-        return StaticFileProducer(self.request, filepath).start()
+        return self.serve_file(filepath)
 
     def force_file_download(self, filename, filepath):
         if not os.path.exists(filepath) or not os.path.isfile(filepath):
@@ -399,7 +477,70 @@ class BaseHandler(object):
         self.request.setHeader('Content-Type', 'application/octet-stream')
         self.request.setHeader('Content-Disposition', 'attachment; filename=\"%s\"' % filename)
 
-        return StaticFileProducer(self.request, filepath).start()
+        return self.serve_file(filepath)
+
+    def get_byte_range(self, size, last_modified):
+        """
+        Parse the Range header of the request; only single ranges are supported
+
+        @return: a tuple (first, last) with the bytes requested, None when
+            the whole file should be sent or False if the range is not
+            satisfiable
+        """
+        header = self.request.getHeader(b'range')
+        if header is None or size == 0:
+            return None
+
+        if_range = self.request.getHeader(b'if-range')
+        if if_range is not None and if_range != last_modified:
+            return None
+
+        match = byte_range_regexp.match(header.replace(b' ', b''))
+        if match is None or match.groups() == ('', ''):
+            return None
+
+        first, last = match.groups()
+        if not first:
+            # suffix range: the last bytes of the file
+            suffix = int(last)
+            if not suffix:
+                return False
+
+            return max(0, size - suffix), size - 1
+
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+        if first > last:
+            return None if first < size else False
+
+        return first, last
+
+    def serve_file(self, filepath):
+        """
+        Send a file, or the part of it requested with a Range header
+        """
+        stat = os.stat(filepath)
+        last_modified = datetimeToString(stat.st_mtime)
+        first, length = 0, stat.st_size
+
+        self.request.setHeader(b'accept-ranges', b'bytes')
+        self.request.setHeader(b'last-modified', last_modified)
+
+        byte_range = self.get_byte_range(stat.st_size, last_modified)
+        if byte_range is False:
+            self.request.setResponseCode(416)
+            self.request.setHeader(b'content-range', b'bytes */%d' % stat.st_size)
+            return
+
+        if byte_range is not None:
+            first, last = byte_range
+            length = last - first + 1
+            self.request.setResponseCode(206)
+            self.request.setHeader(b'content-range', b'bytes %d-%d/%d' % (first, last, stat.st_size))
+
+        self.request.setHeader(b'content-length', b'%d' % length)
+
+        return StaticFileProducer(self.request, filepath, first, length).start()
 
     @property
     def current_user(self):
@@ -436,39 +577,22 @@ class BaseHandler(object):
         return Sessions.get(session_id)
 
     def get_file_upload(self):
-        if 'flowFilename' not in self.request.args:
-            return None
-
-        total_file_size = int(self.request.args['flowTotalSize'][0])
-        flow_identifier = self.request.args['flowIdentifier'][0]
-
-        chunk_size = len(self.request.args['file'][0])
-        if ((chunk_size / (1024 * 1024)) > self.state.tenant_cache[1].maximum_filesize or
-            (total_file_size / (1024 * 1024)) > self.state.tenant_cache[1].maximum_filesize):
-            log.err("File upload request rejected: file too big")
-            raise errors.FileTooBig(self.state.tenant_cache[1].maximum_filesize)
-
-        if flow_identifier not in Uploads:
-            Uploads.set(flow_identifier, SecureTemporaryFile(Settings.tmp_upload_path))
-
-        f = Uploads.get(flow_identifier)
-        f.write(self.request.args['file'][0])
+        return get_file_upload(self.request)
 
-        if self.request.args['flowChunkNumber'][0] != self.request.args['flowTotalChunks'][0]:
-            return None
-
-        mime_type, encoding = mimetypes.guess_type(self.request.args['flowFilename'][0])
-        if mime_type is None:
-            mime_type = 'application/octet-stream'
+    def get_file_upload_status(self):
+        """
+        Implements the chunk verification of flow.js (testChunks) answering
+        with 200 to the chunks already received and with 204 to the others
+        """
+        try:
+            chunk_number = int(self.request.args['flowChunkNumber'][0])
+            flow_identifier = self.request.args['flowIdentifier'][0]
+        except (KeyError, ValueError):
+            raise errors.InvalidInputFormat("Invalid file upload")
 
-        return {
-            'name': self.request.args['flowFilename'][0],
-            'type': mime_type,
-            'size': total_file_size,
-            'path': f.filepath,
-            'body': f,
-            'description': self.request.args.get('description', [''])[0]
-        }
+        upload = Uploads.get(flow_identifier)
+        if upload is None or chunk_number > upload.chunks:
+            self.request.setResponseCode(204)
 
     @inlineCallbacks
     def execution_check(self):
@@ -509,6 +633,9 @@ class StaticFileHandler(BaseHandler):
     check_roles = '*'
     handler_exec_time_threshold = 30
 
+    # the files are cached by the browsers and revalidated with their ETag
+    cacheable = True
+
     def __init__(self, state, request, path):
         BaseHandler.__init__(self, state, request)
 
@@ -522,8 +649,59 @@ class StaticFileHandler(BaseHandler):
 
         directory_traversal_check(self.root, abspath)
 
-        return self.write_file(abspath)
+        if not self.cacheable:
+            return self.write_file(abspath)
+
+        return self.write_asset(abspath)
+
+    def write_asset(self, filepath):
+        if not os.path.exists(filepath) or not os.path.isfile(filepath):
+            raise errors.ResourceNotFound()
+
+        asset = AssetsManifest.get(filepath)
+
+        # the no-store policy of the API responses does not apply to the assets
+        for header in [b'cache-control', b'pragma', b'expires']:
+            self.request.responseHeaders.removeHeader(header)
+
+        if self.request.args.get('v', [None])[0] == asset.version:
+            # the request references the content of the asset by its version
+            self.request.setHeader(b'cache-control', b'public, max-age=31536000, immutable')
+        else:
+            self.request.setHeader(b'cache-control', b'no-cache')
+
+        self.request.setHeader(b'etag', asset.etag)
+
+        if asset.is_fresh(self.request):
+            self.request.setResponseCode(304)
+            return
+
+        mime_type, encoding = mimetypes.guess_type(filepath)
+        if mime_type:
+            self.request.setHeader(b'content-type', mime_type)
+
+        body = asset.body
+
+        if asset.gzip_path is not None or asset.gzip_body is not None:
+            self.request.setHeader(b'vary', b'accept-encoding')
+
+            accept_encoding = self.request.getHeader(b'accept-encoding')
+            if accept_encoding is not None and b'gzip' in accept_encoding:
+                self.request.setHeader(b'content-encoding', b'gzip')
+
+                if asset.gzip_path is not None:
+                    return self.serve_file(asset.gzip_path)
+
+                body = asset.gzip_body
+
+        if body is not None:
+            self.request.setHeader(b'content-length', b'%d' % len(body))
+            self.request.write(body)
+            return
+
+        return self.serve_file(filepath)
 
 
 class AdminStaticFileHandler(StaticFileHandler):
     check_roles = 'admin'
+    cacheable = False
@@ -10,33 +10,45 @@ from globaleaks.rest import requests
 from globaleaks.utils.utility import datetime_to_ISO8601, datetime_now
 
 
+def db_serialize_identityaccessrequests(store, identityaccessrequests):
+    """
+    Serialize a list of identity access requests fetching the related
+    tips and users with a query per model
+    """
+    rtips = models.db_get_map(store, models.ReceiverTip, [iar.receivertip_id for iar in identityaccessrequests])
+    itips = models.db_get_map(store, models.InternalTip, [rtip.internaltip_id for rtip in rtips.values()])
+    users = models.db_get_map(store, models.User, [rtip.receiver_id for rtip in rtips.values()] +
+                                                  [iar.reply_user_id for iar in identityaccessrequests])
+
+    ret = []
+    for iar in identityaccessrequests:
+        rtip = rtips[iar.receivertip_id]
+        reply_user = users.get(iar.reply_user_id)
+
+        ret.append({
+            'id': iar.id,
+            'receivertip_id': iar.receivertip_id,
+            'request_date': datetime_to_ISO8601(iar.request_date),
+            'request_user_name': users[rtip.receiver_id].name,
+            'request_motivation': iar.request_motivation,
+            'reply_date': datetime_to_ISO8601(iar.reply_date),
+            'reply_user_name': reply_user.id if reply_user is not None else '',
+            'reply': iar.reply,
+            'reply_motivation': iar.reply_motivation,
+            'submission_date': datetime_to_ISO8601(itips[rtip.internaltip_id].creation_date)
+        })
+
+    return ret
+
+
 def serialize_identityaccessrequest(store, identityaccessrequest):
-    itip, user = store.find((models.InternalTip, models.User),
-                            models.InternalTip.id == models.ReceiverTip.internaltip_id,
-                            models.User.id == models.ReceiverTip.receiver_id,
-                            models.ReceiverTip.id == identityaccessrequest.receivertip_id).one()
-
-    reply_user = store.find(models.User,
-                            models.User.id == identityaccessrequest.reply_user_id).one()
-
-    return {
-        'id': identityaccessrequest.id,
-        'receivertip_id': identityaccessrequest.receivertip_id,
-        'request_date': datetime_to_ISO8601(identityaccessrequest.request_date),
-        'request_user_name': user.name,
-        'request_motivation': identityaccessrequest.request_motivation,
-        'reply_date': datetime_to_ISO8601(identityaccessrequest.reply_date),
-        'reply_user_name': reply_user.id if reply_user is not None else '',
-        'reply': identityaccessrequest.reply,
-        'reply_motivation': identityaccessrequest.reply_motivation,
-        'submission_date': datetime_to_ISO8601(itip.creation_date)
-    }
+    return db_serialize_identityaccessrequests(store, [identityaccessrequest])[0]
 
 
 @transact
 def get_identityaccessrequest_list(store):
-    return [serialize_identityaccessrequest(store, iar)
-        for iar in store.find(models.IdentityAccessRequest, models.IdentityAccessRequest.reply == u'pending')]
+    return db_serialize_identityaccessrequests(store, list(store.find(models.IdentityAccessRequest,
+                                                                      models.IdentityAccessRequest.reply == u'pending')))
 
 
 @transact
@@ -55,6 +55,9 @@ class FileAdd(BaseHandler):
     """
     check_roles = 'whistleblower'
 
+    def get(self):
+        return self.get_file_upload_status()
+
     @inlineCallbacks
     def post(self):
         """
@@ -90,6 +93,11 @@ class FileInstance(BaseHandler):
     """
     check_roles = 'unauthenticated'
 
+    def get(self, token_id):
+        TokenList.get(token_id)
+
+        return self.get_file_upload_status()
+
     @inlineCallbacks
     def post(self, token_id):
         """
@@ -39,6 +39,7 @@ class L10NHandler(BaseHandler):
     """
     check_roles = '*'
     cache_resource = True
+    cache_tags = {'l10n'}
 
     def get(self, lang):
         return get_l10n(lang)
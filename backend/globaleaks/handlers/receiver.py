@@ -5,19 +5,23 @@
 # Implement the classes handling the requests performed to /receiver/* URI PATH
 # Used by receivers to update personal preferences and access to personal data
 
-from storm.expr import In, Count
+import base64
+import json
+from datetime import datetime
+
+from storm.expr import And, Asc, Count, Desc, In, Or
 
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.handlers.rtip import db_postpone_expiration_date, db_delete_itip
+from globaleaks.handlers.rtip import db_postpone_expiration_dates, db_delete_itips
 from globaleaks.handlers.submission import db_serialize_archived_preview_schema
 from globaleaks.handlers.user import db_user_update_user
 from globaleaks.handlers.user import user_serialize_user
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import requests, errors
 from globaleaks.state import State
 from globaleaks.utils.structures import get_localized_values
-from globaleaks.utils.utility import log, datetime_to_ISO8601
+from globaleaks.utils.utility import log, datetime_to_ISO8601, ISO8601_to_datetime
 
 
 def receiver_serialize_receiver(store, receiver, user, language):
@@ -62,27 +66,177 @@ def update_receiver_settings(store, receiver_id, request, language):
     return receiver_serialize_receiver(store, receiver, user, language)
 
 
-@transact
-def get_receivertip_list(store, receiver_id, language):
-    rtip_summary_list = []
+# columns on which the tip list could be sorted
+tip_list_sort_keys = {
+    'creation_date': models.InternalTip.creation_date,
+    'update_date': models.InternalTip.update_date,
+    'expiration_date': models.InternalTip.expiration_date,
+    'total_score': models.InternalTip.total_score,
+    'label': models.ReceiverTip.label
+}
+
+# maximum number of tips returned in a page of the tip list
+TIP_LIST_MAX_LIMIT = 500
+
+
+def encode_tip_list_cursor(query, value, rtip_id):
+    if isinstance(value, datetime):
+        value = value.strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+    return base64.urlsafe_b64encode(json.dumps([query['sort'], query['order'], value, rtip_id]))
+
+
+def decode_tip_list_cursor(query, cursor):
+    """
+    @return: the value of the sort key and the id of the last tip of the previous page
+    """
+    try:
+        sort, order, value, rtip_id = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        if sort.endswith('_date'):
+            value = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f')
+    except Exception:
+        raise errors.InvalidInputFormat('cursor')
+
+    if (sort, order) != (query['sort'], query['order']):
+        raise errors.InvalidInputFormat('cursor')
+
+    return value, rtip_id
+
+
+def parse_tip_list_query(args):
+    """
+    Parse the arguments of the request of the tip list
+
+    @param args: a dict of the query string arguments
+    @return: a dict describing the filters, the sorting and the page requested
+    """
+    query = {
+        'sort': args.get('sort', 'creation_date'),
+        'order': args.get('order', 'desc'),
+        'limit': None,
+        'cursor': args.get('cursor'),
+        'compact': args.get('compact') in ('1', 'true'),
+        'new': args.get('new') in ('1', 'true'),
+        'context_id': args.get('context_id'),
+        'label': args.get('label'),
+        'from': None,
+        'to': None
+    }
+
+    if query['sort'] not in tip_list_sort_keys:
+        raise errors.InvalidInputFormat('sort')
+
+    if query['order'] not in ('asc', 'desc'):
+        raise errors.InvalidInputFormat('order')
+
+    if 'limit' in args:
+        try:
+            query['limit'] = int(args['limit'])
+        except ValueError:
+            raise errors.InvalidInputFormat('limit')
+
+        if not 0 < query['limit'] <= TIP_LIST_MAX_LIMIT:
+            raise errors.InvalidInputFormat('limit')
+
+    for key in ('from', 'to'):
+        if key in args:
+            try:
+                query[key] = ISO8601_to_datetime(args[key])
+            except ValueError:
+                raise errors.InvalidInputFormat(key)
+
+    for key in ('context_id', 'label'):
+        if query[key] is not None:
+            query[key] = query[key].decode('utf-8')
+
+    if query['cursor'] is not None:
+        query['cursor'] = decode_tip_list_cursor(query, query['cursor'])
+
+    return query
+
+
+def db_get_receivertip_page(store, receiver_id, query):
+    """
+    Select the (ReceiverTip, InternalTip) of the requested page of the tip list
+
+    @return: the selected rows and the cursor of the following page
+    """
+    column = tip_list_sort_keys[query['sort']]
+
+    conditions = [models.ReceiverTip.receiver_id == receiver_id,
+                  models.InternalTip.id == models.ReceiverTip.internaltip_id]
+
+    if query['new']:
+        conditions.append(Or(models.ReceiverTip.access_counter == 0,
+                             models.ReceiverTip.last_access < models.InternalTip.update_date))
+
+    if query['context_id'] is not None:
+        conditions.append(models.InternalTip.context_id == query['context_id'])
+
+    if query['label'] is not None:
+        conditions.append(models.ReceiverTip.label == query['label'])
+
+    if query['from'] is not None:
+        conditions.append(models.InternalTip.creation_date >= query['from'])
+
+    if query['to'] is not None:
+        conditions.append(models.InternalTip.creation_date <= query['to'])
+
+    if query['cursor'] is not None:
+        value, rtip_id = query['cursor']
+
+        if query['order'] == 'desc':
+            conditions.append(Or(column < value, And(column == value, models.ReceiverTip.id < rtip_id)))
+        else:
+            conditions.append(Or(column > value, And(column == value, models.ReceiverTip.id > rtip_id)))
 
-    rtips = store.find(models.ReceiverTip, receiver_id=receiver_id)
-    itips_ids = [rtip.internaltip_id for rtip in rtips]
+    direction = Desc if query['order'] == 'desc' else Asc
+
+    result = store.find((models.ReceiverTip, models.InternalTip), *conditions)
+    result = result.order_by(direction(column), direction(models.ReceiverTip.id))
+
+    if query['limit'] is None:
+        return list(result), None
+
+    # an additional row is selected to know if a following page exists
+    rows = list(result[:query['limit'] + 1])
+    if len(rows) <= query['limit']:
+        return rows, None
+
+    rows = rows[:query['limit']]
+    rtip, itip = rows[-1]
+    obj = rtip if query['sort'] == 'label' else itip
+
+    return rows, encode_tip_list_cursor(query, getattr(obj, query['sort']), rtip.id)
+
+
+def db_get_receivertip_list(store, receiver_id, language, query=None):
+    """
+    Serialize the tip list of a receiver
+
+    @param query: the filters, sorting and page as returned by parse_tip_list_query;
+        when omitted the whole list is returned.
+    @return: the list of the tips or, when paginated or compact, a dict with the
+        list of the tips, the cursor of the following page and, in compact mode,
+        the preview schemas of the tips indexed by questionnaire hash.
+    """
+    if query is None:
+        rows = list(store.find((models.ReceiverTip, models.InternalTip),
+                               models.ReceiverTip.receiver_id == receiver_id,
+                               models.InternalTip.id == models.ReceiverTip.internaltip_id))
+        next_cursor = None
+    else:
+        rows, next_cursor = db_get_receivertip_page(store, receiver_id, query)
+
+    rtips_ids = [rtip.id for rtip, _ in rows]
+    itips_ids = [itip.id for _, itip in rows]
 
-    itips_by_id = {}
-    aqs_by_itip = {}
     comments_by_itip = {}
     internalfiles_by_itip = {}
     messages_by_rtip = {}
+    preview_schemas = {}
 
-    for itip, archivedschema in store.find((models.InternalTip, models.ArchivedSchema),
-                                           In(models.InternalTip.id, itips_ids),
-                                           models.ArchivedSchema.hash == models.InternalTip.questionnaire_hash,
-                                           models.ArchivedSchema.type == u'preview'):
-        itips_by_id[itip.id] = itip
-        aqs_by_itip[itip.id] = archivedschema
-
-    result = store.find((models.ReceiverTip.id, Count()), models.ReceiverTip.receiver_id == receiver_id, models.ReceiverTip.id == models.Message.receivertip_id).group_by(models.ReceiverTip)
+    result = store.find((models.ReceiverTip.id, Count()), In(models.ReceiverTip.id, rtips_ids), models.ReceiverTip.id == models.Message.receivertip_id).group_by(models.ReceiverTip)
     for rtip_id, count in result:
         messages_by_rtip[rtip_id] = count
 
@@ -94,11 +248,12 @@ def get_receivertip_list(store, receiver_id, language):
     for itip_id, count in result:
         internalfiles_by_itip[itip_id] = count
 
-    for rtip in rtips:
-        internaltip = itips_by_id[rtip.internaltip_id]
-        archivedschema = aqs_by_itip[rtip.internaltip_id]
+    compact = query is not None and query['compact']
+
+    rtip_summary_list = []
 
-        rtip_summary_list.append({
+    for rtip, internaltip in rows:
+        rtip_summary = {
             'id': rtip.id,
             'creation_date': datetime_to_ISO8601(internaltip.creation_date),
             'last_access': datetime_to_ISO8601(rtip.last_access),
@@ -113,37 +268,65 @@ def get_receivertip_list(store, receiver_id, language):
             'comment_counter': comments_by_itip.get(internaltip.id, 0),
             'message_counter': messages_by_rtip.get(rtip.id, 0),
             'tor2web': internaltip.tor2web,
-            'preview_schema': db_serialize_archived_preview_schema(store, archivedschema, language),
             'preview': internaltip.preview,
             'total_score': internaltip.total_score,
             'label': rtip.label
-        })
+        }
 
-    return rtip_summary_list
+        preview_schema = db_serialize_archived_preview_schema(store, internaltip.questionnaire_hash, language)
+
+        if compact:
+            rtip_summary['questionnaire_hash'] = internaltip.questionnaire_hash
+            preview_schemas[internaltip.questionnaire_hash] = preview_schema
+        else:
+            rtip_summary['preview_schema'] = preview_schema
+
+        rtip_summary_list.append(rtip_summary)
+
+    if query is None or (query['limit'] is None and not compact):
+        return rtip_summary_list
+
+    ret = {
+        'tips': rtip_summary_list,
+        'cursor': next_cursor
+    }
+
+    if compact:
+        ret['preview_schemas'] = preview_schemas
+
+    return ret
+
+
+@transact_ro
+def get_receivertip_list(store, receiver_id, language, query=None):
+    return db_get_receivertip_list(store, receiver_id, language, query)
 
 
 @transact
 def perform_tips_operation(store, receiver_id, operation, rtips_ids):
     receiver = store.find(models.Receiver, models.Receiver.id == receiver_id).one()
 
-    for itip in store.find(models.InternalTip,
-                           models.ReceiverTip.receiver_id == receiver_id,
-                           In(models.ReceiverTip.id, rtips_ids),
-                           models.InternalTip.id == models.ReceiverTip.internaltip_id):
+    itips = list(store.find(models.InternalTip,
+                            models.ReceiverTip.receiver_id == receiver_id,
+                            In(models.ReceiverTip.id, rtips_ids),
+                            models.InternalTip.id == models.ReceiverTip.internaltip_id))
+
+    if not itips:
+        return
 
-        if operation == 'postpone':
-            can_postpone_expiration = State.tenant_cache[1].can_postpone_expiration or receiver.can_postpone_expiration
-            if not can_postpone_expiration:
-                raise errors.ForbiddenOperation
+    if operation == 'postpone':
+        can_postpone_expiration = State.tenant_cache[1].can_postpone_expiration or receiver.can_postpone_expiration
+        if not can_postpone_expiration:
+            raise errors.ForbiddenOperation
 
-            db_postpone_expiration_date(store, itip)
+        db_postpone_expiration_dates(store, [itip.id for itip in itips])
 
-        elif operation == 'delete':
-            can_delete_submission = State.tenant_cache[1].can_delete_submission or receiver.can_delete_submission
-            if not can_delete_submission:
-                raise errors.ForbiddenOperation
+    elif operation == 'delete':
+        can_delete_submission = State.tenant_cache[1].can_delete_submission or receiver.can_delete_submission
+        if not can_delete_submission:
+            raise errors.ForbiddenOperation
 
-            db_delete_itip(store, itip)
+        db_delete_itips(store, itips)
 
     log.debug("Multiple %s of %d Tips completed" % (operation, len(rtips_ids)))
 
@@ -187,10 +370,20 @@ class TipsCollection(BaseHandler):
 
     def get(self):
         """
+        Parameters: sort, order, limit, cursor, compact, new, context_id, label, from, to
         Response: receiverTipList
+
+        Without parameters the whole list is returned; when a limit is
+        requested the response contains a page of the list together with
+        the cursor of the following one.
         """
+        args = {k: v[0] for k, v in self.request.args.items()}
+
+        query = parse_tip_list_query(args) if args else None
+
         return get_receivertip_list(self.current_user.user_id,
-                                    self.request.language)
+                                    self.request.language,
+                                    query)
 
 
 class TipsOperations(BaseHandler):
@@ -8,64 +8,76 @@
 
 import os
 import string
-from storm.expr import In
+from storm.expr import In, Not, Select
 
 from twisted.internet import threads
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, returnValue
 
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler, OperationHandler, \
     directory_traversal_check, write_upload_plaintext_to_disk
-from globaleaks.handlers.custodian import serialize_identityaccessrequest
+from globaleaks.handlers.custodian import db_serialize_identityaccessrequests, serialize_identityaccessrequest
 from globaleaks.handlers.submission import serialize_usertip
 from globaleaks.models import serializers
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import errors, requests
 from globaleaks.settings import Settings
 from globaleaks.state import State
 from globaleaks.utils.utility import log, get_expiration, datetime_now, datetime_never, \
-    datetime_to_ISO8601
+    datetime_to_ISO8601, uuid4
 
 
-def receiver_serialize_rfile(store, rfile):
-    ifile = store.find(models.InternalFile,
-                       models.InternalFile.id == models.ReceiverFile.internalfile_id,
-                       models.ReceiverFile.id == rfile.id).one()
-
-    if rfile.status != 'unavailable':
-        ret_dict = {
-            'id': rfile.id,
-            'internalfile_id': ifile.id,
-            'status': rfile.status,
-            'href': "/rtip/" + rfile.receivertip_id + "/download/" + rfile.id,
-            # if the ReceiverFile has encrypted status, we append ".pgp" to the filename, to avoid mistake on Receiver side.
-            'name': ("%s.pgp" % ifile.name) if rfile.status == u'encrypted' else ifile.name,
-            'content_type': ifile.content_type,
-            'creation_date': datetime_to_ISO8601(ifile.creation_date),
-            'size': rfile.size,
-            'downloads': rfile.downloads
-        }
+def receiver_serialize_rfiles(store, rfiles):
+    """
+    Serialize a list of receiver files fetching their internal files with a single query
+    """
+    ifiles = models.db_get_map(store, models.InternalFile, [rfile.internalfile_id for rfile in rfiles])
+
+    ret = []
+    for rfile in rfiles:
+        ifile = ifiles[rfile.internalfile_id]
+
+        if rfile.status != 'unavailable':
+            ret.append({
+                'id': rfile.id,
+                'internalfile_id': ifile.id,
+                'status': rfile.status,
+                'href': "/rtip/" + rfile.receivertip_id + "/download/" + rfile.id,
+                # if the ReceiverFile has encrypted status, we append ".pgp" to the filename, to avoid mistake on Receiver side.
+                'name': ("%s.pgp" % ifile.name) if rfile.status == u'encrypted' else ifile.name,
+                'content_type': ifile.content_type,
+                'creation_date': datetime_to_ISO8601(ifile.creation_date),
+                'size': rfile.size,
+                'downloads': rfile.downloads
+            })
+
+        else:  # == 'unavailable' in this case internal file metadata is returned.
+            ret.append({
+                'id': rfile.id,
+                'internalfile_id': ifile.id,
+                'status': 'unavailable',
+                'href': "",
+                'name': ifile.name,
+                'content_type': ifile.content_type,
+                'creation_date': datetime_to_ISO8601(ifile.creation_date),
+                'size': int(ifile.size),
+                'downloads': rfile.downloads
+            })
 
-    else:  # == 'unavailable' in this case internal file metadata is returned.
-        ret_dict = {
-            'id': rfile.id,
-            'internalfile_id': ifile.id,
-            'status': 'unavailable',
-            'href': "",
-            'name': ifile.name,
-            'content_type': ifile.content_type,
-            'creation_date': datetime_to_ISO8601(ifile.creation_date),
-            'size': int(ifile.size),
-            'downloads': rfile.downloads
-        }
+    return ret
 
-    return ret_dict
 
+def receiver_serialize_rfile(store, rfile):
+    return receiver_serialize_rfiles(store, [rfile])[0]
 
-def receiver_serialize_wbfile(store, wbfile):
-    rtip = models.db_get(store, models.ReceiverTip, id=wbfile.receivertip_id)
 
-    return {
+def receiver_serialize_wbfiles(store, wbfiles):
+    """
+    Serialize a list of whistleblower files fetching their receiver tips with a single query
+    """
+    rtips = models.db_get_map(store, models.ReceiverTip, [wbfile.receivertip_id for wbfile in wbfiles])
+
+    return [{
         'id': wbfile.id,
         'creation_date': datetime_to_ISO8601(wbfile.creation_date),
         'name': wbfile.name,
@@ -73,44 +85,68 @@ def receiver_serialize_wbfile(store, wbfile):
         'size': wbfile.size,
         'content_type': wbfile.content_type,
         'downloads': wbfile.downloads,
-        'author': rtip.receiver_id
-    }
+        'author': rtips[wbfile.receivertip_id].receiver_id
+    } for wbfile in wbfiles]
 
 
-def serialize_comment(store, comment):
-    author = 'Recipient'
+def receiver_serialize_wbfile(store, wbfile):
+    return receiver_serialize_wbfiles(store, [wbfile])[0]
 
-    if comment.type == 'whistleblower':
-        author = 'Whistleblower'
-    elif comment.author_id is not None:
-        author = store.find(models.User,
-                            models.User.id == comment.author_id).one().public_name
 
-    return {
-        'id': comment.id,
-        'author': author,
-        'type': comment.type,
-        'creation_date': datetime_to_ISO8601(comment.creation_date),
-        'content': comment.content
-    }
+def serialize_comments(store, comments):
+    """
+    Serialize a list of comments fetching their authors with a single query
+    """
+    authors = models.db_get_map(store, models.User, [comment.author_id for comment in comments
+                                                     if comment.type != 'whistleblower'])
+
+    ret = []
+    for comment in comments:
+        author = 'Recipient'
+
+        if comment.type == 'whistleblower':
+            author = 'Whistleblower'
+        elif comment.author_id is not None:
+            author = authors[comment.author_id].public_name
+
+        ret.append({
+            'id': comment.id,
+            'author': author,
+            'type': comment.type,
+            'creation_date': datetime_to_ISO8601(comment.creation_date),
+            'content': comment.content
+        })
 
+    return ret
 
-def serialize_message(store, message):
-    if message.type == 'whistleblower':
-        author = 'Whistleblower'
-    else:
-        author = store.find(models.User,
-                            models.User.id == models.ReceiverTip.receiver_id,
-                            models.ReceiverTip.id == models.Message.receivertip_id,
-                            models.Message.id == message.id).one().public_name
 
-    return {
+def serialize_comment(store, comment):
+    return serialize_comments(store, [comment])[0]
+
+
+def serialize_messages(store, messages):
+    """
+    Serialize a list of messages fetching the receivers authoring them with a single query
+    """
+    receivertip_ids = list(set(message.receivertip_id for message in messages if message.type != 'whistleblower'))
+
+    authors = {}
+    for i in range(0, len(receivertip_ids), models.DB_IN_QUERY_SIZE):
+        authors.update(store.find((models.ReceiverTip.id, models.User.public_name),
+                                  models.User.id == models.ReceiverTip.receiver_id,
+                                  In(models.ReceiverTip.id, receivertip_ids[i:i + models.DB_IN_QUERY_SIZE])))
+
+    return [{
         'id': message.id,
-        'author': author,
+        'author': 'Whistleblower' if message.type == 'whistleblower' else authors[message.receivertip_id],
         'type': message.type,
         'creation_date': datetime_to_ISO8601(message.creation_date),
         'content': message.content
-    }
+    } for message in messages]
+
+
+def serialize_message(store, message):
+    return serialize_messages(store, [message])[0]
 
 
 def serialize_rtip(store, rtip, itip, language):
@@ -158,19 +194,17 @@ def db_access_wbfile(store, user_id, wbfile_id):
 
 
 def db_receiver_get_rfile_list(store, rtip_id):
-    rfiles = store.find(models.ReceiverFile,
-                        models.ReceiverFile.receivertip_id == models.ReceiverTip.id,
-                        models.ReceiverTip.id == rtip_id)
+    rfiles = store.find(models.ReceiverFile, models.ReceiverFile.receivertip_id == rtip_id)
 
-    return [receiver_serialize_rfile(store, rfile) for rfile in rfiles]
+    return receiver_serialize_rfiles(store, list(rfiles))
 
 
 def db_receiver_get_wbfile_list(store, itip_id):
-    rtips = store.find(models.ReceiverTip, models.ReceiverTip.internaltip_id == itip_id)
-    rtips_ids = [rt.id for rt in rtips]
-    wbfiles = store.find(models.WhistleblowerFile, In(models.WhistleblowerFile.receivertip_id, rtips_ids))
+    wbfiles = store.find(models.WhistleblowerFile,
+                         models.WhistleblowerFile.receivertip_id == models.ReceiverTip.id,
+                         models.ReceiverTip.internaltip_id == itip_id)
 
-    return [receiver_serialize_wbfile(store, wbfile) for wbfile in wbfiles]
+    return receiver_serialize_wbfiles(store, list(wbfiles))
 
 
 @transact
@@ -202,61 +236,116 @@ def receiver_get_rfile_list(store, rtip_id):
 def db_get_rtip(store, user_id, rtip_id, language):
     rtip, itip = db_access_rtip(store, user_id, rtip_id)
 
+    return serialize_rtip(store, rtip, itip, language)
+
+
+@transact
+def register_rtip_access(store, user_id, rtip_id):
+    rtip, _ = db_access_rtip(store, user_id, rtip_id)
+
     rtip.access_counter += 1
     rtip.last_access = datetime_now()
 
-    return serialize_rtip(store, rtip, itip, language)
 
+def db_mark_files_for_secure_deletion(store, relpaths):
+    """
+    Enqueue the files for secure deletion with a multi-row insert
 
-def db_mark_file_for_secure_deletion(store, relpath):
-    abspath = os.path.join(Settings.submission_path, relpath)
-    if os.path.isfile(abspath):
-        secure_file_delete = models.SecureFileDelete()
-        secure_file_delete.filepath = abspath
-        store.add(secure_file_delete)
-    else:
-        log.err("Tried to permanently delete a non existent file: %s" % abspath)
+    The files not existing anymore are skipped by the secure deletion job.
+    """
+    rows = [(uuid4(), os.path.join(Settings.submission_path, relpath)) for relpath in set(relpaths)]
 
+    # each row binds two variables
+    step = models.DB_IN_QUERY_SIZE // 2
 
-def db_delete_itip_files(store, itip):
-    log.debug("Removing files associated to InternalTip %s" % itip.id)
-    for ifile in store.find(models.InternalFile,
-                            models.InternalFile.internaltip_id == itip.id):
-        log.debug("Marking internalfile %s for secure deletion" % ifile.file_path)
+    for i in range(0, len(rows), step):
+        chunk = rows[i:i + step]
+        store.execute('INSERT INTO %s (id, filepath) VALUES %s' % (models.SecureFileDelete.__storm_table__,
+                                                                   ', '.join(['(?, ?)'] * len(chunk))),
+                      [v for row in chunk for v in row], noresult=True)
 
-        db_mark_file_for_secure_deletion(store, ifile.file_path)
 
-        for rfile in store.find(models.ReceiverFile, models.ReceiverFile.internalfile_id == ifile.id):
-            # The following code must be bypassed if rfile.file_path == ifile.filepath,
-            # this mean that is referenced the plaintext file instead having E2E.
-            if rfile.file_path == ifile.file_path:
-                continue
+def db_mark_file_for_secure_deletion(store, relpath):
+    db_mark_files_for_secure_deletion(store, [relpath])
 
-            log.debug("Marking receiverfile %s for secure deletion" % rfile.file_path)
 
-            db_mark_file_for_secure_deletion(store, rfile.file_path)
+def db_get_itips_files(store, itips_ids):
+    """
+    @return: the paths of the files of the tips
+    """
+    ret = []
 
-    for wbfile in store.find(models.WhistleblowerFile,
-                             models.WhistleblowerFile.receivertip_id == models.ReceiverTip.id,
-                             models.ReceiverTip.internaltip_id == itip.id):
-        log.debug("Marking whistleblowerfile %s for secure deletion" % wbfile.file_path)
-        db_mark_file_for_secure_deletion(store, wbfile.file_path)
+    ifiles = store.find((models.InternalFile.id, models.InternalFile.file_path),
+                        In(models.InternalFile.internaltip_id, itips_ids))
 
+    ret.extend(file_path for _, file_path in ifiles)
 
-def db_delete_itip(store, itip):
-    log.debug("Removing InternalTip %s" % itip.id)
+    # The receiver files referencing the plaintext file instead of having E2E are skipped
+    rfiles = store.find((models.ReceiverFile.file_path, models.InternalFile.file_path),
+                        models.ReceiverFile.internalfile_id == models.InternalFile.id,
+                        In(models.InternalFile.internaltip_id, itips_ids))
 
-    db_delete_itip_files(store, itip)
+    ret.extend(rfile_path for rfile_path, ifile_path in rfiles if rfile_path != ifile_path)
 
-    store.remove(itip)
+    wbfiles = store.find(models.WhistleblowerFile.file_path,
+                         models.WhistleblowerFile.receivertip_id == models.ReceiverTip.id,
+                         In(models.ReceiverTip.internaltip_id, itips_ids))
 
-    if store.find(models.InternalTip, models.InternalTip.questionnaire_hash == itip.questionnaire_hash).count() == 0:
-        store.find(models.ArchivedSchema, models.ArchivedSchema.hash == itip.questionnaire_hash).remove()
+    ret.extend(wbfiles)
+
+    return ret
 
 
 def db_delete_itips(store, itips):
-    for itip in itips:
-        db_delete_itip(store, itip)
+    """
+    Delete the tips with a set-based delete for every DB_IN_QUERY_SIZE tips
+
+    The files of the tips are enqueued for secure deletion and the archived
+    schemas not referenced anymore are removed in a single pass.
+    """
+    itips = [(itip.id, itip.questionnaire_hash) for itip in itips]
+    if not itips:
+        return
+
+    log.debug("Removing %d InternalTips" % len(itips))
+
+    for i in range(0, len(itips), models.DB_IN_QUERY_SIZE):
+        itips_ids = [itip_id for itip_id, _ in itips[i:i + models.DB_IN_QUERY_SIZE]]
+
+        db_mark_files_for_secure_deletion(store, db_get_itips_files(store, itips_ids))
+
+        store.find(models.InternalTip, In(models.InternalTip.id, itips_ids)).remove()
+
+    hashes = list(set(questionnaire_hash for _, questionnaire_hash in itips))
+
+    store.find(models.ArchivedSchema,
+               In(models.ArchivedSchema.hash, hashes),
+               Not(In(models.ArchivedSchema.hash,
+                      Select(models.InternalTip.questionnaire_hash, distinct=True)))).remove()
+
+
+def db_delete_itip(store, itip):
+    db_delete_itips(store, [itip])
+
+
+def db_postpone_expiration_dates(store, itips_ids):
+    """
+    Postpone the expiration date of the tips with an update for each of their contexts
+    """
+    itips_by_context = {}
+    for itip_id, context_id in store.find((models.InternalTip.id, models.InternalTip.context_id),
+                                          In(models.InternalTip.id, itips_ids)):
+        itips_by_context.setdefault(context_id, []).append(itip_id)
+
+    for context_id, tip_timetolive in store.find((models.Context.id, models.Context.tip_timetolive),
+                                                 In(models.Context.id, list(itips_by_context))):
+        if tip_timetolive > -1:
+            expiration_date = get_expiration(tip_timetolive)
+        else:
+            expiration_date = datetime_never()
+
+        store.find(models.InternalTip,
+                   In(models.InternalTip.id, itips_by_context[context_id])).set(expiration_date=expiration_date)
 
 
 def db_postpone_expiration_date(store, itip):
@@ -317,13 +406,13 @@ def set_receivertip_variable(store, user_id, rtip_id, key, value):
     setattr(rtip, key, value)
 
 
-@transact
+@transact_ro
 def get_rtip(store, user_id, rtip_id, language):
     return db_get_rtip(store, user_id, rtip_id, language)
 
 
 def db_get_itip_comment_list(store, itip):
-    return [serialize_comment(store, comment) for comment in store.find(models.Comment, internaltip_id=itip.id)]
+    return serialize_comments(store, list(store.find(models.Comment, internaltip_id=itip.id)))
 
 
 @transact
@@ -355,7 +444,7 @@ def create_comment(store, user_id, rtip_id, request):
 
 
 def db_get_itip_message_list(store, rtip):
-    return [serialize_message(store, message) for message in store.find(models.Message, receivertip_id=rtip.id)]
+    return serialize_messages(store, list(store.find(models.Message, receivertip_id=rtip.id)))
 
 
 @transact
@@ -381,7 +470,7 @@ def delete_wbfile(store, user_id, file_id):
 
 
 def db_get_identityaccessrequest_list(store, rtip_id, language):
-    return [serialize_identityaccessrequest(store, iar) for iar in store.find(models.IdentityAccessRequest, receivertip_id=rtip_id)]
+    return db_serialize_identityaccessrequests(store, list(store.find(models.IdentityAccessRequest, receivertip_id=rtip_id)))
 
 
 class RTipInstance(OperationHandler):
@@ -390,6 +479,7 @@ class RTipInstance(OperationHandler):
     """
     check_roles = 'receiver'
 
+    @inlineCallbacks
     def get(self, tip_id):
         """
         Parameters: None
@@ -403,7 +493,11 @@ class RTipInstance(OperationHandler):
         This method is decorated as @BaseHandler.unauthenticated because in the handler
         the various cases are managed differently.
         """
-        return get_rtip(self.current_user.user_id, tip_id, self.request.language)
+        yield register_rtip_access(self.current_user.user_id, tip_id)
+
+        rtip = yield get_rtip(self.current_user.user_id, tip_id, self.request.language)
+
+        returnValue(rtip)
 
     def operation_descriptors(self):
         return {
@@ -8,6 +8,9 @@
 
 import copy
 import json
+import threading
+from collections import OrderedDict
+
 from storm.expr import In
 
 from globaleaks import models
@@ -16,8 +19,9 @@ from globaleaks.handlers.base import BaseHandler
 from globaleaks.orm import transact
 from globaleaks.rest import errors, requests
 from globaleaks.security import hash_password, sha256, generateRandomReceipt
+from globaleaks.settings import Settings
 from globaleaks.state import State
-from globaleaks.utils.structures import get_localized_values
+from globaleaks.utils.structures import freeze, get_localized_values
 from globaleaks.utils.token import TokenList
 from globaleaks.utils.utility import log, get_expiration, \
     datetime_now, datetime_never, datetime_to_ISO8601
@@ -85,14 +89,74 @@ def _db_serialize_archived_questionnaire_schema(store, aqs, language):
     return questionnaire
 
 
-def db_serialize_archived_questionnaire_schema(store, hash, language):
-    aqs = store.find(models.ArchivedSchema, hash=hash, type=u'questionnaire').one()
+class ArchivedSchemaCache(object):
+    """
+    LRU cache of the localized archived questionnaires keyed by hash, type and language.
+
+    The archived schemas are immutable given that they are identified by the
+    hash of their content; the cached renderings are shared by all the
+    serializations and so they are frozen in read-only structures.
+    """
+    lock = threading.Lock()
+    entries = OrderedDict()
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    @classmethod
+    def get(cls, store, hash, type, language, aqs=None):
+        """
+        @param aqs: the ArchivedSchema, if already loaded; when omitted it is
+            fetched from the database only in case of a cache miss.
+        """
+        key = (hash, type, language)
+
+        with cls.lock:
+            ret = cls.entries.pop(key, None)
+            if ret is not None:
+                cls.hits += 1
+                cls.entries[key] = ret
+                return ret
+
+            cls.misses += 1
+
+        if aqs is None:
+            aqs = store.find(models.ArchivedSchema, hash=hash, type=type).one()
 
-    return _db_serialize_archived_questionnaire_schema(store, aqs, language)
+        ret = freeze(_db_serialize_archived_questionnaire_schema(store, aqs, language))
 
+        with cls.lock:
+            cls.entries[key] = ret
 
-def db_serialize_archived_preview_schema(store, aqs, language):
-    return _db_serialize_archived_questionnaire_schema(store, aqs, language)
+            while len(cls.entries) > Settings.archived_schema_cache_size:
+                cls.entries.popitem(last=False)
+                cls.evictions += 1
+
+        return ret
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.entries.clear()
+            cls.hits = cls.misses = cls.evictions = 0
+
+    @classmethod
+    def get_stats(cls):
+        return {
+            'entries': len(cls.entries),
+            'max_entries': Settings.archived_schema_cache_size,
+            'hits': cls.hits,
+            'misses': cls.misses,
+            'evictions': cls.evictions
+        }
+
+
+def db_serialize_archived_questionnaire_schema(store, hash, language):
+    return ArchivedSchemaCache.get(store, hash, u'questionnaire', language)
+
+
+def db_serialize_archived_preview_schema(store, hash, language):
+    return ArchivedSchemaCache.get(store, hash, u'preview', language)
 
 
 def db_serialize_questionnaire_answers_recursively(store, answers, answers_by_group, groups_by_answer):
@@ -108,8 +172,12 @@ def db_serialize_questionnaire_answers_recursively(store, answers, answers_by_gr
     return ret
 
 
-def db_serialize_questionnaire_answers(store, usertip, internaltip):
-    questionnaire = db_serialize_archived_questionnaire_schema(store, internaltip.questionnaire_hash, State.tenant_cache[1].default_language)
+def db_serialize_questionnaire_answers(store, usertip, internaltip, questionnaire=None):
+    """
+    @param questionnaire: the serialized questionnaire of the tip, if already available
+    """
+    if questionnaire is None:
+        questionnaire = db_serialize_archived_questionnaire_schema(store, internaltip.questionnaire_hash, State.tenant_cache[1].default_language)
 
     answers = []
     answers_by_group = {}
@@ -255,7 +323,7 @@ def serialize_usertip(store, usertip, itip, language):
     ret = serialize_itip(store, itip, language)
     ret['id'] = usertip.id
     ret['internaltip_id'] = itip.id
-    ret['answers'] = db_serialize_questionnaire_answers(store, usertip, itip)
+    ret['answers'] = db_serialize_questionnaire_answers(store, usertip, itip, ret['questionnaire'])
     ret['total_score'] = itip.total_score
     return ret
 
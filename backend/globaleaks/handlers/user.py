@@ -9,7 +9,7 @@ from globaleaks.handlers.admin.modelimgs import db_get_model_img
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.orm import transact
 from globaleaks.rest import requests
-from globaleaks.security import change_password, parse_pgp_key
+from globaleaks.security import PGPKeyring, change_password, parse_pgp_key
 from globaleaks.state import State
 from globaleaks.utils.structures import get_localized_values
 from globaleaks.utils.utility import datetime_to_ISO8601, datetime_now, datetime_null
@@ -30,6 +30,9 @@ def parse_pgp_options(user, request):
     if not remove_key and pgp_key_public:
         k = parse_pgp_key(pgp_key_public)
 
+    if user.pgp_key_fingerprint and (k is None or user.pgp_key_public != k['public']):
+        PGPKeyring.invalidate(user.pgp_key_fingerprint)
+
     if k is not None:
         user.pgp_key_public = k['public']
         user.pgp_key_fingerprint = k['fingerprint']
@@ -134,7 +137,7 @@ class UserInstance(BaseHandler):
         - pgp key
     """
     check_roles = {'admin', 'receiver', 'custodian'}
-    invalidate_cache = True
+    invalidate_cache = {'users', 'receivers'}
 
     def get(self):
         """
@@ -7,7 +7,8 @@
 #   the whistleblower, handled and executed within /wbtip/* URI PATH interaction.
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.handlers.rtip import serialize_comment, serialize_message, db_get_itip_comment_list, WhistleblowerFileInstanceHandler
+from globaleaks.handlers.rtip import serialize_comment, serialize_message, serialize_messages, \
+    db_get_itip_comment_list, WhistleblowerFileInstanceHandler
 from globaleaks.handlers.submission import serialize_usertip, \
     db_save_questionnaire_answers, db_serialize_archived_questionnaire_schema
 from globaleaks.orm import transact
@@ -111,7 +112,7 @@ def get_itip_message_list(store, wbtip_id, receiver_id):
                       models.InternalTip.id == wbtip_id,
                       models.ReceiverTip.receiver_id == receiver_id).one()
 
-    return [serialize_message(store, message) for message in store.find(models.Message, models.Message.receivertip_id == rtip.id)]
+    return serialize_messages(store, list(store.find(models.Message, models.Message.receivertip_id == rtip.id)))
 
 @transact
 def create_message(store, wbtip_id, receiver_id, request):
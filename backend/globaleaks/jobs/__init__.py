@@ -5,6 +5,7 @@ from globaleaks.jobs import cleaning_sched, \
                             notification_sched, \
                             onion_service, \
                             pgp_check_sched, \
+                            secure_file_delete_sched, \
                             session_management_sched, \
                             statistics_sched, \
                             x509_cert_check_sched
@@ -17,6 +18,7 @@ jobs_list = [
     notification_sched.NotificationSchedule,
     session_management_sched.SessionManagementSchedule,
     cleaning_sched.CleaningSchedule,
+    secure_file_delete_sched.SecureFileDeleteSchedule,
     pgp_check_sched.PGPCheckSchedule,
     statistics_sched.StatisticsSchedule,
     x509_cert_check_sched.X509CertCheckSchedule,
@@ -36,5 +38,6 @@ __all__ = [
     'cleaning_sched',
     'session_management_sched',
     'pgp_check_sched',
+    'secure_file_delete_sched',
     'x509_cert_check_sched',
 ]
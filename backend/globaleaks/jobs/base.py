@@ -47,6 +47,7 @@ class BaseJob(task.LoopingCall):
     last_executions = []
     threaded = True
     shutdown = False
+    metrics = None
 
     def __init__(self):
         self.job = task.LoopingCall.__init__(self, self.run)
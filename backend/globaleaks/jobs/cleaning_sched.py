@@ -11,7 +11,6 @@ from globaleaks.handlers.rtip import db_delete_itips
 from globaleaks.handlers.user import user_serialize_user
 from globaleaks.jobs.base import LoopingJob
 from globaleaks.orm import transact_sync
-from globaleaks.security import overwrite_and_remove
 from globaleaks.state import State
 from globaleaks.utils.templating import Templating
 from globaleaks.utils.utility import datetime_now, datetime_to_ISO8601
@@ -100,21 +99,6 @@ class CleaningSchedule(LoopingJob):
         # delete anomalies older than 1 months
         store.find(models.Anomalies, models.Anomalies.date < datetime_now() - timedelta(365/12)).remove()
 
-    @transact_sync
-    def get_files_to_secure_delete(self, store):
-        return [file_to_delete.filepath for file_to_delete in store.find(models.SecureFileDelete)]
-
-    @transact_sync
-    def commit_file_deletion(self, store, filepath):
-        store.find(models.SecureFileDelete, models.SecureFileDelete.filepath == filepath).remove()
-
-    def perform_secure_deletion_of_files(self):
-        files_to_delete = self.get_files_to_secure_delete()
-
-        for file_to_delete in files_to_delete:
-            overwrite_and_remove(file_to_delete)
-            self.commit_file_deletion(file_to_delete)
-
     def operation(self):
         self.clean_expired_wbtips()
 
@@ -123,5 +107,3 @@ class CleaningSchedule(LoopingJob):
         self.check_for_expiring_submissions()
 
         self.clean_db()
-
-        self.perform_secure_deletion_of_files()
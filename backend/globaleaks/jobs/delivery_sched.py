@@ -6,12 +6,17 @@
 # Call also the FileProcess working point, in order to verify which
 # kind of file has been submitted.
 
+import errno
 import os
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from Queue import Full, Queue
 
 from globaleaks import models
 from globaleaks.jobs.base import LoopingJob
 from globaleaks.orm import transact_sync
-from globaleaks.security import GLBPGP, SecureFile, generateRandomKey
+from globaleaks.security import PGPKeyring, SecureFile, generateRandomKey
 from globaleaks.settings import Settings
 from globaleaks.state import State
 from globaleaks.utils.utility import log
@@ -21,6 +26,63 @@ __all__ = ['DeliverySchedule']
 
 INTERNALFILES_HANDLE_RETRY_MAX = 3
 
+PGP_ENCRYPTION_CHUNK_SIZE = 64 * 1024
+PGP_ENCRYPTION_QUEUE_SIZE = 16
+
+
+class StreamPipe(object):
+    """
+    Bounded in-memory pipe used to stream the chunks of a file to a gpg process.
+
+    An os.pipe() is not used given that its descriptors would be inherited
+    by the gpg processes spawned meanwhile by the other encryption threads.
+    """
+    def __init__(self):
+        self.queue = Queue(PGP_ENCRYPTION_QUEUE_SIZE)
+        self.chunk = b''
+        self.offset = 0
+        self.eof = False
+        self.closed = False
+
+    def _put(self, chunk):
+        while not self.closed:
+            try:
+                self.queue.put(chunk, timeout=1)
+                return True
+            except Full:
+                pass
+
+        return False
+
+    def write(self, chunk):
+        if not self._put(chunk):
+            raise IOError(errno.EPIPE, 'Broken pipe')
+
+    def close_write(self):
+        self._put(None)
+
+    def read(self, size=-1):
+        if size < 0:
+            return b''.join(iter(lambda: self.read(PGP_ENCRYPTION_CHUNK_SIZE), b''))
+
+        if self.offset >= len(self.chunk):
+            if self.eof:
+                return b''
+
+            chunk = self.queue.get()
+            if chunk is None:
+                self.eof = True
+                return b''
+
+            self.chunk, self.offset = chunk, 0
+
+        data = self.chunk[self.offset:self.offset + size]
+        self.offset += len(data)
+        return data
+
+    def close(self):
+        self.closed = True
+
 
 @transact_sync
 def receiverfile_planning(store):
@@ -102,100 +164,225 @@ def fsops_pgp_encrypt(fpath, recipient_pgp):
 
     required keys are checked on top
     """
-    gpoj = GLBPGP()
+    result = fsops_pgp_encrypt_multiple(fpath, [recipient_pgp])[0]
+    if isinstance(result, Exception):
+        raise result
 
-    try:
-        gpoj.load_key(recipient_pgp['pgp_key_public'])
+    return result
 
-        filepath = os.path.join(Settings.submission_path, fpath)
 
-        with SecureFile(filepath) as f:
-            encrypted_file_path = os.path.join(os.path.abspath(Settings.submission_path), "pgp_encrypted-%s" % generateRandomKey(16))
-            _, encrypted_file_size = gpoj.encrypt_file(recipient_pgp['pgp_key_fingerprint'], f, encrypted_file_path)
+def fsops_pgp_encrypt_multiple(fpath, recipients_pgp):
+    """
+    return
+        a list with an entry for each recipient containing the path and
+        the length of the encrypted file or the exception raised
+
+    this function is used to encrypt a file for many recipients:
+    the AES encrypted file is decrypted once and its content is streamed
+    through pipes to a gpg process for each of the recipients.
+    """
+    filepath = os.path.join(Settings.submission_path, fpath)
+
+    encryptors = [{
+        'recipient': recipient_pgp,
+        'path': os.path.join(os.path.abspath(Settings.submission_path), "pgp_encrypted-%s" % generateRandomKey(16)),
+        'size': 0,
+        'error': None,
+        'pipe': None,
+        'thread': None
+    } for recipient_pgp in recipients_pgp]
+
+    def encrypt(encryptor):
+        try:
+            _, encryptor['size'] = PGPKeyring.encrypt_file(encryptor['recipient']['pgp_key_public'],
+                                                           encryptor['pipe'],
+                                                           encryptor['path'])
+        except Exception as excep:
+            encryptor['error'] = excep
+        finally:
+            encryptor['pipe'].close()
+
+    try:
+        for encryptor in encryptors:
+            encryptor['pipe'] = StreamPipe()
+            encryptor['thread'] = threading.Thread(target=encrypt, args=(encryptor,))
+            encryptor['thread'].start()
 
-    except:
-        raise
+        with SecureFile(filepath) as f:
+            while True:
+                chunk = f.read(PGP_ENCRYPTION_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                for encryptor in encryptors:
+                    if encryptor['pipe'].closed:
+                        continue
+
+                    try:
+                        encryptor['pipe'].write(chunk)
+                    except IOError as excep:
+                        # the gpg process of the recipient terminated prematurely
+                        encryptor['error'] = excep
+
+    except Exception as excep:
+        # the file could not be read entirely and so none of the outputs is valid
+        for encryptor in encryptors:
+            encryptor['error'] = excep
 
     finally:
-        # the finally statement is always called also if
-        # except contains a return or a raise
-        gpoj.destroy_environment()
+        for encryptor in encryptors:
+            encryptor['pipe'].close_write()
+
+            if encryptor['thread'] is not None:
+                encryptor['thread'].join()
+
+    ret = []
+    for encryptor in encryptors:
+        if encryptor['error'] is not None:
+            if os.path.exists(encryptor['path']):
+                os.remove(encryptor['path'])
+
+            ret.append(encryptor['error'])
+        else:
+            ret.append((encryptor['path'], encryptor['size']))
 
-    return encrypted_file_path, encrypted_file_size
+    return ret
 
 
-def process_files(receiverfiles_maps):
+def process_file(ifile_id, receiverfiles_map, allow_unencrypted):
     """
-    @param receiverfiles_maps: the mapping of ifile/rfiles to be created on filesystem
-    @return: return None
+    @param ifile_id: the id of the internalfile to be processed
+    @param receiverfiles_map: the mapping of the ifile/rfiles to be created on filesystem
+    @param allow_unencrypted: whether plaintext files are allowed for receivers without a PGP key
+    @return: the number of bytes encrypted
     """
-    for ifile_id, receiverfiles_map in receiverfiles_maps.items():
-        ifile_path = receiverfiles_map['ifile_path']
-        ifile_name = os.path.basename(ifile_path).split('.')[0]
-        plain_path = os.path.join(Settings.submission_path, "%s.plain" % ifile_name)
-
-        receiverfiles_map['plaintext_file_needed'] = False
-        for rcounter, rfileinfo in enumerate(receiverfiles_map['rfiles']):
-            if rfileinfo['receiver']['pgp_key_public']:
-                try:
-                    new_path, new_size = fsops_pgp_encrypt(rfileinfo['path'], rfileinfo['receiver'])
-
-                    log.debug("%d# Switch on Receiver File for %s path %s => %s size %d => %d",
-                              rcounter,  rfileinfo['receiver']['name'], rfileinfo['path'],
-                              new_path, rfileinfo['size'], new_size)
-
-                    rfileinfo['path'] = new_path
-                    rfileinfo['size'] = new_size
-                    rfileinfo['status'] = u'encrypted'
-                except Exception as excep:
-                    log.err("%d# Unable to complete PGP encrypt for %s on %s: %s. marking the file as unavailable.",
-                            rcounter, rfileinfo['receiver']['name'], rfileinfo['path'], excep)
-                    rfileinfo['status'] = u'unavailable'
-            elif State.tenant_cache[1].allow_unencrypted:
-                receiverfiles_map['plaintext_file_needed'] = True
-                rfileinfo['status'] = u'reference'
-                rfileinfo['path'] = plain_path
-            else:
-                rfileinfo['status'] = u'nokey'
-
-        if receiverfiles_map['plaintext_file_needed']:
-            log.debug("Not all receivers support PGP and the system allows plaintext version of files: %s saved as plaintext file %s",
-                      ifile_path, plain_path)
-
-            try:
-                with open(plain_path, "wb") as plaintext_f, SecureFile(ifile_path) as encrypted_file:
-                    chunk_size = 4096
-                    written_size = 0
-                    while True:
-                        chunk = encrypted_file.read(chunk_size)
-                        if not chunk:
-                            if written_size != receiverfiles_map['ifile_size']:
-                                log.err("Integrity error on rfile write for ifile %s; ifile_size(%d), rfile_size(%d)",
-                                        ifile_id, receiverfiles_map['ifile_size'], written_size)
-                            break
-                        written_size += len(chunk)
-                        plaintext_f.write(chunk)
-
-                receiverfiles_map['ifile_path'] = plain_path
-            except Exception as excep:
-                log.err("Unable to create plaintext file %s: %s", plain_path, excep)
+    ifile_path = receiverfiles_map['ifile_path']
+    ifile_name = os.path.basename(ifile_path).split('.')[0]
+    plain_path = os.path.join(Settings.submission_path, "%s.plain" % ifile_name)
+
+    receiverfiles_map['plaintext_file_needed'] = False
+
+    pgp_rfiles = []
+    for rfileinfo in receiverfiles_map['rfiles']:
+        if rfileinfo['receiver']['pgp_key_public']:
+            pgp_rfiles.append(rfileinfo)
+        elif allow_unencrypted:
+            receiverfiles_map['plaintext_file_needed'] = True
+            rfileinfo['status'] = u'reference'
+            rfileinfo['path'] = plain_path
         else:
-            log.debug("All receivers support PGP or the system denies plaintext version of files: marking internalfile as removed")
+            rfileinfo['status'] = u'nokey'
 
-        # the original AES file should always be deleted
-        log.debug("Deleting the submission AES encrypted file: %s", ifile_path)
+    encrypted_size = 0
 
-        # Remove the AES file
+    if pgp_rfiles:
         try:
-            os.remove(ifile_path)
-        except OSError as ose:
-            log.err("Unable to remove %s: %s", ifile_path, ose.strerror)
+            results = fsops_pgp_encrypt_multiple(ifile_path, [rfileinfo['receiver'] for rfileinfo in pgp_rfiles])
+        except Exception as excep:
+            results = [excep] * len(pgp_rfiles)
+
+        for rcounter, (rfileinfo, result) in enumerate(zip(pgp_rfiles, results)):
+            if isinstance(result, Exception):
+                log.err("%d# Unable to complete PGP encrypt for %s on %s: %s. marking the file as unavailable.",
+                        rcounter, rfileinfo['receiver']['name'], rfileinfo['path'], result)
+                rfileinfo['status'] = u'unavailable'
+                continue
+
+            new_path, new_size = result
+
+            log.debug("%d# Switch on Receiver File for %s path %s => %s size %d => %d",
+                      rcounter,  rfileinfo['receiver']['name'], rfileinfo['path'],
+                      new_path, rfileinfo['size'], new_size)
+
+            rfileinfo['path'] = new_path
+            rfileinfo['size'] = new_size
+            rfileinfo['status'] = u'encrypted'
+
+            encrypted_size += new_size
+
+    if receiverfiles_map['plaintext_file_needed']:
+        log.debug("Not all receivers support PGP and the system allows plaintext version of files: %s saved as plaintext file %s",
+                  ifile_path, plain_path)
 
-        # Remove the AES file key
         try:
-            os.remove(os.path.join(Settings.ramdisk_path, ("%s%s" % (Settings.AES_keyfile_prefix, ifile_name))))
-        except OSError as ose:
-            log.err("Unable to remove keyfile associated with %s: %s", ifile_path, ose.strerror)
+            with open(plain_path, "wb") as plaintext_f, SecureFile(ifile_path) as encrypted_file:
+                chunk_size = 4096
+                written_size = 0
+                while True:
+                    chunk = encrypted_file.read(chunk_size)
+                    if not chunk:
+                        if written_size != receiverfiles_map['ifile_size']:
+                            log.err("Integrity error on rfile write for ifile %s; ifile_size(%d), rfile_size(%d)",
+                                    ifile_id, receiverfiles_map['ifile_size'], written_size)
+                        break
+                    written_size += len(chunk)
+                    plaintext_f.write(chunk)
+
+            receiverfiles_map['ifile_path'] = plain_path
+        except Exception as excep:
+            log.err("Unable to create plaintext file %s: %s", plain_path, excep)
+    else:
+        log.debug("All receivers support PGP or the system denies plaintext version of files: marking internalfile as removed")
+
+    # the original AES file should always be deleted
+    log.debug("Deleting the submission AES encrypted file: %s", ifile_path)
+
+    # Remove the AES file
+    try:
+        os.remove(ifile_path)
+    except OSError as ose:
+        log.err("Unable to remove %s: %s", ifile_path, ose.strerror)
+
+    # Remove the AES file key
+    try:
+        os.remove(os.path.join(Settings.ramdisk_path, ("%s%s" % (Settings.AES_keyfile_prefix, ifile_name))))
+    except OSError as ose:
+        log.err("Unable to remove keyfile associated with %s: %s", ifile_path, ose.strerror)
+
+    return encrypted_size
+
+
+def process_files(receiverfiles_maps, metrics=None):
+    """
+    @param receiverfiles_maps: the mapping of ifile/rfiles to be created on filesystem
+    @param metrics: an optional dict where to account the progress of the processing
+    @return: return None
+
+    The files are processed concurrently by a bounded pool of threads while
+    the encryption is performed by the gpg processes.
+    """
+    allow_unencrypted = State.tenant_cache[1].allow_unencrypted
+
+    if metrics is None:
+        metrics = {}
+
+    metrics.update({
+        'files': len(receiverfiles_maps),
+        'files_processed': 0,
+        'bytes_processed': 0,
+        'bytes_encrypted': 0
+    })
+
+    lock = threading.Lock()
+
+    def worker(item):
+        ifile_id, receiverfiles_map = item
+        ifile_size = receiverfiles_map['ifile_size']
+
+        encrypted_size = process_file(ifile_id, receiverfiles_map, allow_unencrypted)
+
+        with lock:
+            metrics['files_processed'] += 1
+            metrics['bytes_processed'] += ifile_size
+            metrics['bytes_encrypted'] += encrypted_size
+
+    pool = ThreadPool(min(Settings.delivery_threads, len(receiverfiles_maps)))
+
+    try:
+        pool.map(worker, receiverfiles_maps.items())
+    finally:
+        pool.close()
+        pool.join()
 
 
 @transact_sync
@@ -231,5 +418,19 @@ class DeliverySchedule(LoopingJob):
         """
         receiverfiles_maps = receiverfile_planning()
         if receiverfiles_maps:
-            process_files(receiverfiles_maps)
+            start_time = time.time()
+
+            # the metrics are replaced at every run that processes files
+            # and updated while the files are being processed
+            self.metrics = {}
+            process_files(receiverfiles_maps, self.metrics)
             update_internalfile_and_store_receiverfiles(receiverfiles_maps)
+
+            duration = time.time() - start_time
+            self.metrics['duration'] = int(duration * 1000)
+            self.metrics['throughput'] = int(self.metrics['bytes_processed'] / duration) if duration else 0
+
+            log.debug("Delivery processed %d files (%d bytes) in %d ms",
+                      self.metrics['files_processed'],
+                      self.metrics['bytes_processed'],
+                      self.metrics['duration'])
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 # Implement the notification of new submissions
-import copy
+from collections import OrderedDict
 
 from storm.expr import In
 
@@ -10,15 +10,19 @@ from globaleaks import models
 from globaleaks.handlers.admin.context import admin_serialize_context
 from globaleaks.handlers.admin.node import db_admin_serialize_node
 from globaleaks.handlers.admin.notification import db_get_notification
-from globaleaks.handlers.rtip import serialize_rtip, serialize_message, serialize_comment
+from globaleaks.handlers.rtip import serialize_message, serialize_comment
+from globaleaks.handlers.submission import db_serialize_archived_questionnaire_schema, \
+    db_serialize_questionnaire_answers, get_submission_sequence_number
 from globaleaks.handlers.user import user_serialize_user
 from globaleaks.jobs.base import NetLoopingJob
 from globaleaks.orm import transact, transact_sync
+from globaleaks.rest.apicache import ApiCache
 from globaleaks.security import encrypt_message
 from globaleaks.state import State
-from globaleaks.utils.mailutils import sendmail
+from globaleaks.utils.mailutils import get_smtp_config, sendmail
+from globaleaks.utils.smtppool import SMTPPool
 from globaleaks.utils.templating import Templating
-from globaleaks.utils.utility import log
+from globaleaks.utils.utility import datetime_to_ISO8601, log
 
 
 trigger_template_map = {
@@ -37,38 +41,110 @@ trigger_model_map = {
 }
 
 
+# number of serializations of node, notification and contexts kept across the runs
+CONFIG_CACHE_SIZE = 256
+
+
+# tags of the API cache invalidated by the admin writes affecting each serialization
+config_cache_tags = {
+    'node': {'node'},
+    'notification': {'notification'},
+    'context': {'contexts', 'receivers'}
+}
+
+
+def serialize_tip_notification(store, rtip, itip):
+    """
+    Serialize the subset of the tip referenced by the notification templates
+    """
+    return {
+        'id': rtip.id,
+        'sequence_number': get_submission_sequence_number(itip),
+        'label': rtip.label,
+        'creation_date': datetime_to_ISO8601(itip.creation_date),
+        'enable_notifications': bool(rtip.enable_notifications)
+    }
+
+
+class TipNotificationSerialization(dict):
+    """
+    Serialization of a tip whose questionnaire and answers are serialized
+    only if accessed while expanding the templates
+
+    The answers could be referenced by the templates as well as by any text
+    expanded in them (e.g. the label of the tip); the object is valid only
+    within the transaction of its creation.
+    """
+    def __init__(self, store, rtip, itip, language):
+        dict.__init__(self, serialize_tip_notification(store, rtip, itip))
+        self.answers_args = (store, rtip, itip, language)
+
+    def __missing__(self, key):
+        if key not in ('questionnaire', 'answers') or self.answers_args is None:
+            raise KeyError(key)
+
+        store, rtip, itip, language = self.answers_args
+        self.answers_args = None
+
+        self['questionnaire'] = db_serialize_archived_questionnaire_schema(store, itip.questionnaire_hash, language)
+        self['answers'] = db_serialize_questionnaire_answers(store, rtip, itip)
+
+        return self[key]
+
+
 class MailGenerator(object):
+    # LRU cache of the configuration serializations shared by the runs of the job;
+    # each entry is valid until an invalidation of its tags in the API cache
+    config_cache = OrderedDict()
+
     def __init__(self):
         self.cache = {}
 
+    @classmethod
+    def get_cached_config(cls, key, obj_id, language, serializer, *args):
+        cache_key = (key, obj_id, language)
+
+        # the generation is read before the serialization so that an invalidation
+        # happening meanwhile causes the entry to be recomputed on the next access
+        generation = ApiCache.get_tags_generation(config_cache_tags[key])
+
+        entry = cls.config_cache.pop(cache_key, None)
+        if entry is None or entry[0] != generation:
+            entry = (generation, serializer(*args))
+
+        cls.config_cache[cache_key] = entry
+
+        while len(cls.config_cache) > CONFIG_CACHE_SIZE:
+            cls.config_cache.popitem(last=False)
+
+        return entry[1]
+
     def serialize_config(self, store, key, language):
-        cache_key = key + '-' + language
-        cache_obj = None
+        if key == 'node':
+            return self.get_cached_config(key, None, language, db_admin_serialize_node, store, language)
+        elif key == 'notification':
+            return self.get_cached_config(key, None, language, db_get_notification, store, language)
 
-        if cache_key not in self.cache:
-            if key == 'node':
-                cache_obj = db_admin_serialize_node(store, language)
-            elif key == 'notification':
-                cache_obj = db_get_notification(store, language)
+    def serialize_tip(self, store, rtip, itip, language):
+        cache_key = 'tip-' + rtip.id + '-' + language
 
-            self.cache[cache_key] = cache_obj
+        if cache_key not in self.cache:
+            self.cache[cache_key] = TipNotificationSerialization(store, rtip, itip, language)
 
         return self.cache[cache_key]
 
     def serialize_obj(self, store, key, obj, language):
         obj_id = obj.id
 
+        if key == 'context':
+            return self.get_cached_config(key, obj_id, language, admin_serialize_context, store, obj, language)
+
         cache_key = key + '-' + obj_id + '-' + language
         cache_obj = None
 
         if cache_key not in self.cache:
             if key == 'user':
                 cache_obj = user_serialize_user(store, obj, language)
-            elif key == 'context':
-                cache_obj = admin_serialize_context(store, obj, language)
-            elif key == 'tip':
-                itip = store.find(models.InternalTip, id=obj.internaltip_id).one()
-                cache_obj = serialize_rtip(store, obj, itip, language)
             elif key == 'message':
                 cache_obj = serialize_message(store, obj)
             elif key == 'comment':
@@ -81,13 +157,13 @@ class MailGenerator(object):
         return self.cache[cache_key]
 
     def process_ReceiverTip(self, store, rtip, data):
-        user, context = store.find((models.User, models.Context),
-                                   models.User.id == rtip.receiver_id,
-                                   models.InternalTip.id == rtip.internaltip_id,
-                                   models.Context.id == models.InternalTip.context_id).one()
+        user, context, itip = store.find((models.User, models.Context, models.InternalTip),
+                                         models.User.id == rtip.receiver_id,
+                                         models.InternalTip.id == rtip.internaltip_id,
+                                         models.Context.id == models.InternalTip.context_id).one()
 
         data['user'] = self.serialize_obj(store, 'user', user, user.language)
-        data['tip'] = self.serialize_obj(store, 'tip', rtip, user.language)
+        data['tip'] = self.serialize_tip(store, rtip, itip, user.language)
         data['context'] = self.serialize_obj(store, 'context', context, user.language)
 
         self.process_mail_creation(store, data)
@@ -97,55 +173,54 @@ class MailGenerator(object):
         if message.type == u"receiver":
             return
 
-        user, context, rtip = store.find((models.User, models.Context, models.ReceiverTip),
-                                         models.User.id == models.ReceiverTip.receiver_id,
-                                         models.ReceiverTip.id == models.Message.receivertip_id,
-                                         models.Context.id == models.InternalTip.context_id,
-                                         models.InternalTip.id == models.ReceiverTip.internaltip_id,
-                                         models.Message.id == message.id).one()
+        user, context, rtip, itip = store.find((models.User, models.Context, models.ReceiverTip, models.InternalTip),
+                                               models.User.id == models.ReceiverTip.receiver_id,
+                                               models.ReceiverTip.id == models.Message.receivertip_id,
+                                               models.Context.id == models.InternalTip.context_id,
+                                               models.InternalTip.id == models.ReceiverTip.internaltip_id,
+                                               models.Message.id == message.id).one()
 
         data['user'] = self.serialize_obj(store, 'user', user, user.language)
-        data['tip'] = self.serialize_obj(store, 'tip', rtip, user.language)
+        data['tip'] = self.serialize_tip(store, rtip, itip, user.language)
         data['context'] = self.serialize_obj(store, 'context', context, user.language)
         data['message'] = self.serialize_obj(store, 'message', message, user.language)
 
         self.process_mail_creation(store, data)
 
     def process_Comment(self, store, comment, data):
-        for user, context, rtip in store.find((models.User, models.Context, models.ReceiverTip),
-                                              models.User.id == models.ReceiverTip.receiver_id,
-                                              models.ReceiverTip.internaltip_id == comment.internaltip_id,
-                                              models.Context.id == models.InternalTip.context_id,
-                                              models.InternalTip.id == comment.internaltip_id,
-                                              models.ReceiverTip.internaltip_id == comment.internaltip_id):
+        for user, context, rtip, itip in store.find((models.User, models.Context, models.ReceiverTip, models.InternalTip),
+                                                    models.User.id == models.ReceiverTip.receiver_id,
+                                                    models.ReceiverTip.internaltip_id == comment.internaltip_id,
+                                                    models.Context.id == models.InternalTip.context_id,
+                                                    models.InternalTip.id == comment.internaltip_id):
 
             # avoid to send emails to the receiver that written the comment
             if comment.author_id == rtip.receiver_id:
                 continue
 
-            dataX = copy.deepcopy(data)
+            # the serializations are shared and never modified so that a shallow copy is sufficient
+            dataX = dict(data)
             dataX['user'] = self.serialize_obj(store, 'user', user, user.language)
-            dataX['tip'] = self.serialize_obj(store, 'tip', rtip, user.language)
+            dataX['tip'] = self.serialize_tip(store, rtip, itip, user.language)
             dataX['context'] = self.serialize_obj(store, 'context', context, user.language)
             dataX['comment'] = self.serialize_obj(store, 'comment', comment, user.language)
 
             self.process_mail_creation(store, dataX)
 
     def process_ReceiverFile(self, store, rfile, data):
-        user, context, rtip, ifile = store.find((models.User, models.Context, models.ReceiverTip, models.InternalFile),
-                                                models.User.id == models.ReceiverTip.receiver_id,
-                                                models.InternalFile.id == rfile.internalfile_id,
-                                                models.InternalTip.id == models.InternalFile.internaltip_id,
-                                                models.ReceiverTip.id == rfile.receivertip_id,
-                                                models.Context.id == models.InternalTip.context_id).one()
+        user, context, rtip, itip, ifile = store.find((models.User, models.Context, models.ReceiverTip, models.InternalTip, models.InternalFile),
+                                                      models.User.id == models.ReceiverTip.receiver_id,
+                                                      models.InternalFile.id == rfile.internalfile_id,
+                                                      models.InternalTip.id == models.InternalFile.internaltip_id,
+                                                      models.ReceiverTip.id == rfile.receivertip_id,
+                                                      models.Context.id == models.InternalTip.context_id).one()
 
         # avoid sending an email for the files that have been loaded during the initial submission
         if ifile.submission:
             return
 
         data['user'] = self.serialize_obj(store, 'user', user, user.language)
-        data['tip'] = self.serialize_obj(store, 'tip', rtip, user.language)
-        data['user'] = self.serialize_obj(store, 'user', user, user.language)
+        data['tip'] = self.serialize_tip(store, rtip, itip, user.language)
         data['context'] = self.serialize_obj(store, 'context', context, user.language)
         data['file'] = self.serialize_obj(store, 'file', ifile, user.language)
 
@@ -258,9 +333,20 @@ class NotificationSchedule(NetLoopingJob):
         if success:
             self.mails_to_delete.append(mail['id'])
 
+    def sendmails(self, mails):
+        return defer.DeferredList([self.sendmail(mail) for mail in mails])
+
     def spool_emails(self):
-        for mail in get_mails_from_the_pool():
-            threads.blockingCallFromThread(reactor, self.sendmail, mail)
+        backoff = SMTPPool.get_backoff(get_smtp_config())
+        if backoff:
+            # the processing attempts of the mails are not consumed while the server is unreachable
+            log.debug("Notification: SMTP server in backoff for %d seconds", backoff)
+            return
+
+        # the mails are sent concurrently on the sessions of the SMTP pool
+        mails = get_mails_from_the_pool()
+        if mails:
+            threads.blockingCallFromThread(reactor, self.sendmails, mails)
 
         delete_sent_mails(self.mails_to_delete)
 
@@ -45,8 +45,6 @@ def set_onion_service_info(store, hostname, key):
 
     State.tenant_cache[1].onionservice = hostname
 
-    ApiCache.invalidate()
-
 
 class OnionService(BaseJob):
     name = "OnionService"
@@ -81,6 +79,7 @@ class OnionService(BaseJob):
                 if not hostname and not key:
                     yield set_onion_service_info(ephs.hostname, ephs.private_key)
                     yield refresh_memory_variables()
+                    ApiCache.invalidate('node')
 
             d = ephs.add_to_tor(self.tor_conn.protocol)
             d.addCallback(initialization_callback) # pylint: disable=no-member
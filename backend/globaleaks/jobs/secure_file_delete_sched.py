@@ -0,0 +1,122 @@
+# -*- coding: utf-8
+# Implementation of the secure deletion of the files enqueued in SecureFileDelete
+import os
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from storm.expr import In
+
+from globaleaks import models
+from globaleaks.jobs.base import LoopingJob
+from globaleaks.orm import transact_sync
+from globaleaks.security import overwrite_and_remove
+from globaleaks.settings import Settings
+from globaleaks.utils.utility import log
+
+
+__all__ = ['SecureFileDeleteSchedule']
+
+
+class BandwidthLimiter(object):
+    """
+    Token bucket limiting the bytes per second written by the deletion threads
+    to Settings.secure_file_delete_bandwidth
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.allowance = 0
+        self.last = time.time()
+
+    def consume(self, n):
+        rate = Settings.secure_file_delete_bandwidth
+        if rate <= 0:
+            return
+
+        with self.lock:
+            now = time.time()
+            self.allowance = min(rate, self.allowance + (now - self.last) * rate)
+            self.last = now
+
+            # the bytes are reserved in advance so that concurrent threads queue up
+            self.allowance -= n
+            delay = -self.allowance / float(rate) if self.allowance < 0 else 0
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+@transact_sync
+def get_files_to_secure_delete(store, limit):
+    return [(f.id, f.filepath) for f in store.find(models.SecureFileDelete)[:limit]]
+
+
+@transact_sync
+def commit_files_deletion(store, ids):
+    store.find(models.SecureFileDelete, In(models.SecureFileDelete.id, ids)).remove()
+
+
+@transact_sync
+def count_files_to_secure_delete(store):
+    return store.find(models.SecureFileDelete).count()
+
+
+class SecureFileDeleteSchedule(LoopingJob):
+    """
+    Drain continuously the queue of the files to be securely deleted.
+
+    The files are overwritten by Settings.secure_file_delete_threads threads
+    sharing the I/O bandwidth cap and their completion is committed in batches
+    of Settings.secure_file_delete_batch_size files.
+    """
+    name = "SecureFileDelete"
+    interval = 10
+    monitor_interval = 10 * 60
+
+    def __init__(self):
+        LoopingJob.__init__(self)
+        self.limiter = BandwidthLimiter()
+
+    def delete_file(self, filepath):
+        if not os.path.isfile(filepath):
+            log.err("Tried to permanently delete a non existent file: %s" % filepath)
+            return 0
+
+        return overwrite_and_remove(filepath, throttle=self.limiter.consume)
+
+    def operation(self):
+        start_time = time.time()
+        files = 0
+        overwritten = 0
+        pool = None
+
+        try:
+            while not self.shutdown:
+                batch = get_files_to_secure_delete(Settings.secure_file_delete_batch_size)
+                if not batch:
+                    break
+
+                if pool is None:
+                    pool = ThreadPool(Settings.secure_file_delete_threads)
+
+                overwritten += sum(pool.map(self.delete_file, [filepath for _, filepath in batch]))
+                commit_files_deletion([id for id, _ in batch])
+                files += len(batch)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        duration = time.time() - start_time
+
+        self.metrics = {
+            'backlog': count_files_to_secure_delete(),
+            'files_deleted': files,
+            'bytes_overwritten': overwritten,
+            'duration': int(duration * 1000),
+            'throughput': int(overwritten / duration) if duration else 0
+        }
+
+        if files:
+            log.debug("Secure deletion of %d files (%d bytes) completed in %d ms",
+                      files, overwritten, self.metrics['duration'])
@@ -5,7 +5,8 @@ ORM Models definitions.
 from __future__ import absolute_import
 
 from datetime import timedelta
-from storm.locals import Bool, Int, Unicode, Storm, JSON
+from storm.expr import In
+from storm.locals import Bool, Int, Unicode, Storm
 
 from globaleaks.models.validators import shorttext_v, longtext_v, \
     shortlocal_v, longlocal_v, shorturl_v, longurl_v, range_v
@@ -14,7 +15,7 @@ from globaleaks.rest import errors
 from globaleaks.settings import Settings
 from globaleaks.utils.utility import datetime_now, datetime_null, datetime_to_ISO8601, uuid4
 
-from .properties import MetaModel, DateTime
+from .properties import MetaModel, DateTime, JSON
 
 
 def db_forge_obj(store, mock_class, mock_fields):
@@ -41,6 +42,26 @@ def get(store, model, *args, **kwargs):
     return db_get(store, model, *args, **kwargs)
 
 
+# maximum number of ids bound in a single IN query
+DB_IN_QUERY_SIZE = 500
+
+
+def db_get_map(store, model, ids):
+    """
+    Fetch the objects with the given ids with a query every DB_IN_QUERY_SIZE ids
+
+    @return: a dict mapping each id to its object
+    """
+    ids = list(set(ids) - {None})
+
+    ret = {}
+    for i in range(0, len(ids), DB_IN_QUERY_SIZE):
+        for obj in store.find(model, In(model.id, ids[i:i + DB_IN_QUERY_SIZE])):
+            ret[obj.id] = obj
+
+    return ret
+
+
 def db_delete(store, model, *args, **kwargs):
     return store.find(model, *args, **kwargs).remove()
 
@@ -1,9 +1,10 @@
 from storm.expr import Not, In
-from storm.locals import Bool, Unicode, JSON
+from storm.locals import Bool, Unicode
 
 from globaleaks import __version__
 from globaleaks.models import config_desc, Model
 from globaleaks.models.config_desc import GLConfig
+from globaleaks.models.properties import JSON
 from globaleaks.utils.utility import log
 
 
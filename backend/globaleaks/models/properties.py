@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 import datetime
-from storm.locals import DateTime as _DateTime
+from storm.locals import DateTime as _DateTime, JSON as _JSON
 from storm.properties import Property
 from storm.properties import PropertyPublisherMeta
-from storm.variables import DateTimeVariable as _DateTimeVariable
+from storm.variables import DateTimeVariable as _DateTimeVariable, JSONVariable as _JSONVariable
+
+from globaleaks.rest.codec import codec
 
 __all__ = ['MetaModel']
 
@@ -51,3 +53,26 @@ class DateTime(_DateTime):
     Re-define storm's property datetime to use our parser.
     """
     variable_class = DateTimeVariable
+
+
+class JSONVariable(_JSONVariable):
+    """
+    Extend storm variable for json objects to use the codec of the REST API.
+    """
+    __slots__ = ()
+
+    def _loads(self, value):
+        if not isinstance(value, unicode):
+            raise TypeError("Cannot safely assume encoding of byte string %r." % value)
+
+        return codec.loads_text(value)
+
+    def _dumps(self, value):
+        return codec.dumps_text(value)
+
+
+class JSON(_JSON):
+    """
+    Re-define storm's property json to use our codec.
+    """
+    variable_class = JSONVariable
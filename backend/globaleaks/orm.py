@@ -1,8 +1,10 @@
 # -*- coding: utf-8
 # orm: contains main hooks to storm ORM
 # ******
+import os
 import sys
 import threading
+import time
 
 from datetime import datetime
 
@@ -20,8 +22,12 @@ from globaleaks.utils.mailutils import schedule_exception_email
 from globaleaks.utils.utility import log, timedelta_to_milliseconds
 
 
-def get_store():
-    return Store(create_database(Settings.db_uri))
+def get_store(readonly=False):
+    db_uri = Settings.db_uri
+    if readonly:
+        db_uri += '&query_only=ON'
+
+    return Store(create_database(db_uri))
 
 
 class SQLite(sqlite.Database):
@@ -31,16 +37,36 @@ class SQLite(sqlite.Database):
         self._filename = uri.database or ":memory:"
         self._timeout = float(uri.options.get("timeout", 30))
         self._foreign_keys = uri.options.get("foreign_keys")
+        self._journal_mode = uri.options.get("journal_mode")
+        self._query_only = uri.options.get("query_only")
+        self._cached_statements = int(uri.options.get("cached_statements", 100))
 
     def raw_connect(self):
+        # check_same_thread is disabled because pooled connections are handed
+        # over between threads; the StorePool guarantees that a connection is
+        # never used by two threads at the same time.
         raw_connection = sqlite.sqlite.connect(self._filename,
                                                timeout=self._timeout,
-                                               isolation_level=None)
+                                               isolation_level=None,
+                                               check_same_thread=False,
+                                               cached_statements=self._cached_statements)
 
         if self._foreign_keys is not None:
             raw_connection.execute("PRAGMA foreign_keys = %s" %
                                    (self._foreign_keys,))
 
+        if self._journal_mode is not None:
+            # auto_vacuum must be configured before the journal mode switch
+            # initializes the database file, otherwise it can't be enabled
+            # anymore by the schema creation; on existing databases it is a no-op.
+            raw_connection.execute("PRAGMA auto_vacuum = FULL")
+            raw_connection.execute("PRAGMA journal_mode = %s" %
+                                   (self._journal_mode,))
+
+        if self._query_only is not None:
+            raw_connection.execute("PRAGMA query_only = %s" %
+                                   (self._query_only,))
+
         raw_connection.execute("PRAGMA secure_delete = ON")
 
         return raw_connection
@@ -50,6 +76,136 @@ sqlite.SQLite = SQLite
 sqlite.create_from_uri = SQLite
 
 
+class StorePool(object):
+    """
+    Pool of persistent Storm stores.
+
+    Stores are kept open across transactions so that the sqlite connection,
+    its pragmas and its prepared statements cache are reused. Each thread is
+    given back the store it used last whenever possible; at most `size`
+    stores are checked out at the same time.
+    """
+    def __init__(self, readonly, size):
+        self.readonly = readonly
+        self.size = size
+        self.semaphore = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self.wait_time = 0.0
+
+    @staticmethod
+    def get_file_id(store):
+        try:
+            st = os.stat(store.get_database()._filename)
+            return st.st_dev, st.st_ino
+        except OSError:
+            return None
+
+    def is_healthy(self, store):
+        """
+        Verify that the store is connected to the current database file
+        and that its connection is still usable.
+        """
+        if store.gl_db_uri != Settings.db_uri or \
+           store.gl_file_id != self.get_file_id(store):
+            return False
+
+        try:
+            store.execute("SELECT 1").get_one()
+        except Exception:
+            return False
+
+        return True
+
+    def discard(self, store):
+        self.discarded += 1
+
+        try:
+            store.close()
+        except Exception:
+            pass
+
+    def create(self):
+        store = get_store(self.readonly)
+        store.gl_db_uri = Settings.db_uri
+        store.gl_file_id = self.get_file_id(store)
+        return store
+
+    def get(self):
+        start_time = time.time()
+        self.semaphore.acquire()
+        self.wait_time += time.time() - start_time
+
+        try:
+            key = threading.current_thread().ident
+
+            with self.lock:
+                store = self.idle.pop(key, None)
+                if store is None and self.idle:
+                    _, store = self.idle.popitem()
+
+            if store is not None:
+                if self.is_healthy(store):
+                    self.hits += 1
+                    return store
+
+                self.discard(store)
+
+            self.misses += 1
+            return self.create()
+        except:
+            self.semaphore.release()
+            raise
+
+    def put(self, store):
+        key = threading.current_thread().ident
+
+        with self.lock:
+            self.idle[key] = store
+
+        self.semaphore.release()
+
+    def close(self):
+        with self.lock:
+            stores = self.idle.values()
+            self.idle.clear()
+
+        for store in stores:
+            self.discard(store)
+
+    def get_stats(self):
+        return {
+            'size': self.size,
+            'idle': len(self.idle),
+            'hits': self.hits,
+            'misses': self.misses,
+            'discarded': self.discarded,
+            'wait_time': int(self.wait_time * 1000)
+        }
+
+
+rw_store_pool = StorePool(False, 1)
+ro_store_pool = StorePool(True, Settings.orm_ro_threads)
+
+
+def close_store_pools():
+    rw_store_pool.close()
+    ro_store_pool.close()
+
+
+def get_store_pools_stats():
+    return {
+        'rw': rw_store_pool.get_stats(),
+        'ro': ro_store_pool.get_stats()
+    }
+
+
 transact_lock = threading.Lock()
 
 
@@ -57,8 +213,13 @@ class transact(object):
     """
     Class decorator for managing transactions.
     Because Storm sucks.
+
+    Transactions decorated with @transact (or its alias @transact_rw) are
+    serialized through the single writer thread of State.orm_tp.
     """
     timelimit = 30000
+    readonly = False
+    store_pool = rw_store_pool
 
     def __init__(self, method):
         self.method = method
@@ -87,32 +248,65 @@ class transact(object):
         passing the store to it.
         """
         with transact_lock: # pylint: disable=not-context-manager
-            start_time = datetime.now()
-            store = get_store()
+            return self._execute(function, *args, **kwargs)
 
-            try:
-                if self.instance:
-                    result = function(self.instance, store, *args, **kwargs)
-                else:
-                    result = function(store, *args, **kwargs)
+    def _execute(self, function, *args, **kwargs):
+        start_time = datetime.now()
+        store = self.store_pool.get()
 
-                store.commit()
-            except:
+        try:
+            if self.instance:
+                result = function(self.instance, store, *args, **kwargs)
+            else:
+                result = function(store, *args, **kwargs)
+
+            if self.readonly:
                 store.rollback()
-                raise
             else:
-                return result
-            finally:
-                store.reset()
-                store.close()
-
-                duration = timedelta_to_milliseconds(datetime.now() - start_time)
-                err_tup = "Query [%s] executed in %.1fms", self.method.__name__, duration
-                if duration > self.timelimit:
-                    log.err(*err_tup)
-                    schedule_exception_email(*err_tup)
-                else:
-                    log.debug(*err_tup)
+                store.commit()
+        except:
+            store.rollback()
+            raise
+        else:
+            return result
+        finally:
+            store.reset()
+            self.store_pool.put(store)
+
+            duration = timedelta_to_milliseconds(datetime.now() - start_time)
+            err_tup = "Query [%s] executed in %.1fms", self.method.__name__, duration
+            if duration > self.timelimit:
+                log.err(*err_tup)
+                schedule_exception_email(*err_tup)
+            else:
+                log.debug(*err_tup)
+
+
+transact_rw = transact
+
+
+class transact_ro(transact):
+    """
+    Class decorator for read-only transactions.
+
+    Read-only transactions run in parallel on the State.orm_ro_tp thread pool
+    without acquiring the transact_lock; thanks to the WAL journal each of them
+    reads a consistent snapshot of the database while the writer is running.
+    Their connections are opened with PRAGMA query_only so that any attempt
+    to write raises an exception.
+    """
+    readonly = True
+    store_pool = ro_store_pool
+
+    def run(self, function, *args, **kwargs):
+        return deferToThreadPool(reactor,
+                                 State.orm_ro_tp,
+                                 function,
+                                 *args,
+                                 **kwargs)
+
+    def _wrap(self, function, *args, **kwargs):
+        return self._execute(function, *args, **kwargs)
 
 
 class transact_sync(transact):
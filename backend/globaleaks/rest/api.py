@@ -5,7 +5,6 @@
 #   This file defines the URI mapping for the GlobaLeaks API and its factory
 
 import json
-import re
 import types
 import urlparse
 
@@ -36,6 +35,8 @@ from globaleaks.handlers.admin import statistics as admin_statistics
 from globaleaks.handlers.admin import step as admin_step
 from globaleaks.handlers.admin import user as admin_user
 from globaleaks.rest import apicache, requests, errors
+from globaleaks.rest.codec import JSONStreamProducer, codec
+from globaleaks.rest.router import Router
 from globaleaks.settings import Settings
 from globaleaks.state import State
 from globaleaks.utils.mailutils import extract_exception_traceback_and_schedule_email
@@ -122,6 +123,7 @@ api_spec = [
     (r'/admin/activities/(summary|details)', admin_statistics.RecentEventsCollection),
     (r'/admin/anomalies', admin_statistics.AnomalyCollection),
     (r'/admin/jobs', admin_statistics.JobsTiming),
+    (r'/admin/metrics', admin_statistics.Metrics),
     (r'/admin/l10n/(' + '|'.join(LANGUAGES_SUPPORTED_CODES) + ')', admin_l10n.AdminL10NHandler),
     (r'/admin/files/(logo|favicon|css|homepage|script)', admin_files.FileInstance),
     (r'/admin/config/tls', https.ConfigHandler),
@@ -172,13 +174,13 @@ def decorate_method(h, method):
 
 
 class APIResourceWrapper(Resource):
-    _registry = None
+    _router = None
     isLeaf = True
     method_map = {'get': 200, 'post': 201, 'put': 202, 'delete': 200}
 
     def __init__(self):
         Resource.__init__(self)
-        self._registry = []
+        self._router = Router()
 
         for tup in api_spec:
             args = {}
@@ -187,19 +189,15 @@ class APIResourceWrapper(Resource):
             else:
                 pattern, handler, args = tup
 
-            if not pattern.startswith("^"):
-                pattern = "^" + pattern
-
-            if not pattern.endswith("$"):
-                pattern += "$"
-
             if not hasattr(handler, '_decorated'):
                 handler._decorated = True
                 for m in ['get', 'put', 'post', 'delete']:
                     if hasattr(handler, m):
                         decorate_method(handler, m)
 
-            self._registry.append((re.compile(pattern), handler, args))
+            self._router.add(pattern, handler, args)
+
+        self._router.compile()
 
     def should_redirect_tor(self, request):
         if request.client_using_tor and \
@@ -310,16 +308,13 @@ class APIResourceWrapper(Resource):
             self.redirect_https(request)
             return b''
 
-        match = None
-        for regexp, handler, args in self._registry:
-            match = regexp.match(request.path)
-            if match:
-                break
-
-        if match is None:
+        route = self._router.match(request.path)
+        if route is None:
             self.handle_exception(errors.ResourceNotFound(), request)
             return b''
 
+        match, handler, args = route
+
         method = request.method.lower()
         if not method in self.method_map or not hasattr(handler, method):
             self.handle_exception(errors.MethodNotImplemented(), request)
@@ -353,13 +348,20 @@ class APIResourceWrapper(Resource):
             yield h.execution_check()
 
             if not request_finished[0]:
-                if ret is not None:
+                if isinstance(ret, types.ListType) and len(ret) >= Settings.json_stream_min_items:
+                    request.setHeader(b'content-type', b'application/json')
+
+                    # the large lists are encoded while they are written
+                    yield JSONStreamProducer(request, ret).start()
+
+                elif ret is not None:
                     if isinstance(ret, (types.DictType, types.ListType)):
-                        ret = json.dumps(ret, separators=(',', ':'))
+                        ret = codec.dumps(ret)
                         request.setHeader(b'content-type', b'application/json')
 
                     request.write(bytes(ret))
 
+            if not request_finished[0]:
                 request.finish()
 
         d.addErrback(concludeHandlerFailure)
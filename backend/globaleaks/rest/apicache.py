@@ -1,51 +1,234 @@
 # -*- coding: utf-8 -*-
+import gzip
+import hashlib
+import io
+from collections import OrderedDict
+
 from twisted.internet import defer
 
+from globaleaks.rest.codec import codec
+from globaleaks.settings import Settings
+
+# responses smaller than this are not worth being compressed
+GZIP_MIN_SIZE = 1024
+
+
+def gzip_compress(data, compresslevel=6):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=compresslevel, mtime=0) as f:
+        f.write(data)
+
+    return buf.getvalue()
+
+
+def etag_matches(request, etag):
+    """
+    Check the If-None-Match header of the request against an ETag
+    """
+    if_none_match = request.getHeader(b'if-none-match')
+    if if_none_match is None:
+        return False
+
+    etags = [e.strip() for e in if_none_match.split(b',')]
+
+    return b'*' in etags or etag in etags or b'W/' + etag in etags
+
+
+class CacheEntry(object):
+    """
+    A cached response kept in its encoded form together with its
+    gzip compressed version and its strong ETag.
+    """
+    def __init__(self, data, tags):
+        self.body = bytes(codec.dumps(data))
+        self.etag = b'"%s"' % hashlib.sha256(self.body).hexdigest()
+        self.tags = frozenset(tags)
+
+        self.gzip_body = None
+        if len(self.body) >= GZIP_MIN_SIZE:
+            gzip_body = gzip_compress(self.body)
+            if len(gzip_body) < len(self.body):
+                self.gzip_body = gzip_body
+
+        self.size = len(self.body) + len(self.gzip_body or b'')
+
+    def is_fresh(self, request):
+        return etag_matches(request, self.etag)
+
+    def serve(self, request):
+        request.setHeader(b'content-type', b'application/json')
+        request.setHeader(b'etag', self.etag)
+
+        if self.is_fresh(request):
+            request.setResponseCode(304)
+            return b''
+
+        if self.gzip_body is not None:
+            request.setHeader(b'vary', b'accept-encoding')
+            accept_encoding = request.getHeader(b'accept-encoding')
+            if accept_encoding is not None and b'gzip' in accept_encoding:
+                request.setHeader(b'content-encoding', b'gzip')
+                return self.gzip_body
+
+        return self.body
+
 
 class ApiCache(object):
-    memory_cache_dict = {}
+    """
+    LRU cache of the encoded API responses keyed by resource and language.
+
+    Each entry is tagged with the set of the data it depends on so that a
+    write invalidates only the entries affected by it.
+    """
+    memory_cache_dict = OrderedDict()
+    size = 0
+    generation = 0
+    flushes = 0
+    tags_generations = {}
+    hits = 0
+    misses = 0
+    evictions = 0
 
     @classmethod
     def get(cls, resource, language):
-        if resource in cls.memory_cache_dict \
-                and language in cls.memory_cache_dict[resource]:
-            return cls.memory_cache_dict[resource][language]
+        key = (resource, language)
+        entry = cls.memory_cache_dict.pop(key, None)
+        if entry is None:
+            cls.misses += 1
+            return None
+
+        cls.hits += 1
+        cls.memory_cache_dict[key] = entry
+        return entry
 
     @classmethod
-    def set(cls, resource, language, value):
-        if resource not in ApiCache.memory_cache_dict:
-            cls.memory_cache_dict[resource] = {}
+    def set(cls, resource, language, value, tags=(), generation=None):
+        """
+        Store a response in the cache.
+
+        @param generation: the generation of the cache when the computation of
+            the value started; the entry is not stored when an invalidation
+            happened meanwhile given that the value could be stale.
+        @return: the `CacheEntry` of the value
+        """
+        key = (resource, language)
+        entry = CacheEntry(value, tags)
+
+        if generation is not None and generation != cls.generation:
+            return entry
+
+        cls.drop(key)
 
-        cls.memory_cache_dict[resource][language] = value
+        if entry.size > Settings.api_cache_size:
+            return entry
+
+        cls.memory_cache_dict[key] = entry
+        cls.size += entry.size
+
+        while cls.size > Settings.api_cache_size:
+            cls.drop(next(iter(cls.memory_cache_dict)))
+            cls.evictions += 1
+
+        return entry
 
     @classmethod
-    def invalidate(cls):
-        cls.memory_cache_dict.clear()
+    def drop(cls, key):
+        entry = cls.memory_cache_dict.pop(key, None)
+        if entry is not None:
+            cls.size -= entry.size
+
+    @classmethod
+    def invalidate(cls, tags=None):
+        """
+        Invalidate the cache
+
+        @param tags: a tag or a set of tags; only the entries depending on them
+            and those not declaring any dependency are dropped. When omitted
+            the whole cache is dropped.
+        """
+        cls.generation += 1
+
+        if tags is None:
+            cls.flushes += 1
+            cls.memory_cache_dict.clear()
+            cls.size = 0
+            return
+
+        if isinstance(tags, str):
+            tags = {tags}
+
+        for tag in tags:
+            cls.tags_generations[tag] = cls.tags_generations.get(tag, 0) + 1
+
+        for key, entry in list(cls.memory_cache_dict.items()):
+            if not entry.tags or entry.tags & tags:
+                cls.drop(key)
+
+    @classmethod
+    def get_tags_generation(cls, tags):
+        """
+        @return: a value changing at every invalidation affecting the tags;
+            used by the caches of data derived by the same resources.
+        """
+        return (cls.flushes,) + tuple(cls.tags_generations.get(tag, 0) for tag in sorted(tags))
+
+    @classmethod
+    def reset_stats(cls):
+        cls.hits = cls.misses = cls.evictions = 0
+
+    @classmethod
+    def get_stats(cls):
+        return {
+            'entries': len(cls.memory_cache_dict),
+            'size': cls.size,
+            'max_size': Settings.api_cache_size,
+            'hits': cls.hits,
+            'misses': cls.misses,
+            'evictions': cls.evictions
+        }
 
 
 def decorator_cache_get(f):
     def decorator_cache_get_wrapper(self, *args, **kwargs):
-        c = ApiCache.get(self.request.path, self.request.language)
-        if c is None:
-            c = f(self, *args, **kwargs)
-            if isinstance(c, defer.Deferred):
-                def callback(data):
-                    ApiCache.set(self.request.path, self.request.language, data)
+        resource, language = self.request.path, self.request.language
+
+        def serve(entry):
+            if self.check_roles == '*':
+                # public resources may be stored by the clients and revalidated with their ETag
+                self.request.setHeader(b'cache-control', b'no-cache')
+
+            return entry.serve(self.request)
 
-                    return data
+        entry = ApiCache.get(resource, language)
+        if entry is not None:
+            return serve(entry)
 
-                c.addCallback(callback)
-            else:
-                ApiCache.set(self.request.path, self.request.language, c)
+        generation = ApiCache.generation
 
-        return c
+        def callback(data):
+            return serve(ApiCache.set(resource, language, data, self.cache_tags, generation))
+
+        c = f(self, *args, **kwargs)
+        if isinstance(c, defer.Deferred):
+            return c.addCallback(callback)
+
+        return callback(c)
 
     return decorator_cache_get_wrapper
 
 
 def decorator_cache_invalidate(f):
     def decorator_cache_invalidate_wrapper(self, *args, **kwargs):
-        ApiCache.invalidate()
-        return f(self, *args, **kwargs)
+        tags = self.invalidate_cache if self.invalidate_cache is not True else None
+
+        def callback(result):
+            ApiCache.invalidate(tags)
+            return result
+
+        c = f(self, *args, **kwargs)
+        if isinstance(c, defer.Deferred):
+            return c.addBoth(callback)
+
+        return callback(c)
 
     return decorator_cache_invalidate_wrapper
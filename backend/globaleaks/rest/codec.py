@@ -0,0 +1,136 @@
+# -*- coding: utf-8
+#   Codec
+#   *****
+#
+# JSON codec used to decode the requests, to encode the responses and to
+# store the JSON columns of the database.
+#
+# The encoders are created once and reused so that every call goes directly
+# through the C accelerated encoder of the json module, producing the same
+# output of json.dumps. When ujson is available it is used for decoding;
+# it is not used for encoding because it does not format the floats like
+# the json module.
+#
+# The large lists are encoded one item at a time while they are written to
+# the client, instead of being encoded in a single string.
+import json
+
+from twisted.internet import defer
+
+from globaleaks.settings import Settings
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+__all__ = ['JSONCodec', 'UJSONCodec', 'JSONStreamProducer', 'codec']
+
+
+class JSONCodec(object):
+    name = 'json'
+
+    def __init__(self):
+        self.encoder = json.JSONEncoder(separators=(',', ':'))
+        self.text_encoder = json.JSONEncoder(ensure_ascii=False)
+        self.decoder = json.JSONDecoder()
+
+    def dumps(self, obj):
+        """
+        @return: the compact encoding of the object as ASCII str
+        """
+        return self.encoder.encode(obj)
+
+    def loads(self, data):
+        return self.decoder.decode(data)
+
+    def iterencode(self, obj):
+        """
+        Encode an object in chunks producing the same output of dumps; the
+        items of the lists are encoded one at a time.
+        """
+        if not isinstance(obj, list):
+            yield self.dumps(obj)
+            return
+
+        yield '['
+
+        for i, item in enumerate(obj):
+            if i:
+                yield ','
+
+            yield self.dumps(item)
+
+        yield ']'
+
+    def dumps_text(self, obj):
+        """
+        @return: the encoding of the object as unicode; used by the JSON
+            columns of the database, with the format of json.dumps
+        """
+        dump = self.text_encoder.encode(obj)
+        if not isinstance(dump, unicode):
+            dump = dump.decode('utf-8')
+
+        return dump
+
+    def loads_text(self, data):
+        return self.loads(data)
+
+
+class UJSONCodec(JSONCodec):
+    name = 'ujson'
+
+    def loads(self, data):
+        # precise_float gives the same values of the json module
+        return ujson.loads(data, precise_float=True)
+
+
+codec = UJSONCodec() if ujson is not None else JSONCodec()
+
+
+class JSONStreamProducer(object):
+    """
+    Producer writing the encoding of a list to a request
+
+    The encoded items are written in chunks of Settings.file_chunk_size bytes
+    each time the transport is able to accept more data.
+    """
+    def __init__(self, request, obj):
+        self.finish = defer.Deferred()
+        self.request = request
+        self.chunks = codec.iterencode(obj)
+
+    def start(self):
+        self.request.registerProducer(self, False)
+        return self.finish
+
+    def resumeProducing(self):
+        if self.request is None:
+            return
+
+        try:
+            chunk = []
+            chunk_size = 0
+
+            for data in self.chunks:
+                chunk.append(data)
+                chunk_size += len(data)
+                if chunk_size >= Settings.file_chunk_size:
+                    break
+
+            if chunk:
+                self.request.write(b''.join(chunk))
+
+            if chunk_size < Settings.file_chunk_size:
+                self.stopProducing()
+        except:
+            self.stopProducing()
+            raise
+
+    def stopProducing(self):
+        if self.request is not None:
+            self.request.unregisterProducer()
+            self.request = None
+            self.chunks = None
+            self.finish.callback(None)
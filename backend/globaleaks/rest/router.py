@@ -0,0 +1,143 @@
+# -*- coding: utf-8
+#   router
+#   ******
+#
+# Dispatcher used by the API resource to map a request path to its handler.
+#
+# Every route of the api_spec is indexed in a character trie by the literal
+# prefix of its pattern; a lookup walks the trie along the requested path and
+# only evaluates the regular expressions of the routes whose literal prefix
+# matches, in the same order in which they appear in the api_spec.
+
+import re
+
+REGEXP_METACHARS = frozenset('\\.^$*+?{}[]|()')
+REGEXP_QUANTIFIERS = frozenset('*+?{')
+
+
+def literal_prefix(pattern):
+    """
+    Return the longest literal string every path matched by the pattern
+    starts with.
+
+    @param pattern: a regular expression anchored with ^ and $
+    @return: the literal prefix of the pattern
+    """
+    if pattern.startswith('^'):
+        pattern = pattern[1:]
+
+    # A top level alternation makes the prefix of the first branch meaningless
+    depth = 0
+    escaped = False
+    for c in pattern:
+        if escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == '|' and depth == 0:
+            return ''
+
+    prefix = ''
+    for c in pattern:
+        if c in REGEXP_METACHARS:
+            # The last literal is optional or repeated when followed by a quantifier
+            if c in REGEXP_QUANTIFIERS:
+                prefix = prefix[:-1]
+            break
+
+        prefix += c
+
+    return prefix
+
+
+class Router(object):
+    """
+    Dispatcher matching paths against a list of routes with the same
+    semantics of a linear scan: the first route of the list whose pattern
+    matches the path is returned.
+    """
+    def __init__(self):
+        self.routes = []
+        self.prefixes = []
+        self.exact = {}
+        self.tree = ({}, [])
+
+    def add(self, pattern, handler, args):
+        if not pattern.startswith('^'):
+            pattern = '^' + pattern
+
+        if not pattern.endswith('$'):
+            pattern += '$'
+
+        self.routes.append((re.compile(pattern), handler, args))
+        self.prefixes.append(literal_prefix(pattern))
+
+    def compile(self):
+        """
+        Build the radix tree of the literal prefixes of the routes; each node
+        holds the ordered list of the routes that may match a path reaching it.
+
+        Paths that are a route literal are resolved once here and served
+        through a dictionary lookup.
+        """
+        trie = ({}, [])
+        for index, prefix in enumerate(self.prefixes):
+            node = trie
+            for c in prefix:
+                node = node[0].setdefault(c, ({}, []))
+
+            node[1].append(index)
+
+        def visit(node, inherited):
+            candidates = sorted(inherited + node[1])
+            edges = {}
+            for c, child in node[0].items():
+                label = c
+                while len(child[0]) == 1 and not child[1]:
+                    c, child = list(child[0].items())[0]
+                    label += c
+
+                edges[label[0]] = (label, visit(child, candidates))
+
+            return edges, [self.routes[i] for i in candidates]
+
+        self.tree = visit(trie, [])
+
+        self.exact = {}
+        for index, prefix in enumerate(self.prefixes):
+            if prefix == self.routes[index][0].pattern[1:-1] and prefix not in self.exact:
+                self.exact[prefix] = next(route for route in self.routes if route[0].match(prefix))
+
+    @staticmethod
+    def scan(routes, path):
+        for regexp, handler, args in routes:
+            match = regexp.match(path)
+            if match:
+                return match, handler, args
+
+        return None
+
+    def match(self, path):
+        """
+        @param path: the requested path
+        @return: a tuple (match, handler, args) or None
+        """
+        route = self.exact.get(path)
+        if route is not None:
+            return route[0].match(path), route[1], route[2]
+
+        node = self.tree
+        i = 0
+        while i < len(path):
+            edge = node[0].get(path[i])
+            if edge is None or not path.startswith(edge[0], i):
+                break
+
+            i += len(edge[0])
+            node = edge[1]
+
+        return self.scan(node[1], path)
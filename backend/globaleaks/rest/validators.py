@@ -0,0 +1,235 @@
+# -*- coding: utf-8
+#   Validators
+#   **********
+#
+# Compiler of the request specifications of rest/requests into validators.
+#
+# The specifications are interpreted once, when this module is imported, and
+# turned into closures that apply the same rules of
+# BaseHandler.validate_jmessage: the keys not present in the specification are
+# stripped, while the missing keys and the values of unexpected type cause the
+# rejection of the request. The regular expressions are compiled and the
+# branching on the kind of each specification is resolved in advance, so that
+# the validation of a request costs a single pass over its content.
+import collections
+import re
+
+from globaleaks.rest import errors, requests
+from globaleaks.utils.utility import log
+
+
+def compile_python_type(python_type):
+    if python_type == requests.SkipSpecificValidation:
+        return lambda value: value is not None
+
+    if python_type == int:
+        def check_int(value):
+            if value is None:
+                return False
+
+            try:
+                int(value)
+                return True
+            except Exception:
+                return False
+
+        return check_int
+
+    if python_type == bool:
+        def check_bool(value):
+            return value == u'true' or value == u'false' or isinstance(value, bool)
+
+        return check_bool
+
+    def check_instance(value):
+        return value is not None and isinstance(value, python_type)
+
+    return check_instance
+
+
+def compile_regexp(regexp):
+    match = re.compile(regexp).match
+
+    def check_regexp(value):
+        if value is None:
+            return False
+
+        if type(value) is not unicode:
+            try:
+                value = unicode(value)
+            except Exception:
+                return False
+
+        return match(value) is not None
+
+    return check_regexp
+
+
+def compile_type(message_type, memo):
+    """
+    @return: a function returning True if a value is of the given type; the
+        function raises InvalidInputFormat when the value is a dict not
+        respecting its specification.
+    """
+    if callable(message_type):
+        return compile_python_type(message_type)
+
+    if isinstance(message_type, collections.Mapping):
+        validate_dict = compile_dict(message_type, memo)
+
+        def check_dict(value):
+            return isinstance(value, dict) and validate_dict(value)
+
+        return check_dict
+
+    if isinstance(message_type, str):
+        return compile_regexp(message_type)
+
+    if isinstance(message_type, collections.Iterable):
+        check_item = compile_type(message_type[0], memo)
+
+        def check_list(value):
+            if value is None:
+                return False
+
+            # empty list is ok
+            if not value:
+                return True
+
+            try:
+                items = iter(value)
+            except TypeError:
+                return False
+
+            for item in items:
+                if not check_item(item):
+                    return False
+
+            return True
+
+        return check_list
+
+    return lambda value: False
+
+
+def compile_dict(message_template, memo):
+    key = id(message_template)
+    if key in memo:
+        return memo[key][1]
+
+    checks = {}
+    fields = []
+
+    def validate_dict(jmessage):
+        keys_to_strip = []
+        for key, value in jmessage.items():
+            check = checks.get(key)
+            if check is None:
+                # strip whatever is not validated
+                keys_to_strip.append(key)
+                continue
+
+            if not check(value):
+                log.err("Received key %s: type validation fail", key)
+                raise errors.InvalidInputFormat("Key (%s) type validation failure" % key)
+
+        for key in keys_to_strip:
+            del jmessage[key]
+
+        for key, is_list in fields:
+            if key not in jmessage:
+                log.debug("Key %s expected but missing!", key)
+                raise errors.InvalidInputFormat("Missing key %s" % key)
+
+            # the lists may be empty but not falsy scalars like 0 or false
+            if is_list and not jmessage[key]:
+                try:
+                    iter(jmessage[key])
+                except TypeError:
+                    log.err("Expected key: %s type validation failure", key)
+                    raise errors.InvalidInputFormat("Key (%s) double validation failure" % key)
+
+        return True
+
+    # the entry is registered before compiling the children and keeps a
+    # reference to the template so that its id could not be reused
+    memo[key] = (message_template, validate_dict)
+
+    for key, value in message_template.items():
+        checks[key] = compile_type(value, memo)
+        fields.append((key, isinstance(value, list) and bool(value)))
+
+    return validate_dict
+
+
+def compile_validator(message_template, memo=None):
+    """
+    Compile the specification of a message
+
+    @return: a function that validates a message stripping the keys not
+        present in the specification; the function returns True or raises
+        InvalidInputFormat.
+    """
+    if memo is None:
+        memo = {}
+
+    if isinstance(message_template, dict):
+        validate_dict = compile_dict(message_template, memo)
+
+        def validate_message(jmessage):
+            if not isinstance(jmessage, dict):
+                raise errors.InvalidInputFormat("invalid json message: expected dict")
+
+            return validate_dict(jmessage)
+
+        return validate_message
+
+    if isinstance(message_template, list):
+        check_item = compile_type(message_template[0], memo)
+
+        def validate_list(jmessage):
+            try:
+                valid = all(check_item(x) for x in jmessage)
+            except TypeError:
+                valid = False
+
+            if not valid:
+                raise errors.InvalidInputFormat("Not every element in %s is %s" %
+                                                (jmessage, message_template[0]))
+            return True
+
+        return validate_list
+
+    def validate_invalid(jmessage):
+        raise errors.InvalidInputFormat("invalid json massage: expected dict or list")
+
+    return validate_invalid
+
+
+def compile_requests():
+    """
+    Compile all the specifications defined in rest/requests
+    """
+    memo = {}
+    validators = {}
+
+    for name, value in vars(requests).items():
+        if not name.startswith('_') and isinstance(value, (dict, list)):
+            validators[id(value)] = (value, compile_validator(value, memo))
+
+    return validators
+
+
+compiled_validators = compile_requests()
+
+
+def get_validator(message_template):
+    """
+    @return: the compiled validator of a specification; the specifications
+        not defined in rest/requests are compiled at each call.
+    """
+    entry = compiled_validators.get(id(message_template))
+    if entry is not None and entry[0] is message_template:
+        return entry[1]
+
+    return compile_validator(message_template)
@@ -13,7 +13,9 @@ import random
 import scrypt
 import shutil
 import string
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
 from gnupg import GPG
 from tempfile import _TemporaryFileWrapper
@@ -71,45 +73,49 @@ def generate_api_token():
     return token, token_hash
 
 
-def _overwrite(absolutefpath, pattern):
-    count = 0
-    length = len(pattern)
+# size of the blocks of random data used to overwrite the files
+OVERWRITE_BLOCK_SIZE = 64 * 1024
 
-    with open(absolutefpath, 'w+') as f:
-        f.seek(0)
-        while count < length:
-            f.write(pattern)
-            count += len(pattern)
 
-
-def overwrite_and_remove(absolutefpath, iterations_number=1):
+def overwrite_and_remove(absolutefpath, iterations_number=1, throttle=None):
     """
-    Overwrite the file with all_zeros, all_ones, random patterns
+    Overwrite the whole content of the file with random data and remove it
+
+    The file is not truncated so that the blocks actually allocated to it
+    are the ones overwritten.
 
-    Note: At each iteration the original size of the file is altered.
+    @param throttle: a callable invoked with the size of each block before
+        writing it; used to limit the I/O bandwidth.
+    @return: the number of bytes overwritten
     """
     log.debug("Starting secure deletion of file %s", absolutefpath)
 
-    randomgen = random.SystemRandom()
+    overwritten = 0
 
     try:
-        # in the following loop, the file is open and closed on purpose, to trigger flush operations
-        all_zeros = "\0\0\0\0" * 1024               # 4kb of zeros
-        all_ones = "FFFFFFFF".decode("hex") * 1024  # 4kb of ones
+        size = os.path.getsize(absolutefpath)
+
+        with open(absolutefpath, 'r+b') as f:
+            for iteration in range(iterations_number):
+                log.debug("Excecuting rewrite iteration (%d out of %d)",
+                          iteration, iterations_number)
 
-        for iteration in range(iterations_number):
-            OPTIMIZATION_RANDOM_BLOCK = randomgen.randint(4096, 4096 * 2)
+                f.seek(0)
 
-            random_pattern = ""
-            for _ in range(OPTIMIZATION_RANDOM_BLOCK):
-                random_pattern += str(randomgen.randrange(256))
+                written = 0
+                while written < size:
+                    n = min(OVERWRITE_BLOCK_SIZE, size - written)
 
-            log.debug("Excecuting rewrite iteration (%d out of %d)",
-                      iteration, iterations_number)
+                    if throttle is not None:
+                        throttle(n)
 
-            _overwrite(absolutefpath, all_zeros)
-            _overwrite(absolutefpath, all_ones)
-            _overwrite(absolutefpath, random_pattern)
+                    f.write(os.urandom(n))
+                    written += n
+
+                f.flush()
+                os.fsync(f.fileno())
+
+                overwritten += written
 
     except Exception as excep:
         log.err("Unable to perform secure overwrite for file %s: %s",
@@ -124,6 +130,8 @@ def overwrite_and_remove(absolutefpath, iterations_number=1):
 
     log.debug("Performed deletion of file: %s", absolutefpath)
 
+    return overwritten
+
 
 class SecureTemporaryFile(_TemporaryFileWrapper):
     """
@@ -207,6 +215,24 @@ class SecureTemporaryFile(_TemporaryFileWrapper):
 
         self.file.write(self.encryptor.update(data))
 
+    def truncate(self, size):
+        """
+        Discard the data written after the first size bytes so that the
+        following writes continue from there
+        """
+        if self.last_action == 'read':
+            raise Exception("Error: Truncate call performed after read")
+
+        self.file.truncate(size)
+        self.file.seek(size)
+
+        # the counter of the keystream is moved to the block including the offset
+        counter = (int(binascii.hexlify(self.key_counter_nonce), 16) + size // 16) % (1 << 128)
+        counter = binascii.unhexlify('%032x' % counter)
+
+        self.encryptor = Cipher(algorithms.AES(self.key), modes.CTR(counter), backend=crypto_backend).encryptor()
+        self.encryptor.update(b'\0' * (size % 16))
+
     def close(self):
         if not self.close_called:
             try:
@@ -416,6 +442,15 @@ class GLBPGP(object):
 
         return str(encrypted_obj)
 
+    def delete_key(self, key_fingerprint):
+        """
+        Remove the specified PGP key from the keyring
+        """
+        try:
+            self.gnupg.delete_keys(str(key_fingerprint))
+        except Exception as excep:
+            log.err("Error in PGP delete_keys: %s", excep)
+
     def destroy_environment(self):
         try:
             shutil.rmtree(self.gnupg.gnupghome)
@@ -423,18 +458,150 @@ class GLBPGP(object):
             log.err("Unable to clean temporary PGP environment: %s: %s", self.gnupg.gnupghome, excep)
 
 
-def encrypt_message(pgp_key_public, msg):
-    gpob = GLBPGP()
+class PGPKeyring(object):
+    """
+    Long lived GnuPG keyring shared by the encryption operations.
 
-    try:
-        fingerprint = gpob.load_key(pgp_key_public)['fingerprint']
-        body = gpob.encrypt_message(fingerprint, msg)
-    except Exception:
-        raise
-    finally:
-        gpob.destroy_environment()
+    The public keys of the users are imported once and the keyring entries are
+    indexed by fingerprint and by digest of the armored key so that the users
+    key does not need to be parsed again on each encryption.
+
+    Entries are evicted when their key expires, when invalidated because
+    the key of a user changed and in LRU order when exceeding
+    Settings.pgp_keyring_size; the removal of a key from the keyring is
+    postponed until the operations using it are completed.
+    """
+    lock = threading.Lock()
+    gpoj = None
+    entries = OrderedDict()
+    digests = {}
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    @classmethod
+    def get_environment(cls):
+        if cls.gpoj is None or not os.path.isdir(cls.gpoj.gnupg.gnupghome):
+            cls.entries.clear()
+            cls.digests.clear()
+            cls.gpoj = GLBPGP()
+
+        return cls.gpoj
+
+    @classmethod
+    def acquire(cls, key):
+        digest = sha256(key.encode('utf-8') if isinstance(key, unicode) else key)
+
+        with cls.lock:
+            gpoj = cls.get_environment()
+
+            entry = cls.entries.get(cls.digests.get(digest))
+            if entry is not None:
+                cls.hits += 1
+                cls.entries[entry['fingerprint']] = cls.entries.pop(entry['fingerprint'])
+            else:
+                cls.misses += 1
+                k = gpoj.load_key(key)
+
+                entry = cls.entries.pop(k['fingerprint'], None)
+                if entry is None:
+                    entry = {
+                        'fingerprint': k['fingerprint'],
+                        'digests': set(),
+                        'refs': 0,
+                        'stale': False
+                    }
+
+                entry['expiration'] = k['expiration']
+                entry['digests'].add(digest)
+                cls.entries[entry['fingerprint']] = entry
+                cls.digests[digest] = entry['fingerprint']
+
+                while len(cls.entries) > Settings.pgp_keyring_size:
+                    cls.drop(next(iter(cls.entries)))
+                    cls.evictions += 1
+
+            if entry['expiration'] != datetime.utcfromtimestamp(0) and entry['expiration'] < datetime.utcnow():
+                cls.drop(entry['fingerprint'])
+                raise errors.PGPKeyInvalid
+
+            entry['refs'] += 1
+
+            return gpoj, entry
+
+    @classmethod
+    def release(cls, entry):
+        with cls.lock:
+            entry['refs'] -= 1
+            if entry['stale'] and entry['refs'] == 0 and entry['fingerprint'] not in cls.entries:
+                cls.gpoj.delete_key(entry['fingerprint'])
+
+    @classmethod
+    def drop(cls, fingerprint):
+        entry = cls.entries.pop(fingerprint, None)
+        if entry is None:
+            return
+
+        for digest in entry['digests']:
+            cls.digests.pop(digest, None)
+
+        if entry['refs']:
+            entry['stale'] = True
+        else:
+            cls.gpoj.delete_key(fingerprint)
+
+    @classmethod
+    def invalidate(cls, fingerprint):
+        """
+        Remove a key from the keyring; to be used when the key of a user changes
+        """
+        with cls.lock:
+            if cls.gpoj is not None:
+                cls.drop(fingerprint)
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            if cls.gpoj is not None and os.path.isdir(cls.gpoj.gnupg.gnupghome):
+                cls.gpoj.destroy_environment()
+
+            cls.gpoj = None
+
+            cls.entries.clear()
+            cls.digests.clear()
+            cls.hits = cls.misses = cls.evictions = 0
 
-    return body
+    @classmethod
+    def encrypt_message(cls, key, plaintext):
+        gpoj, entry = cls.acquire(key)
+
+        try:
+            return gpoj.encrypt_message(entry['fingerprint'], plaintext)
+        finally:
+            cls.release(entry)
+
+    @classmethod
+    def encrypt_file(cls, key, input_file, output_path):
+        gpoj, entry = cls.acquire(key)
+
+        try:
+            return gpoj.encrypt_file(entry['fingerprint'], input_file, output_path)
+        finally:
+            cls.release(entry)
+
+    @classmethod
+    def get_stats(cls):
+        return {
+            'keys': len(cls.entries),
+            'max_keys': Settings.pgp_keyring_size,
+            'hits': cls.hits,
+            'misses': cls.misses,
+            'evictions': cls.evictions
+        }
+
+
+def encrypt_message(pgp_key_public, msg):
+    return PGPKeyring.encrypt_message(pgp_key_public, msg)
 
 
 def parse_pgp_key(key):
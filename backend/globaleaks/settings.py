@@ -7,6 +7,7 @@ import getpass
 import glob
 import grp
 import logging
+import multiprocessing
 import os
 import pwd
 import re
@@ -74,6 +75,39 @@ class SettingsClass(object):
 
         self.db_type = 'sqlite'
 
+        # number of threads used to run read-only transactions in parallel
+        self.orm_ro_threads = 4
+
+        # number of prepared statements cached by each database connection
+        self.orm_cached_statements = 200
+
+        # number of processes used to run the key derivation functions
+        self.cpu_pool_processes = multiprocessing.cpu_count()
+
+        # seconds after which a function submitted to the cpu pool is considered lost
+        self.cpu_pool_timeout = 60
+
+        # number of files encrypted concurrently by the delivery job
+        self.delivery_threads = 4
+
+        # number of files overwritten concurrently by the secure deletion job,
+        # files committed as deleted per transaction and I/O cap in bytes per second (0 disables it)
+        self.secure_file_delete_threads = 4
+        self.secure_file_delete_batch_size = 100
+        self.secure_file_delete_bandwidth = 32 * 1024 * 1024
+
+        # maximum number of public keys kept in the shared PGP keyring
+        self.pgp_keyring_size = 1024
+
+        # maximum number of localized archived questionnaires kept in memory
+        self.archived_schema_cache_size = 256
+
+        # maximum number of compiled notification templates kept in memory
+        self.templates_cache_size = 256
+
+        # maximum size in bytes of the encoded responses kept by the api cache
+        self.api_cache_size = 32 * 1024 * 1024
+
         # debug defaults
         self.orm_debug = False
 
@@ -148,6 +182,12 @@ class SettingsClass(object):
         # size used while streaming files
         self.file_chunk_size = 65535 # 64kb
 
+        # size up to which the chunks grow while streaming files to a fast client
+        self.file_chunk_max_size = 1024 * 1024 # 1MB
+
+        # number of items from which the list responses are encoded while streamed
+        self.json_stream_min_items = 100
+
         self.AES_key_size = 32
         self.AES_key_id_regexp = u'[A-Za-z0-9]{16}'
         self.AES_counter_nonce = 128 / 8
@@ -168,6 +208,17 @@ class SettingsClass(object):
         self.mail_timeout = 15 # seconds
         self.mail_attempts_limit = 3 # per mail limit
 
+        # number of concurrent SMTP sessions and seconds for which an idle session is kept open
+        self.smtp_pool_size = 4
+        self.smtp_pool_idle_timeout = 60
+
+        # exponential backoff in seconds applied to an SMTP server failing the connection
+        self.smtp_backoff_base = 5
+        self.smtp_backoff_max = 600
+
+        # number of persistent connections kept by each https worker to the backend
+        self.https_proxy_pool_size = 8
+
         self.acme_directory_url = 'https://acme-v01.api.letsencrypt.org/directory'
 
     def eval_paths(self):
@@ -457,7 +508,8 @@ class SettingsClass(object):
 
     @staticmethod
     def make_db_uri(db_file_path):
-        return 'sqlite:' + db_file_path + '?foreign_keys=ON'
+        return 'sqlite:%s?foreign_keys=ON&journal_mode=WAL&cached_statements=%d' % \
+               (db_file_path, Settings.orm_cached_statements)
 
     def get_agent(self):
         if State.tenant_cache[1].anonymize_outgoing_connections:
@@ -3,6 +3,7 @@ from twisted.python.threadpool import ThreadPool
 
 from globaleaks import __version__
 from globaleaks.utils.objectdict import ObjectDict
+from globaleaks.utils.process import ProcessPool
 from globaleaks.utils.singleton import Singleton
 from globaleaks.utils.tor_exit_set import TorExitSet
 from globaleaks.utils.utility import datetime_now
@@ -12,6 +13,8 @@ class StateClass(ObjectDict):
 
     def __init__(self):
         self.orm_tp = ThreadPool(1, 1)
+        self.orm_ro_tp = ThreadPool(1, 4)
+        self.cpu_pool = ProcessPool()
         self.process_supervisor = None
         self.tor_exit_set = TorExitSet()
 
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import copy
+import json
 
 from globaleaks import models
 from globaleaks.handlers import admin
@@ -174,6 +175,7 @@ class TestFieldTemplatesCollection(helpers.TestHandlerWithPopulatedDB):
 
         handler = self.request(role='admin')
         fields = yield handler.get()
+        fields = json.loads(fields)
 
         check_ids = [field.get('id') for field in fields]
         self.assertGreater(len(fields), n)
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import json
 
 from globaleaks import __version__
 from globaleaks.handlers.admin import node
@@ -18,6 +19,7 @@ class TestNodeInstance(helpers.TestHandlerWithPopulatedDB):
     def test_get(self):
         handler = self.request(role='admin')
         response = yield handler.get()
+        response = json.loads(response)
 
         self.assertTrue(response['version'], __version__)
 
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import json
 
 from globaleaks.handlers.admin import shorturl
 from globaleaks.tests import helpers
@@ -16,7 +17,7 @@ class TestShortURLCollection(helpers.TestHandlerWithPopulatedDB):
         handler = self.request(role='admin')
         response = yield handler.get()
 
-        self.assertEqual(len(response), 3)
+        self.assertEqual(len(json.loads(response)), 3)
 
     @inlineCallbacks
     def test_post_new_shorturl(self):
@@ -89,3 +89,45 @@ class TestJobsTiming(helpers.TestHandler):
         handler = self.request({}, role='admin')
 
         yield handler.get()
+
+
+class TestMetrics(helpers.TestHandler):
+    _handler = statistics.Metrics
+
+    @inlineCallbacks
+    def test_get(self):
+        handler = self.request({}, role='admin')
+
+        response = yield handler.get()
+
+        for pool in ['rw', 'ro']:
+            for k in ['size', 'idle', 'hits', 'misses', 'discarded', 'wait_time']:
+                self.assertTrue(k in response['orm'][pool])
+
+        for k in ['entries', 'size', 'max_size', 'hits', 'misses', 'evictions']:
+            self.assertTrue(k in response['apicache'])
+
+        for k in ['processes', 'pending', 'backlog', 'completed']:
+            self.assertTrue(k in response['cpu_pool'])
+
+        for k in ['keys', 'max_keys', 'hits', 'misses', 'evictions']:
+            self.assertTrue(k in response['pgp_keyring'])
+
+        for k in ['entries', 'max_entries', 'hits', 'misses', 'evictions']:
+            self.assertTrue(k in response['archived_schema_cache'])
+
+        for k in ['sessions', 'idle', 'connecting', 'queue', 'sent', 'failed', 'latency', 'backoff']:
+            self.assertTrue(k in response['smtp_pool'])
+
+        for k in ['entries', 'size', 'hits', 'misses']:
+            self.assertTrue(k in response['assets'])
+
+        for k in ['entries', 'max_entries', 'hits', 'misses', 'evictions']:
+            self.assertTrue(k in response['templates'])
+
+        for k in ['active', 'buffered', 'buffered_peak', 'rejected', 'rss_peak']:
+            self.assertTrue(k in response['uploads'])
+
+        self.assertTrue(isinstance(response['https_proxy'], dict))
+
+        self.assertTrue(isinstance(response['jobs'], dict))
@@ -3,6 +3,8 @@ from globaleaks.handlers import authentication, admin
 from globaleaks.handlers.base import Sessions
 from globaleaks.handlers.user import UserInstance
 from globaleaks.handlers.wbtip import WBTipInstance
+from globaleaks.models import User
+from globaleaks.orm import transact
 from globaleaks.rest import errors
 from globaleaks.settings import Settings
 from globaleaks.state import State
@@ -10,6 +12,11 @@ from globaleaks.tests import helpers
 from twisted.internet.defer import inlineCallbacks
 
 
+@transact
+def disable_user(store, username):
+    store.find(User, User.username == username).one().state = u'disabled'
+
+
 class TestAuthentication(helpers.TestHandlerWithPopulatedDB):
     _handler = authentication.AuthenticationHandler
 
@@ -55,6 +62,15 @@ class TestAuthentication(helpers.TestHandlerWithPopulatedDB):
 
         yield self.assertFailure(handler.post(), errors.InvalidAuthentication)
 
+    @inlineCallbacks
+    def test_login_of_user_disabled_during_verification(self):
+        user = yield authentication.get_user_credentials(u'admin')
+
+        yield disable_user(u'admin')
+
+        yield self.assertFailure(authentication.db_login(user['id'], user['password']),
+                                 errors.InvalidAuthentication)
+
     @inlineCallbacks
     def test_failed_login_counter(self):
         handler = self.request({
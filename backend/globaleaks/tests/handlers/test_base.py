@@ -1,11 +1,22 @@
 # -*- coding: utf-8 -*-
+import gzip
+import io
 import json
+import os
+import re
 
-from globaleaks.handlers.base import BaseHandler, StaticFileHandler
+from globaleaks.handlers import base
+from globaleaks.handlers.base import BaseHandler, Sessions, StaticFileHandler, StaticFileProducer, new_session
 from globaleaks.rest.errors import InvalidInputFormat, ResourceNotFound
 from globaleaks.settings import Settings
 from globaleaks.tests import helpers
-from twisted.internet.defer import inlineCallbacks
+from globaleaks.utils import sock
+from globaleaks.utils.assets import AssetsManifest
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, maybeDeferred
+from twisted.web.client import Agent, readBody
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET, Site
 
 FUTURE = 100
 
@@ -91,3 +102,184 @@ class TestStaticFileHandler(helpers.TestHandler):
             return
 
         self.fail('should throw resource not found error')
+
+    @inlineCallbacks
+    def test_get_range(self):
+        with open(os.path.join(Settings.client_path, 'css/main.css'), 'rb') as f:
+            content = f.read()
+
+        for byte_range, code, body in [('bytes=10-19', 206, content[10:20]),
+                                       ('bytes=10-', 206, content[10:]),
+                                       ('bytes=-10', 206, content[-10:]),
+                                       ('bytes=0-%d' % (len(content) * 2), 206, content),
+                                       ('bytes=10-19,30-39', 200, content),
+                                       ('bytes=%d-' % len(content), 416, '')]:
+            handler = self.request(kwargs={'path': Settings.client_path}, headers={'Range': byte_range})
+            yield handler.get('css/main.css')
+
+            self.assertEqual(handler.request.responseCode or 200, code)
+            self.assertEqual(handler.request.getResponseBody(), body)
+
+            if code != 416:
+                self.assertEqual(handler.request.responseHeaders.getRawHeaders('content-length'), [str(len(body))])
+
+    @inlineCallbacks
+    def test_get_range_with_if_range(self):
+        handler = self.request(kwargs={'path': Settings.client_path},
+                               headers={'Range': 'bytes=10-19', 'If-Range': 'Thu, 01 Jan 1970 00:00:00 GMT'})
+        yield handler.get('css/main.css')
+
+        self.assertNotEqual(handler.request.responseCode, 206)
+        self.assertEqual(len(handler.request.getResponseBody()),
+                         os.stat(os.path.join(Settings.client_path, 'css/main.css')).st_size)
+
+
+    def get_asset(self, path, uri='https://www.globaleaks.org/', headers=None):
+        handler = self.request(uri=uri, headers=headers, kwargs={'path': Settings.client_path})
+
+        return maybeDeferred(handler.get, path).addCallback(lambda _: handler.request)
+
+    @inlineCallbacks
+    def test_get_versioned_asset(self):
+        asset = AssetsManifest.get(os.path.join(Settings.client_path, 'css/main.css'))
+
+        request = yield self.get_asset('')
+        self.assertTrue('href="css/main.css?v=%s"' % asset.version in request.getResponseBody())
+        self.assertEqual(request.responseHeaders.getRawHeaders('cache-control'), ['no-cache'])
+
+        request = yield self.get_asset('css/main.css', 'https://www.globaleaks.org/css/main.css?v=%s' % asset.version)
+        self.assertEqual(request.responseHeaders.getRawHeaders('cache-control'), ['public, max-age=31536000, immutable'])
+
+        # an outdated version is revalidated
+        request = yield self.get_asset('css/main.css', 'https://www.globaleaks.org/css/main.css?v=outdated')
+        self.assertEqual(request.responseHeaders.getRawHeaders('cache-control'), ['no-cache'])
+
+    @inlineCallbacks
+    def test_get_asset_etag(self):
+        request = yield self.get_asset('css/main.css')
+        etag = request.responseHeaders.getRawHeaders('etag')[0]
+
+        request = yield self.get_asset('css/main.css', headers={'If-None-Match': etag})
+        self.assertEqual(request.responseCode, 304)
+        self.assertEqual(request.getResponseBody(), '')
+
+    @inlineCallbacks
+    def test_get_asset_gzip(self):
+        with open(os.path.join(Settings.client_path, 'css/main.css'), 'rb') as f:
+            content = f.read()
+
+        request = yield self.get_asset('css/main.css', headers={'Accept-Encoding': 'gzip, deflate'})
+
+        self.assertEqual(request.responseHeaders.getRawHeaders('content-encoding'), ['gzip'])
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(request.getResponseBody())).read(), content)
+
+    @inlineCallbacks
+    def test_load_bytes_benchmark(self):
+        """
+        Compare the bytes transferred by the first and the following loads of the client
+        """
+        def references(page):
+            return re.findall(r'<(?:script|link)\b[^>]*?\b(?:src|href)="([^":#]+\?v=[0-9a-f]+)"', page)
+
+        cache = {}
+        loads = []
+
+        for _ in range(2):
+            transferred = 0
+
+            headers = {'Accept-Encoding': 'gzip'}
+            if '' in cache:
+                headers['If-None-Match'] = cache['']
+
+            request = yield self.get_asset('', headers=headers)
+            transferred += len(request.getResponseBody())
+            if request.responseCode != 304:
+                cache[''] = request.responseHeaders.getRawHeaders('etag')[0]
+                page = gzip.GzipFile(fileobj=io.BytesIO(request.getResponseBody())).read()
+
+            for reference in references(page):
+                if reference in cache:
+                    # the asset is immutable and so it is not requested again
+                    continue
+
+                path = reference.split('?')[0]
+                request = yield self.get_asset(path, 'https://www.globaleaks.org/' + reference, headers={'Accept-Encoding': 'gzip'})
+                transferred += len(request.getResponseBody())
+                cache[reference] = True
+
+            loads.append(transferred)
+
+        raw = sum(os.stat(os.path.join(Settings.client_path, r.split('?')[0])).st_size for r in references(page))
+        raw += os.stat(os.path.join(Settings.client_path, 'index.html')).st_size
+
+        self.assertTrue(len(references(page)) > 0)
+        self.assertTrue(loads[0] < raw)
+        self.assertEqual(loads[1], 0)
+
+
+class FileResource(Resource):
+    isLeaf = True
+
+    def __init__(self, filepath):
+        Resource.__init__(self)
+        self.filepath = filepath
+
+    def render_GET(self, request):
+        request.setHeader(b'content-length', b'%d' % os.stat(self.filepath).st_size)
+        StaticFileProducer(request, self.filepath).start()
+        return NOT_DONE_YET
+
+
+class TestStaticFileProducer(helpers.TestGL):
+    @inlineCallbacks
+    def test_transfer(self):
+        # the file is big enough to fill the socket buffers while it is sent
+        content = os.urandom(8 * 1024 * 1024 + 1)
+        filepath = os.path.join(Settings.tmp_upload_path, 'producer_test')
+        with open(filepath, 'wb') as f:
+            f.write(content)
+
+        sendfile_calls = []
+
+        def sendfile(*args):
+            sendfile_calls.append(args)
+            return base_sendfile(*args)
+
+        base_sendfile, base.sendfile = base.sendfile, sendfile
+
+        port = reactor.listenTCP(0, Site(FileResource(filepath)), interface='127.0.0.1')
+
+        try:
+            response = yield Agent(reactor).request('GET', 'http://127.0.0.1:%d/' % port.getHost().port)
+            body = yield readBody(response)
+        finally:
+            base.sendfile = base_sendfile
+            yield port.stopListening()
+            os.remove(filepath)
+
+        self.assertEqual(len(body), len(content))
+        self.assertEqual(body, content)
+
+        if sock.sendfile_available():
+            # the socket buffers are filled several times during the transfer
+            self.assertTrue(len(sendfile_calls) > 1)
+
+
+class TestSessions(helpers.TestGL):
+    def test_revoke_all_sessions(self):
+        sessions = [new_session(user_id, 'receiver', 'enabled') for user_id in ['a', 'a', 'b']]
+
+        self.assertEqual(Sessions.user_sessions['a'], {sessions[0].id, sessions[1].id})
+
+        Sessions.revoke_all_sessions('a')
+
+        self.assertEqual(list(Sessions.keys()), [sessions[2].id])
+        self.assertNotIn('a', Sessions.user_sessions)
+
+    def test_expired_sessions_are_unindexed(self):
+        session = new_session('a', 'receiver', 'enabled')
+
+        self.test_reactor.advance(Settings.authentication_lifetime)
+
+        self.assertIsNone(Sessions.get(session.id))
+        self.assertEqual(Sessions.user_sessions, {})
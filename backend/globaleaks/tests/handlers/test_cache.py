@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
+import gzip
+import io
+import json
+
 from globaleaks import handlers
 from globaleaks.handlers import public
 from globaleaks.rest.apicache import ApiCache, decorator_cache_get
+from globaleaks.settings import Settings
 from globaleaks.tests import helpers
 from twisted.internet.defer import inlineCallbacks
 
@@ -12,20 +17,57 @@ class TestApiCache(helpers.TestGL):
         yield helpers.TestGL.setUp(self)
 
         ApiCache.invalidate()
+        ApiCache.reset_stats()
 
     def test_get_set_items(self):
-        self.assertEqual(ApiCache.memory_cache_dict, {})
+        self.assertEqual(len(ApiCache.memory_cache_dict), 0)
         self.assertIsNone(ApiCache.get("passante_di_professione", "it"))
         self.assertIsNone(ApiCache.get("passante_di_professione", "en"))
         ApiCache.set("passante_di_professione", "it", 'ititit')
         ApiCache.set("passante_di_professione", "en", 'enenen')
-        self.assertTrue("passante_di_professione" in ApiCache.memory_cache_dict)
-        self.assertTrue("it" in ApiCache.memory_cache_dict['passante_di_professione'])
-        self.assertTrue("en" in ApiCache.memory_cache_dict['passante_di_professione'])
-        self.assertEqual(ApiCache.get("passante_di_professione", "it"), 'ititit')
-        self.assertEqual(ApiCache.get("passante_di_professione", "en"), 'enenen')
+        self.assertTrue(("passante_di_professione", "it") in ApiCache.memory_cache_dict)
+        self.assertTrue(("passante_di_professione", "en") in ApiCache.memory_cache_dict)
+        self.assertEqual(ApiCache.get("passante_di_professione", "it").body, '"ititit"')
+        self.assertEqual(ApiCache.get("passante_di_professione", "en").body, '"enenen"')
+        self.assertEqual(ApiCache.get_stats()['hits'], 2)
+        self.assertEqual(ApiCache.get_stats()['misses'], 2)
         ApiCache.invalidate()
-        self.assertEqual(ApiCache.memory_cache_dict, {})
+        self.assertEqual(len(ApiCache.memory_cache_dict), 0)
+        self.assertEqual(ApiCache.size, 0)
+
+    def test_invalidate_tags(self):
+        ApiCache.set("/public", "en", {}, {'node', 'contexts'})
+        ApiCache.set("/admin/contexts", "en", [], {'contexts'})
+        ApiCache.set("/admin/users", "en", [], {'users'})
+        ApiCache.set("/untagged", "en", [])
+
+        ApiCache.invalidate('contexts')
+
+        self.assertEqual(list(ApiCache.memory_cache_dict.keys()), [("/admin/users", "en")])
+
+    def test_stale_set_is_discarded(self):
+        generation = ApiCache.generation
+        ApiCache.invalidate('node')
+        ApiCache.set("/public", "en", {}, {'node'}, generation)
+        self.assertIsNone(ApiCache.get("/public", "en"))
+
+    def test_lru_eviction(self):
+        api_cache_size = Settings.api_cache_size
+        entry_size = ApiCache.set("/a", "en", 'x' * 100).size
+        Settings.api_cache_size = entry_size * 2
+
+        try:
+            ApiCache.set("/b", "en", 'x' * 100)
+            ApiCache.get("/a", "en")
+            ApiCache.set("/c", "en", 'x' * 100)
+
+            self.assertIsNotNone(ApiCache.get("/a", "en"))
+            self.assertIsNone(ApiCache.get("/b", "en"))
+            self.assertIsNotNone(ApiCache.get("/c", "en"))
+            self.assertEqual(ApiCache.get_stats()['evictions'], 1)
+            self.assertEqual(ApiCache.size, entry_size * 2)
+        finally:
+            Settings.api_cache_size = api_cache_size
 
 
 class TestCacheWithHandlers(helpers.TestHandler):
@@ -40,7 +82,7 @@ class TestCacheWithHandlers(helpers.TestHandler):
 
         self.assertEqual(len(ApiCache.memory_cache_dict), 1)
 
-        cached_resp = ApiCache.get("/public", "en")
+        cached_resp = ApiCache.get("/public", "en").body
 
         second_resp = yield handler.get()
         self.assertEqual(resp, cached_resp)
@@ -49,15 +91,35 @@ class TestCacheWithHandlers(helpers.TestHandler):
         # Check that a different language doesn't blow away a different resource
         handler_fr = self.request(uri='https://www.globaleaks.org/public', headers={'gl-language': 'fr'})
         resp_fr = yield handler_fr.get()
-        cached_resp_fr = ApiCache.get("/public", "fr")
+        cached_resp_fr = ApiCache.get("/public", "fr").body
 
         self.assertEqual(resp_fr, cached_resp_fr)
 
+        self.assertEqual(len(ApiCache.memory_cache_dict), 2)
+        self.assertNotEqual(resp_fr, cached_resp)
 
-        s = reduce(lambda x, y: x+len(y), ApiCache.memory_cache_dict.values(), 0)
+    @inlineCallbacks
+    def test_handler_etag(self):
+        handler = self.request(uri='https://www.globaleaks.org/public')
+        yield handler.get()
 
-        self.assertEqual(s, 2)
-        self.assertNotEqual(resp_fr, cached_resp)
+        etag = handler.request.responseHeaders.getRawHeaders(b'etag')[0]
+
+        handler = self.request(uri='https://www.globaleaks.org/public', headers={'If-None-Match': etag})
+        resp = yield handler.get()
+
+        self.assertEqual(resp, b'')
+        self.assertEqual(handler.request.responseCode, 304)
+
+    @inlineCallbacks
+    def test_handler_gzip(self):
+        handler = self.request(uri='https://www.globaleaks.org/public', headers={'Accept-Encoding': 'gzip, deflate'})
+        resp = yield handler.get()
+
+        self.assertEqual(handler.request.responseHeaders.getRawHeaders(b'content-encoding'), [b'gzip'])
+        resp = gzip.GzipFile(fileobj=io.BytesIO(resp)).read()
+        self.assertEqual(resp, ApiCache.get("/public", "en").body)
+        self.assertTrue('node' in json.loads(resp))
 
     def test_handler_sync_cache_miss(self):
         # Asserts that the cases where the result of f returns immediately,
@@ -69,7 +131,7 @@ class TestCacheWithHandlers(helpers.TestHandler):
         handler = self.request(handler_cls=FakeSyncHandler, uri=fake_uri)
         resp = handler.get()
 
-        cached_resp = ApiCache.get(fake_path, "en")
+        cached_resp = ApiCache.get(fake_path, "en").body
 
         second_resp = handler.get()
         self.assertEqual(resp, cached_resp)
@@ -5,6 +5,7 @@ from globaleaks.handlers import files
 from globaleaks.rest import errors
 from globaleaks.tests import helpers
 from globaleaks.utils import token
+from globaleaks.utils.multipart import FileUpload, Uploads
 from twisted.internet.defer import inlineCallbacks
 
 
@@ -38,6 +39,25 @@ class TestFileInstance(helpers.TestHandlerWithPopulatedDB):
         for f in self.dummyToken.uploaded_files:
             yield self.assertFalse(os.path.exists(f['path']))
 
+    def test_get_upload_status(self):
+        self.dummyToken = token.Token(token_kind='submission')
+
+        upload = FileUpload()
+        upload.file.write('chunk1chunk2')
+        upload.chunks = 2
+        upload.size = 12
+        Uploads.set('flow-id', upload)
+
+        try:
+            for chunk_number, received in [(1, True), (2, True), (3, False)]:
+                handler = self.request(uri='https://www.globaleaks.org/?flowIdentifier=flow-id&flowChunkNumber=%d' % chunk_number)
+                handler.get(self.dummyToken.id)
+                self.assertEqual(handler.request.responseCode != 204, received)
+        finally:
+            Uploads.pop_upload('flow-id')
+
+        upload.file.close()
+
     @inlineCallbacks
     def test_post_file_on_unexistent_submission(self):
         handler = self.request()
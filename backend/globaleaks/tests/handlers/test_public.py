@@ -1,6 +1,4 @@
 # -*- coding: utf-8 -*-
-import json
-
 from globaleaks.handlers import public
 from globaleaks.rest import requests
 from globaleaks.tests import helpers
@@ -15,4 +13,4 @@ class TestPublicResource(helpers.TestHandlerWithPopulatedDB):
         handler = self.request()
         response = yield handler.get()
 
-        self._handler.validate_message(json.dumps(response), requests.PublicResourcesDesc)
+        self._handler.validate_message(response, requests.PublicResourcesDesc)
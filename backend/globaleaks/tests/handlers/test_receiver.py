@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
+import json
+import urllib
+
 from globaleaks import models
 from globaleaks.handlers import receiver, admin
+from globaleaks.handlers.submission import ArchivedSchemaCache
 from globaleaks.orm import transact
+from globaleaks.rest import errors
+from globaleaks.settings import Settings
 from globaleaks.tests import helpers
 from globaleaks.utils.utility import datetime_never
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, returnValue
 
 
 @transact
@@ -12,6 +18,16 @@ def set_expiration_of_all_rtips_to_unlimited(store):
     store.find(models.InternalTip).set(expiration_date = datetime_never())
 
 
+@transact
+def count_secure_file_deletes(store):
+    return store.find(models.SecureFileDelete).count()
+
+
+@transact
+def set_receivertip_label(store, rtip_id, label):
+    store.find(models.ReceiverTip, id=rtip_id).set(label=label)
+
+
 class TestUserInstance(helpers.TestHandlerWithPopulatedDB):
     _handler = receiver.ReceiverInstance
 
@@ -46,6 +62,118 @@ class TestTipsCollection(helpers.TestHandlerWithPopulatedDB):
         handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
         yield handler.get()
 
+    @inlineCallbacks
+    def test_get_preview_schema_cache(self):
+        handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+        response = yield handler.get()
+
+        stats = ArchivedSchemaCache.get_stats()
+
+        # the tips share the rendering of the same preview schema
+        self.assertTrue(len(response) > 1)
+        self.assertEqual(len(set(id(tip['preview_schema']) for tip in response)), 1)
+
+        yield handler.get()
+
+        self.assertEqual(ArchivedSchemaCache.get_stats()['misses'], stats['misses'])
+        self.assertEqual(ArchivedSchemaCache.get_stats()['hits'], stats['hits'] + len(response))
+
+    @inlineCallbacks
+    def test_get_preview_schema_cache_read_only(self):
+        handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+        response = yield handler.get()
+
+        preview_schema = response[0]['preview_schema']
+        expected = json.loads(json.dumps(preview_schema))
+
+        self.assertRaises(TypeError, preview_schema.append, {})
+        self.assertRaises(TypeError, preview_schema[0].__setitem__, 'label', 'modified')
+        self.assertRaises(TypeError, preview_schema[0]['options'].pop)
+
+        response = yield handler.get()
+
+        self.assertEqual(response[0]['preview_schema'], expected)
+
+    @inlineCallbacks
+    def test_get_preview_schema_cache_eviction(self):
+        archived_schema_cache_size = Settings.archived_schema_cache_size
+        Settings.archived_schema_cache_size = 1
+        ArchivedSchemaCache.reset()
+
+        try:
+            for language in ['en', 'it']:
+                handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver', headers={'gl-language': language})
+                yield handler.get()
+
+            self.assertEqual(ArchivedSchemaCache.get_stats()['entries'], 1)
+            self.assertEqual(ArchivedSchemaCache.get_stats()['evictions'], 1)
+        finally:
+            Settings.archived_schema_cache_size = archived_schema_cache_size
+
+
+    @inlineCallbacks
+    def get_page(self, **args):
+        uri = 'https://www.globaleaks.org/receiver/tips?' + urllib.urlencode(args)
+        handler = self.request(uri=uri, user_id=self.dummyReceiver_1['id'], role='receiver')
+        response = yield handler.get()
+        returnValue(response)
+
+    @inlineCallbacks
+    def test_get_paginated(self):
+        rtips = yield receiver.get_receivertip_list(self.dummyReceiver_1['id'], 'en')
+
+        for sort in receiver.tip_list_sort_keys:
+            for order in ['asc', 'desc']:
+                ids = []
+                page = {'cursor': None}
+
+                while True:
+                    args = {'limit': 1, 'sort': sort, 'order': order}
+                    if page['cursor'] is not None:
+                        args['cursor'] = page['cursor']
+
+                    page = yield self.get_page(**args)
+                    ids.extend(tip['id'] for tip in page['tips'])
+
+                    if page['cursor'] is None:
+                        break
+
+                    self.assertEqual(len(page['tips']), 1)
+
+                expected = sorted(rtips, key=lambda tip: (tip[sort], tip['id']), reverse=order == 'desc')
+                self.assertEqual(ids, [tip['id'] for tip in expected])
+
+    @inlineCallbacks
+    def test_get_compact(self):
+        page = yield self.get_page(compact=1)
+
+        self.assertIsNone(page['cursor'])
+        self.assertTrue(len(page['tips']) > 1)
+        self.assertEqual(len(page['preview_schemas']), 1)
+
+        for tip in page['tips']:
+            self.assertFalse('preview_schema' in tip)
+            self.assertTrue(tip['questionnaire_hash'] in page['preview_schemas'])
+
+    @inlineCallbacks
+    def test_get_filters(self):
+        rtips = yield receiver.get_receivertip_list(self.dummyReceiver_1['id'], 'en')
+
+        yield set_receivertip_label(rtips[0]['id'], u'label')
+
+        page = yield self.get_page(limit=10, label='label')
+        self.assertEqual([tip['id'] for tip in page['tips']], [rtips[0]['id']])
+
+        page = yield self.get_page(limit=10, new=1, context_id=rtips[0]['context_id'])
+        self.assertEqual(len(page['tips']), len([tip for tip in rtips if tip['new'] and tip['context_id'] == rtips[0]['context_id']]))
+
+        page = yield self.get_page(limit=10, to='1970-01-01T00:00:00Z')
+        self.assertEqual(page['tips'], [])
+
+    def test_get_invalid_arguments(self):
+        for args in [{'sort': 'receipt'}, {'order': 'random'}, {'limit': 0}, {'limit': 'all'}, {'cursor': 'invalid'}]:
+            self.assertRaises(errors.InvalidInputFormat, receiver.parse_tip_list_query, args)
+
 
 class TestTipsOperations(helpers.TestHandlerWithPopulatedDB):
     _handler = receiver.TipsOperations
@@ -101,3 +229,7 @@ class TestTipsOperations(helpers.TestHandlerWithPopulatedDB):
         rtips = yield receiver.get_receivertip_list(self.dummyReceiver_1['id'], 'en')
 
         self.assertEqual(len(rtips), 0)
+
+        # the files of the tips are enqueued for secure deletion
+        secure_file_deletes = yield count_secure_file_deletes()
+        self.assertTrue(secure_file_deletes > 0)
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
+from storm.tracer import install_tracer, remove_tracer_type
 from twisted.internet.defer import inlineCallbacks
 
 from globaleaks import models
 from globaleaks.handlers import rtip
 from globaleaks.jobs.delivery_sched import DeliverySchedule
+from globaleaks.orm import transact
 from globaleaks.rest import errors
 from globaleaks.settings import State
 from globaleaks.tests import helpers
@@ -284,3 +286,100 @@ class TestIdentityAccessRequestsCollection(helpers.TestHandlerWithPopulatedDB):
         for rtip_desc in rtip_descs:
             handler = self.request(body, role='receiver', user_id = rtip_desc['receiver_id'])
             yield handler.post(rtip_desc['id'])
+
+
+class QueryCounter(object):
+    def __init__(self):
+        self.count = 0
+
+    def connection_raw_execute(self, connection, raw_cursor, statement, params):
+        self.count += 1
+
+
+class TestRTipSerialization(helpers.TestGLWithPopulatedDB):
+    @inlineCallbacks
+    def setUp(self):
+        yield helpers.TestGLWithPopulatedDB.setUp(self)
+        yield self.perform_full_submission_actions()
+
+    @transact
+    def count_serialization_queries(self, store, rtip_id):
+        rtip_obj, itip = store.find((models.ReceiverTip, models.InternalTip),
+                                    models.ReceiverTip.id == rtip_id,
+                                    models.InternalTip.id == models.ReceiverTip.internaltip_id).one()
+
+        counter = QueryCounter()
+        install_tracer(counter)
+        try:
+            rtip.serialize_rtip(store, rtip_obj, itip, 'en')
+        finally:
+            remove_tracer_type(QueryCounter)
+
+        return counter.count
+
+    @transact
+    def add_tip_activity(self, store, rtip_id, n):
+        rtip_obj = store.find(models.ReceiverTip, id=rtip_id).one()
+
+        for i in range(n):
+            comment = models.Comment()
+            comment.internaltip_id = rtip_obj.internaltip_id
+            comment.author_id = rtip_obj.receiver_id if i % 2 else None
+            comment.type = u'receiver' if i % 2 else u'whistleblower'
+            comment.content = u'comment'
+            store.add(comment)
+
+            message = models.Message()
+            message.receivertip_id = rtip_obj.id
+            message.type = u'receiver' if i % 2 else u'whistleblower'
+            message.content = u'message'
+            store.add(message)
+
+            ifile = models.InternalFile()
+            ifile.internaltip_id = rtip_obj.internaltip_id
+            ifile.name = u'file'
+            ifile.file_path = u'ifile-%d-%d' % (n, i)
+            ifile.content_type = u'application/octet-stream'
+            ifile.size = 1
+            store.add(ifile)
+
+            rfile = models.ReceiverFile()
+            rfile.internalfile_id = ifile.id
+            rfile.receivertip_id = rtip_obj.id
+            rfile.file_path = u'rfile-%d-%d' % (n, i)
+            rfile.size = 1
+            rfile.status = u'encrypted' if i % 2 else u'unavailable'
+            store.add(rfile)
+
+            wbfile = models.WhistleblowerFile()
+            wbfile.receivertip_id = rtip_obj.id
+            wbfile.name = u'file'
+            wbfile.description = u'description'
+            wbfile.file_path = u'wbfile-%d-%d' % (n, i)
+            wbfile.content_type = u'application/octet-stream'
+            wbfile.size = 1
+            store.add(wbfile)
+
+            iar = models.IdentityAccessRequest()
+            iar.receivertip_id = rtip_obj.id
+            iar.reply_user_id = rtip_obj.receiver_id if i % 2 else None
+            store.add(iar)
+
+    @inlineCallbacks
+    def test_serialize_rtip_queries_do_not_depend_on_tip_activity(self):
+        rtip_desc = (yield self.get_rtips())[0]
+
+        yield self.add_tip_activity(rtip_desc['id'], 2)
+
+        count = yield self.count_serialization_queries(rtip_desc['id'])
+
+        yield self.add_tip_activity(rtip_desc['id'], 300)
+
+        self.assertEqual((yield self.count_serialization_queries(rtip_desc['id'])), count)
+
+        rtip_desc = yield rtip.get_rtip(rtip_desc['receiver_id'], rtip_desc['id'], 'en')
+        self.assertTrue(len(rtip_desc['comments']) > 300)
+        self.assertTrue(len(rtip_desc['messages']) > 300)
+        self.assertTrue(len(rtip_desc['rfiles']) > 300)
+        self.assertTrue(len(rtip_desc['wbfiles']) >= 300)
+        self.assertTrue(len(rtip_desc['iars']) >= 300)
@@ -11,7 +11,7 @@ sys.setdefaultencoding('utf8')
 from globaleaks import db, models, security, event, jobs, __version__
 from globaleaks.anomaly import Alarm
 from globaleaks.db.appdata import load_appdata
-from globaleaks.orm import transact
+from globaleaks.orm import close_store_pools, transact
 from globaleaks.handlers import rtip, wbtip
 from globaleaks.handlers.authentication import db_get_wbtip_by_receipt
 from globaleaks.handlers.base import BaseHandler, Sessions, new_session, \
@@ -21,14 +21,15 @@ from globaleaks.handlers.admin.field import db_create_field
 from globaleaks.handlers.admin.step import create_step
 from globaleaks.handlers.admin.questionnaire import get_questionnaire, db_get_questionnaire
 from globaleaks.handlers.admin.user import create_admin_user, create_custodian_user, create_receiver_user
-from globaleaks.handlers.submission import create_submission
+from globaleaks.handlers.submission import ArchivedSchemaCache, create_submission
 from globaleaks.rest.apicache import ApiCache
 from globaleaks.rest import errors
 from globaleaks.settings import Settings
-from globaleaks.security import SecureTemporaryFile
+from globaleaks.security import PGPKeyring, SecureTemporaryFile
 from globaleaks.state import State
 from globaleaks.utils import tempdict, token, utility
 from globaleaks.utils.structures import fill_localized_keys
+from globaleaks.utils.templating import TemplateCache
 from globaleaks.utils.utility import datetime_null, datetime_now, datetime_to_ISO8601, \
     log, sum_dicts
 
@@ -107,10 +108,13 @@ def init_glsettings_for_unit_tests():
 
     Settings.set_ramdisk_path()
 
+    close_store_pools()
+
     Settings.remove_directories()
     Settings.create_directories()
 
     State.orm_tp = FakeThreadPool()
+    State.orm_ro_tp = FakeThreadPool()
 
     State.tenant_cache[1].hostname = 'localhost'
 
@@ -243,6 +247,7 @@ def forge_request(uri='https://www.globaleaks.org/',
     request.client_ip = '127.0.0.1'
     request.client_proto = 'https'
     request.client_using_tor = False
+    request.upload_error = None
 
     def getResponseBody():
         return ''.join(request.written)
@@ -269,9 +274,9 @@ def forge_request(uri='https://www.globaleaks.org/',
 
     request.headers = request.getAllHeaders()
 
-    request.args = {}
+    request.args = urlparse.parse_qs(query)
     if attached_file is not None:
-        request.args = {'file': [attached_file]}
+        request.args['file'] = [attached_file]
 
     class fakeBody(object):
         def read(self):
@@ -325,6 +330,9 @@ class TestGL(unittest.TestCase):
         State.process_supervisor = sup
 
         Alarm.reset()
+        PGPKeyring.reset()
+        ArchivedSchemaCache.reset()
+        TemplateCache.reset()
         event.EventTrackQueue.clear()
         State.reset_hourly()
 
@@ -761,11 +769,11 @@ class TestHandler(TestGLWithPopulatedDB):
         x = api.APIResourceWrapper()
         x.preprocess(request)
 
-        if not getattr(handler_cls, 'decorated', False):
+        if not getattr(handler_cls, '_decorated', False):
+            handler_cls._decorated = True
             for method in ['get', 'post', 'put', 'delete']:
                 if getattr(handler_cls, method, None) is not None:
                     api.decorate_method(handler_cls, method)
-                    handler_cls.decorated = True
 
         handler = handler_cls(State, request, **kwargs)
 
@@ -2,7 +2,7 @@
 import os
 
 from globaleaks import models
-from globaleaks.jobs import cleaning_sched
+from globaleaks.jobs import cleaning_sched, secure_file_delete_sched
 from globaleaks.orm import transact
 from globaleaks.settings import Settings
 from globaleaks.tests import helpers
@@ -24,6 +24,7 @@ class TestCleaningSched(helpers.TestGLWithPopulatedDB):
         self.db_test_model_count(store, models.Message, 0)
         self.db_test_model_count(store, models.Mail, 0)
         self.db_test_model_count(store, models.SecureFileDelete, 0)
+        self.db_test_model_count(store, models.ArchivedSchema, 0)
 
     @transact
     def check1(self, store):
@@ -116,5 +117,7 @@ class TestCleaningSched(helpers.TestGLWithPopulatedDB):
 
         yield cleaning_sched.CleaningSchedule().run()
 
+        yield secure_file_delete_sched.SecureFileDeleteSchedule().run()
+
         # verify cascade deletion when tips expire
         yield self.check4()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import os
+
+from globaleaks.jobs import delivery_sched
+from globaleaks.security import GLBPGP, SecureTemporaryFile
+from globaleaks.settings import Settings
+from globaleaks.tests import helpers
+from twisted.internet import threads
+from twisted.internet.defer import inlineCallbacks
+
+
+class TestPGPEncryptMultiple(helpers.TestGL):
+    def get_recipient(self, pgp_key_public):
+        pgpobj = GLBPGP()
+        try:
+            fingerprint = pgpobj.load_key(pgp_key_public)['fingerprint']
+        finally:
+            pgpobj.destroy_environment()
+
+        return {
+            'name': u'recipient',
+            'pgp_key_public': pgp_key_public,
+            'pgp_key_fingerprint': fingerprint
+        }
+
+    def decrypt(self, pgp_key_private, path):
+        pgpobj = GLBPGP()
+        try:
+            pgpobj.load_key(pgp_key_private)
+            with open(path, 'rb') as f:
+                return str(pgpobj.gnupg.decrypt_file(f))
+        finally:
+            pgpobj.destroy_environment()
+
+    @inlineCallbacks
+    def test_encrypt_multiple(self):
+        # the content spans multiple chunks of the encryption stream
+        content = os.urandom(delivery_sched.PGP_ENCRYPTION_CHUNK_SIZE * 3 + 1)
+
+        f = SecureTemporaryFile(Settings.submission_path)
+        f.avoid_delete()
+        f.write(content)
+        f.close()
+
+        recipients = [
+            self.get_recipient(helpers.PGPKEYS['VALID_PGP_KEY1_PUB']),
+            self.get_recipient(helpers.PGPKEYS['VALID_PGP_KEY2_PUB']),
+            {
+                'name': u'invalid',
+                'pgp_key_public': u'invalid',
+                'pgp_key_fingerprint': u'invalid'
+            }
+        ]
+
+        results = yield threads.deferToThread(delivery_sched.fsops_pgp_encrypt_multiple,
+                                              os.path.basename(f.filepath),
+                                              recipients)
+
+        self.assertEqual(len(results), 3)
+        self.assertTrue(isinstance(results[2], Exception))
+
+        for (path, size), pgp_key_private in zip(results[:2], [helpers.PGPKEYS['VALID_PGP_KEY1_PRV'],
+                                                               helpers.PGPKEYS['VALID_PGP_KEY2_PRV']]):
+            self.assertEqual(os.stat(path).st_size, size)
+            self.assertEqual(self.decrypt(pgp_key_private, path), content)
+            os.remove(path)
+
+        os.remove(f.filepath)
+        os.remove(f.keypath)
+
+
+class TestDeliverySchedule(helpers.TestGLWithPopulatedDB):
+    encryption_scenario = 'ENCRYPTED'
+
+    @inlineCallbacks
+    def test_delivery_metrics(self):
+        yield self.perform_full_submission_actions()
+
+        job = delivery_sched.DeliverySchedule()
+        yield job.run()
+
+        self.assertEqual(job.metrics['files'], job.metrics['files_processed'])
+        self.assertTrue(job.metrics['files'] > 0)
+        self.assertTrue(job.metrics['bytes_processed'] > 0)
+        self.assertTrue(job.metrics['bytes_encrypted'] > 0)
+        self.assertTrue('duration' in job.metrics)
+        self.assertTrue('throughput' in job.metrics)
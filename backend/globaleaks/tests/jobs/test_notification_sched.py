@@ -3,10 +3,22 @@ from twisted.internet.defer import inlineCallbacks, succeed
 
 from globaleaks import models
 from globaleaks.jobs.delivery_sched import DeliverySchedule
-from globaleaks.jobs.notification_sched import NotificationSchedule
+from globaleaks.jobs.notification_sched import MailGenerator, NotificationSchedule
+from globaleaks.orm import transact
+from globaleaks.rest.apicache import ApiCache
 from globaleaks.tests import helpers
 
 
+@transact
+def set_tips_label(store, label):
+    store.find(models.ReceiverTip).set(label=label)
+
+
+@transact
+def get_mails_subjects(store):
+    return [mail.subject for mail in store.find(models.Mail)]
+
+
 class TestNotificationSchedule(helpers.TestGLWithPopulatedDB):
     @inlineCallbacks
     def setUp(self):
@@ -48,3 +60,40 @@ class TestNotificationSchedule(helpers.TestGLWithPopulatedDB):
         yield notification_schedule.run()
 
         yield self.test_model_count(models.Mail, 0)
+
+    @inlineCallbacks
+    def test_keywords_in_the_tip_label(self):
+        # the label is expanded in the subject of the mails
+        yield set_tips_label(u'{QuestionnaireAnswers}')
+
+        yield DeliverySchedule().run()
+
+        MailGenerator().generate()
+
+        subjects = yield get_mails_subjects()
+        self.assertTrue(subjects)
+        for subject in subjects:
+            self.assertNotIn(u'{QuestionnaireAnswers}', subject)
+
+
+class TestMailGenerator(helpers.TestGLWithPopulatedDB):
+    @transact
+    def serialize_config(self, store, key):
+        return MailGenerator().serialize_config(store, key, u'en')
+
+    @inlineCallbacks
+    def test_config_cache(self):
+        node = yield self.serialize_config('node')
+        notification = yield self.serialize_config('notification')
+
+        # the serializations are shared by the runs of the generator
+        self.assertIs((yield self.serialize_config('node')), node)
+        self.assertIs((yield self.serialize_config('notification')), notification)
+
+        # and invalidated only by the writes affecting them
+        ApiCache.invalidate('notification')
+        self.assertIs((yield self.serialize_config('node')), node)
+        self.assertIsNot((yield self.serialize_config('notification')), notification)
+
+        ApiCache.invalidate()
+        self.assertIsNot((yield self.serialize_config('node')), node)
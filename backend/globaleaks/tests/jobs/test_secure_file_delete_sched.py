@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import os
+
+from globaleaks import models
+from globaleaks.jobs import secure_file_delete_sched
+from globaleaks.orm import transact
+from globaleaks.security import overwrite_and_remove
+from globaleaks.settings import Settings
+from globaleaks.tests import helpers
+from twisted.internet.defer import inlineCallbacks
+
+
+class TestSecureFileDeleteSchedule(helpers.TestGL):
+    def create_file(self, name, size):
+        path = os.path.join(Settings.submission_path, name)
+        with open(path, 'wb') as f:
+            f.write('x' * size)
+
+        return path
+
+    @transact
+    def enqueue(self, store, paths):
+        for path in paths:
+            secure_file_delete = models.SecureFileDelete()
+            secure_file_delete.filepath = unicode(path)
+            store.add(secure_file_delete)
+
+    def test_overwrite_and_remove(self):
+        path = self.create_file('file', 200 * 1024 + 1)
+
+        throttled = []
+
+        self.assertEqual(overwrite_and_remove(path, throttle=throttled.append), 200 * 1024 + 1)
+        self.assertEqual(sum(throttled), 200 * 1024 + 1)
+        self.assertFalse(os.path.exists(path))
+
+    @inlineCallbacks
+    def test_secure_file_delete(self):
+        batch_size = Settings.secure_file_delete_batch_size
+        Settings.secure_file_delete_batch_size = 3
+
+        try:
+            paths = [self.create_file('file-%d' % i, i * 1024) for i in range(10)]
+            yield self.enqueue(paths + [os.path.join(Settings.submission_path, 'missing')])
+
+            job = secure_file_delete_sched.SecureFileDeleteSchedule()
+            yield job.run()
+        finally:
+            Settings.secure_file_delete_batch_size = batch_size
+
+        for path in paths:
+            self.assertFalse(os.path.exists(path))
+
+        yield self.test_model_count(models.SecureFileDelete, 0)
+
+        self.assertEqual(job.metrics['backlog'], 0)
+        self.assertEqual(job.metrics['files_deleted'], 11)
+        self.assertEqual(job.metrics['bytes_overwritten'], sum(i * 1024 for i in range(10)))
@@ -1,9 +1,127 @@
 # -*- coding: utf-8 -*-
+import re
+import timeit
+
 from twisted.internet.address import IPv4Address
 from twisted.internet.defer import inlineCallbacks
 
+from globaleaks.rest import router
 from globaleaks.state import State
 from globaleaks.tests.helpers import TestGL, forge_request
+from globaleaks.utils.utility import log
+from twisted.trial import unittest
+
+uuid = u'8c7e2b3a-1f6d-4e2b-9a4c-3d5e6f708192'
+token = u'a' * 42
+
+url_corpus = [
+    '/',
+    '/index.html',
+    '/js/scripts.min.js',
+    '/css/styles.min.css',
+    '/fonts/glyphicons-halflings-regular.woff2',
+    '/img/loading.gif',
+    '/data/logo.png',
+    '/data/custom_stylesheet.css',
+    '/s/favicon.ico',
+    '/s/logo.png',
+    '/l10n/en',
+    '/l10n/it',
+    '/l10n/xx',
+    '/robots.txt',
+    '/sitemap.xml',
+    '/public',
+    '/exception',
+    '/authentication',
+    '/receiptauth',
+    '/session',
+    '/preferences',
+    '/token',
+    '/token/' + token,
+    '/submission/' + token,
+    '/submission/' + token + '/file',
+    '/rtip/' + uuid,
+    '/rtip/' + uuid + '/comments',
+    '/rtip/' + uuid + '/messages',
+    '/rtip/' + uuid + '/identityaccessrequests',
+    '/rtip/' + uuid + '/export',
+    '/rtip/' + uuid + '/wbfile',
+    '/rtip/rfile/' + uuid,
+    '/rtip/wbfile/' + uuid,
+    '/rtip/operations',
+    '/wbtip',
+    '/wbtip/comments',
+    '/wbtip/messages/' + uuid,
+    '/wbtip/rfile',
+    '/wbtip/wbfile/' + uuid,
+    '/wbtip/' + uuid + '/provideidentityinformation',
+    '/receiver/preferences',
+    '/receiver/tips',
+    '/custodian/identityaccessrequests',
+    '/custodian/identityaccessrequest/' + uuid,
+    '/admin/node',
+    '/admin/users',
+    '/admin/users/' + uuid,
+    '/admin/users/' + uuid + '/img',
+    '/admin/contexts/' + uuid + '/img',
+    '/admin/questionnaires/default',
+    '/admin/fields/whistleblower_identity',
+    '/admin/stats/0',
+    '/admin/activities/summary',
+    '/admin/l10n/en',
+    '/admin/files/logo',
+    '/admin/config/tls',
+    '/admin/config/tls/hostname',
+    '/admin/config/tls/files/csr',
+    '/admin/config/tls/files/priv_key',
+    '/admin/staticfiles',
+    '/admin/staticfiles/antani.pdf',
+    '/admin/metrics',
+    '/wizard',
+    '/.well-known/acme-challenge/' + 'a' * 43,
+    '/s/abcdef',
+    '/nonexistent/../path',
+    '/admin/unknown!',
+    '/rtip/' + uuid + '/unknown',
+    '',
+]
+
+
+def linear_match(registry, path):
+    for regexp, handler, args in registry:
+        match = regexp.match(path)
+        if match:
+            return match, handler, args
+
+
+class TestRouter(unittest.TestCase):
+    def test_literal_prefix(self):
+        test_cases = [
+            (r'^/public$', '/public'),
+            (r'^/rtip/([a-f0-9]{8})/comments$', '/rtip/'),
+            (r'^/robots.txt$', '/robots'),
+            (r'^/admin/staticfiles$', '/admin/staticfiles'),
+            (r'^(/s/[a-z0-9]{1,30})$', ''),
+            (r'^/abc?$', '/ab'),
+            (r'^/abc*$', '/ab'),
+            (r'^/abc{2}$', '/ab'),
+            (r'^/abc|/def$', ''),
+            (r'^/\.well-known$', '/'),
+        ]
+
+        for pattern, prefix in test_cases:
+            self.assertEqual(router.literal_prefix(pattern), prefix)
+
+    def test_router_keeps_api_spec_order(self):
+        r = router.Router()
+        r.add(r'/admin/(.*)', 'first', {})
+        r.add(r'/admin/node', 'second', {})
+        r.add(r'/(.*)', 'third', {})
+        r.compile()
+
+        self.assertEqual(r.match('/admin/node')[1], 'first')
+        self.assertEqual(r.match('/adm')[1], 'third')
+        self.assertIsNone(r.match('antani'))
 
 
 class TestAPI(TestGL):
@@ -36,6 +154,38 @@ class TestAPI(TestGL):
                                               'custodian'], check_roles)
             self.assertTrue(len(rest) == 0)
 
+    def _linear_registry(self):
+        return [(re.compile(regexp.pattern), handler, args) for regexp, handler, args in self.api._router.routes]
+
+    def test_router_matches_linear_scan(self):
+        registry = self._linear_registry()
+
+        for path in url_corpus:
+            expected = linear_match(registry, path)
+            result = self.api._router.match(path)
+            if expected is None:
+                self.assertIsNone(result)
+            else:
+                self.assertEqual(result[1:], expected[1:])
+                self.assertEqual(result[0].groups(), expected[0].groups())
+
+    def test_router_benchmark(self):
+        registry = self._linear_registry()
+
+        def linear():
+            for path in url_corpus:
+                linear_match(registry, path)
+
+        def routed():
+            for path in url_corpus:
+                self.api._router.match(path)
+
+        # the timings are only reported as they depend on the load of the host
+        linear_time = min(timeit.repeat(linear, number=20, repeat=3))
+        routed_time = min(timeit.repeat(routed, number=20, repeat=3))
+
+        log.debug("Router benchmark: linear scan %fs, routed %fs", linear_time, routed_time)
+
     def test_get_with_no_language_header(self):
         request = forge_request()
         self.assertEqual(self.api.detect_language(request), 'en')
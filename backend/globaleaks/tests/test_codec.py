@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import json
+
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from globaleaks.rest import codec as codec_module
+from globaleaks.rest.codec import JSONCodec, UJSONCodec, JSONStreamProducer, codec
+from globaleaks.settings import Settings
+from globaleaks.tests import helpers
+
+tip = {
+    'id': u'd9c3d5a0-0000-4000-8000-000000000000',
+    'creation_date': u'2017-01-01T00:00:00Z',
+    'context_name': u'Pleæs€, s€t m€',
+    'questionnaire_hash': u'a' * 64,
+    'preview': [{u'label': u'<b>"x"</b>\n/\\', u'value': [u'\x00 ']}],
+    'file_count': 0,
+    'total_score': 97.5,
+    'ratio': 1 / 3.0,
+    'size': 2 ** 53,
+    'expiration_date': None,
+    'important': False,
+    'enable_attachments': True,
+    'label': u''
+}
+
+messages = [
+    {},
+    [],
+    tip,
+    [tip] * 3,
+    {'tips': [tip] * 3, 'count': 3},
+    [u'x', 1, 1.0, 1e-7, -0.0, None, True, [[]], {}],
+    u'antani',
+    'antani',
+    0
+]
+
+
+class TestJSONCodec(unittest.TestCase):
+    codec_class = JSONCodec
+
+    def setUp(self):
+        self.codec = self.codec_class()
+
+    def test_dumps(self):
+        for message in messages:
+            self.assertEqual(self.codec.dumps(message), json.dumps(message, separators=(',', ':')))
+
+    def test_iterencode(self):
+        for message in messages:
+            self.assertEqual(b''.join(self.codec.iterencode(message)), self.codec.dumps(message))
+
+    def test_dumps_text(self):
+        for message in messages:
+            dump = self.codec.dumps_text(message)
+            self.assertIsInstance(dump, unicode)
+            self.assertEqual(dump, json.dumps(message, ensure_ascii=False))
+
+    def test_loads(self):
+        for message in messages:
+            data = json.dumps(message)
+            self.assertEqual(self.codec.loads(data), json.loads(data))
+            self.assertEqual(self.codec.loads_text(data.decode('utf-8')), json.loads(data))
+
+    def test_loads_invalid(self):
+        for data in [b'', b'{', b'{"a": }', b'[1, 2']:
+            self.assertRaises(ValueError, self.codec.loads, data)
+
+
+class TestUJSONCodec(TestJSONCodec):
+    codec_class = UJSONCodec
+
+    if codec_module.ujson is None:
+        skip = "ujson is not available"
+
+
+class TestJSONStreamProducer(helpers.TestGL):
+    @inlineCallbacks
+    def test_stream(self):
+        data = [tip] * 1000
+
+        request = helpers.forge_request()
+        yield JSONStreamProducer(request, data).start()
+
+        self.assertEqual(request.getResponseBody(), codec.dumps(data))
+
+        # the response is written in chunks
+        self.assertGreater(len(request.written), 1)
+        for chunk in request.written[:-1]:
+            self.assertLess(len(chunk), Settings.file_chunk_size * 2)
+
+    @inlineCallbacks
+    def test_stream_empty(self):
+        request = helpers.forge_request()
+        yield JSONStreamProducer(request, []).start()
+
+        self.assertEqual(request.getResponseBody(), b'[]')
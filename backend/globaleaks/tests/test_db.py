@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from storm.databases.sqlite import compile
+from storm.expr import In, State
+
+from globaleaks import models
+from globaleaks.orm import transact
+from globaleaks.tests import helpers
+from globaleaks.utils.utility import datetime_now
+
+
+class TestIndexes(helpers.TestGL):
+    """
+    Verify that the lookups performed by the scheduler and by the tip
+    handlers are resolved through the secondary indexes in sqlite.sql.
+    """
+    def assertQueryUsesIndex(self, store, resultset, index):
+        state = State()
+        statement = compile(resultset._get_select(), state)
+        params = [p.get(to_db=True) for p in state.parameters]
+        plan = u' '.join(r[-1] for r in store.execute('EXPLAIN QUERY PLAN ' + statement, params))
+        self.assertIn(index, plan)
+
+    @transact
+    def _test_hot_queries(self, store):
+        now = datetime_now()
+
+        queries = [
+            (store.find(models.ReceiverTip, models.ReceiverTip.receiver_id == u'id'), 'idx_receivertip_receiver_id'),
+            (store.find(models.ReceiverTip, models.ReceiverTip.internaltip_id == u'id'), 'idx_receivertip_internaltip_id'),
+            (store.find(models.ReceiverTip, models.ReceiverTip.new == True), 'idx_receivertip_new'),
+            (store.find(models.Comment, models.Comment.internaltip_id == u'id'), 'idx_comment_internaltip_id'),
+            (store.find(models.Comment, models.Comment.new == True), 'idx_comment_new'),
+            (store.find(models.Message, models.Message.receivertip_id == u'id'), 'idx_message_receivertip_id'),
+            (store.find(models.Message, models.Message.new == True), 'idx_message_new'),
+            (store.find(models.InternalFile, models.InternalFile.internaltip_id == u'id'), 'idx_internalfile_internaltip_id'),
+            (store.find(models.InternalFile, models.InternalFile.new == True), 'idx_internalfile_new'),
+            (store.find(models.ReceiverFile, models.ReceiverFile.internalfile_id == u'id'), 'idx_receiverfile_internalfile_id'),
+            (store.find(models.ReceiverFile, models.ReceiverFile.receivertip_id == u'id'), 'idx_receiverfile_receivertip_id'),
+            (store.find(models.ReceiverFile, models.ReceiverFile.new == True), 'idx_receiverfile_new'),
+            (store.find(models.WhistleblowerFile, models.WhistleblowerFile.receivertip_id == u'id'), 'idx_whistleblowerfile_receivertip_id'),
+            (store.find(models.IdentityAccessRequest, models.IdentityAccessRequest.receivertip_id == u'id'), 'idx_identityaccessrequest_receivertip_id'),
+            (store.find(models.InternalTip, models.InternalTip.expiration_date < now), 'idx_internaltip_expiration_date'),
+            (store.find(models.InternalTip, models.InternalTip.questionnaire_hash == u'hash'), 'idx_internaltip_questionnaire_hash'),
+            (store.find(models.FieldAnswer, models.FieldAnswer.internaltip_id == u'id'), 'idx_fieldanswer_internaltip_id'),
+            (store.find(models.FieldAnswer, models.FieldAnswer.fieldanswergroup_id == u'id'), 'idx_fieldanswer_fieldanswergroup_id'),
+            (store.find(models.FieldAnswerGroup, In(models.FieldAnswerGroup.fieldanswer_id, [u'a', u'b'])), 'idx_fieldanswergroup_fieldanswer_id'),
+            (store.find(models.Mail, models.Mail.processing_attempts > 9), 'idx_mail_processing_attempts'),
+            (store.find(models.Stats, models.Stats.start < now - timedelta(90)), 'idx_stats_start'),
+        ]
+
+        for resultset, index in queries:
+            self.assertQueryUsesIndex(store, resultset, index)
+
+    def test_hot_queries_use_indexes(self):
+        return self._test_hot_queries()
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from globaleaks.models import Counter
-from globaleaks.orm import get_store, transact
+from globaleaks.orm import get_store, transact, transact_ro, rw_store_pool
 from globaleaks.tests import helpers
 from twisted.internet.defer import inlineCallbacks
 
@@ -18,6 +18,12 @@ class TestORM(helpers.TestGL):
         self.assertEqual(store.execute("PRAGMA foreign_keys").get_one()[0], 1)  # ON
         self.assertEqual(store.execute("PRAGMA secure_delete").get_one()[0], 1) # ON
         self.assertEqual(store.execute("PRAGMA auto_vacuum").get_one()[0], 1)   # FULL
+        self.assertEqual(store.execute("PRAGMA journal_mode").get_one()[0], u'wal')
+        self.assertEqual(store.execute("PRAGMA query_only").get_one()[0], 0)
+
+    @transact_ro
+    def _transaction_ro_pragmas(self, store):
+        self.assertEqual(store.execute("PRAGMA query_only").get_one()[0], 1)
 
     def db_add_config(self, store):
         store.add(Counter({'key': 'antani', 'number': 31337}))
@@ -26,6 +32,15 @@ class TestORM(helpers.TestGL):
     def _transact_with_success(self, store):
         self.db_add_config(store)
 
+    @transact_ro
+    def _transact_ro_with_write(self, store):
+        self.db_add_config(store)
+        store.flush()
+
+    @transact_ro
+    def _transact_ro_count(self, store):
+        return store.find(Counter).count()
+
     @transact
     def _transact_with_exception(self, store):
         self.db_add_config(store)
@@ -34,6 +49,9 @@ class TestORM(helpers.TestGL):
     def test_transaction_pragmas(self):
         return self._transaction_pragmas()
 
+    def test_transaction_ro_pragmas(self):
+        return self._transaction_ro_pragmas()
+
     @inlineCallbacks
     def test_transact_with_stuff(self):
         yield self._transact_with_success()
@@ -53,6 +71,37 @@ class TestORM(helpers.TestGL):
 
         self.assertEqual(count1, count2)
 
+    @inlineCallbacks
+    def test_transact_ro(self):
+        yield self._transact_with_success()
+
+        count = yield self._transact_ro_count()
+        self.assertEqual(count, 1)
+
+        yield self.assertFailure(self._transact_ro_with_write(), Exception)
+
+        count = yield self._transact_ro_count()
+        self.assertEqual(count, 1)
+
+    @inlineCallbacks
+    def test_store_pool(self):
+        rw_store_pool.close()
+        rw_store_pool.reset_stats()
+
+        yield self._transaction_pragmas()
+        yield self._transaction_pragmas()
+
+        self.assertEqual(rw_store_pool.misses, 1)
+        self.assertEqual(rw_store_pool.hits, 1)
+
+        # a store that is no more usable is discarded and replaced
+        rw_store_pool.idle.values()[0].close()
+
+        yield self._transaction_pragmas()
+
+        self.assertEqual(rw_store_pool.discarded, 1)
+        self.assertEqual(rw_store_pool.misses, 2)
+
     def test_transact_decorate_function(self):
         @transact
         def transaction(store):
@@ -6,7 +6,7 @@ from datetime import datetime
 from globaleaks.rest import errors
 from globaleaks.security import generateRandomSalt, hash_password, check_password, change_password, \
     directory_traversal_check, SecureTemporaryFile, SecureFile, \
-    GLBPGP
+    GLBPGP, PGPKeyring
 from globaleaks.settings import Settings
 from globaleaks.tests import helpers
 from twisted.trial import unittest
@@ -94,6 +94,16 @@ class TestSecureFiles(helpers.TestGL):
         self.assertRaises(Exception, a.write, antani)
         a.close()
 
+    def test_temporary_file_truncate(self):
+        for size in [0, 15, 16, 17, 50000]:
+            a = SecureTemporaryFile(Settings.tmp_upload_path)
+            antani = "0123456789" * 10000
+            a.write(antani)
+            a.truncate(size)
+            a.write("antani")
+            self.assertEqual(a.read(), antani[:size] + "antani")
+            a.close()
+
     def test_temporary_file_avoid_delete(self):
         a = SecureTemporaryFile(Settings.tmp_upload_path)
         a.avoid_delete()
@@ -172,3 +182,77 @@ class TestPGP(helpers.TestGL):
                          datetime.utcfromtimestamp(1391012793))
 
         pgpobj.destroy_environment()
+
+
+class TestPGPKeyring(helpers.TestGL):
+    secret_content = 'secret'
+
+    def decrypt(self, pgp_key_private, data):
+        pgpobj = GLBPGP()
+        try:
+            pgpobj.load_key(pgp_key_private)
+            return str(pgpobj.gnupg.decrypt(data))
+        finally:
+            pgpobj.destroy_environment()
+
+    def get_keyring_fingerprints(self):
+        return [k['fingerprint'] for k in PGPKeyring.gpoj.gnupg.list_keys()]
+
+    def test_key_is_imported_once(self):
+        for _ in range(3):
+            encrypted_body = PGPKeyring.encrypt_message(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'], self.secret_content)
+            self.assertEqual(self.decrypt(helpers.PGPKEYS['VALID_PGP_KEY1_PRV'], encrypted_body), self.secret_content)
+
+        encrypted_body = PGPKeyring.encrypt_message(helpers.PGPKEYS['VALID_PGP_KEY2_PUB'], self.secret_content)
+        self.assertEqual(self.decrypt(helpers.PGPKEYS['VALID_PGP_KEY2_PRV'], encrypted_body), self.secret_content)
+
+        stats = PGPKeyring.get_stats()
+        self.assertEqual(stats['keys'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(len(self.get_keyring_fingerprints()), 2)
+
+    def test_invalidate(self):
+        PGPKeyring.encrypt_message(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'], self.secret_content)
+
+        PGPKeyring.invalidate(u'BFB3C82D1B5F6A94BDAC55C6E70460ABF9A4C8C1')
+
+        self.assertEqual(PGPKeyring.get_stats()['keys'], 0)
+        self.assertEqual(self.get_keyring_fingerprints(), [])
+
+        PGPKeyring.encrypt_message(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'], self.secret_content)
+        self.assertEqual(PGPKeyring.get_stats()['misses'], 2)
+
+    def test_invalidate_key_in_use(self):
+        gpoj, entry = PGPKeyring.acquire(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'])
+
+        PGPKeyring.invalidate(entry['fingerprint'])
+
+        # the key is removed from the keyring only once released
+        self.assertEqual(self.get_keyring_fingerprints(), [entry['fingerprint']])
+        gpoj.encrypt_message(entry['fingerprint'], self.secret_content)
+
+        PGPKeyring.release(entry)
+        self.assertEqual(self.get_keyring_fingerprints(), [])
+
+    def test_expired_key_is_evicted(self):
+        self.assertRaises(errors.PGPKeyInvalid,
+                          PGPKeyring.encrypt_message, helpers.PGPKEYS['EXPIRED_PGP_KEY_PUB'], self.secret_content)
+
+        self.assertEqual(PGPKeyring.get_stats()['keys'], 0)
+        self.assertEqual(self.get_keyring_fingerprints(), [])
+
+    def test_lru_eviction(self):
+        pgp_keyring_size = Settings.pgp_keyring_size
+        Settings.pgp_keyring_size = 1
+
+        try:
+            PGPKeyring.encrypt_message(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'], self.secret_content)
+            PGPKeyring.encrypt_message(helpers.PGPKEYS['VALID_PGP_KEY2_PUB'], self.secret_content)
+
+            stats = PGPKeyring.get_stats()
+            self.assertEqual(stats['keys'], 1)
+            self.assertEqual(stats['evictions'], 1)
+            self.assertEqual(len(self.get_keyring_fingerprints()), 1)
+        finally:
+            Settings.pgp_keyring_size = pgp_keyring_size
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import timeit
+import uuid
+
+from globaleaks.handlers.base import BaseHandler
+from globaleaks.rest import errors, requests, validators
+from globaleaks.tests import helpers
+from globaleaks.utils.utility import log
+
+# values replacing the ones of the valid messages in order to produce the
+# invalid ones and those requiring a conversion or a strip
+mutations = [None, 0, 1, False, True, u'', u'12', u'true', u'antani',
+             u'd9c3d5a0-0000-4000-8000-000000000000', [], [u'x'], [{}], {}, {u'x': 1}, 1.5]
+
+
+def interpret(message, template):
+    try:
+        BaseHandler.validate_jmessage(message, template)
+        return 'ok', message
+    except errors.InvalidInputFormat as excep:
+        return 'rejected', excep.reason
+    except (AttributeError, TypeError):
+        # failures of the interpreter on unexpected types
+        return 'rejected', None
+
+
+def execute(message, template):
+    try:
+        validators.get_validator(template)(message)
+        return 'ok', message
+    except errors.InvalidInputFormat as excep:
+        return 'rejected', excep.reason
+
+
+def as_json(message):
+    # the messages are validated as decoded by json, with unicode strings
+    return json.loads(json.dumps(message))
+
+
+def mutate(message):
+    """
+    Produce the variants of a message obtained by removing, replacing or
+    adding a key at every level of its structure
+    """
+    yield message
+
+    if isinstance(message, dict):
+        for key in message:
+            variant = copy.deepcopy(message)
+            del variant[key]
+            yield variant
+
+            for value in mutations:
+                variant = copy.deepcopy(message)
+                variant[key] = value
+                yield variant
+
+            for value in mutate(message[key]):
+                if value is not message[key]:
+                    variant = copy.deepcopy(message)
+                    variant[key] = value
+                    yield variant
+
+        variant = copy.deepcopy(message)
+        variant['unexpected_key'] = u'antani'
+        yield variant
+
+    elif isinstance(message, list) and message:
+        for value in mutate(message[0]):
+            if value is not message[0]:
+                variant = copy.deepcopy(message)
+                variant[0] = value
+                yield variant
+
+
+def get_dummy_questionnaire(steps_count, fields_count):
+    steps = []
+    for i in range(steps_count):
+        step = helpers.get_dummy_step()
+        step['id'] = unicode(uuid.uuid4())
+        step['presentation_order'] = i
+        for j in range(fields_count):
+            field = helpers.get_dummy_field()
+            field['id'] = unicode(uuid.uuid4())
+            field['y'] = j
+            step['children'].append(field)
+
+        steps.append(step)
+
+    return as_json({
+        'id': u'',
+        'name': u'questionnaire',
+        'steps': steps
+    })
+
+
+def get_dummy_submission(receivers_count, answers_count):
+    return as_json({
+        'context_id': unicode(uuid.uuid4()),
+        'receivers': [unicode(uuid.uuid4()) for _ in range(receivers_count)],
+        'files': [],
+        'human_captcha_answer': 0,
+        'proof_of_work_answer': 0,
+        'identity_provided': False,
+        'total_score': 0,
+        'answers': {unicode(uuid.uuid4()): [{u'value': u'x' * 100}] for _ in range(answers_count)}
+    })
+
+
+class TestValidators(helpers.TestGL):
+    def assertParity(self, message, template):
+        for variant in mutate(message):
+            expected = interpret(copy.deepcopy(variant), template)
+            result = execute(copy.deepcopy(variant), template)
+
+            if expected[1] is None:
+                self.assertEqual(result[0], 'rejected')
+            else:
+                self.assertEqual(result, expected)
+
+    def test_all_the_requests_are_compiled(self):
+        for name, value in vars(requests).items():
+            if not name.startswith('_') and isinstance(value, (dict, list)):
+                self.assertIsNot(validators.get_validator(value),
+                                 validators.compile_validator(value))
+                self.assertIs(validators.get_validator(value),
+                              validators.get_validator(value))
+
+    def test_parity_submission(self):
+        self.assertParity(get_dummy_submission(2, 2), requests.SubmissionDesc)
+
+    def test_parity_questionnaire(self):
+        self.assertParity(get_dummy_questionnaire(1, 1), requests.AdminQuestionnaireDesc)
+
+    def test_parity_questionnaire_raw(self):
+        questionnaire = get_dummy_questionnaire(1, 1)
+        questionnaire['name'] = {u'en': u'questionnaire'}
+        self.assertParity(questionnaire, requests.AdminQuestionnaireDescRaw)
+
+    def test_parity_field(self):
+        self.assertParity(as_json(helpers.get_dummy_field()), requests.AdminFieldDesc)
+
+    def test_parity_node(self):
+        self.assertParity(as_json(helpers.MockDict().dummyNode), requests.AdminNodeDesc)
+
+    def test_parity_context(self):
+        self.assertParity(as_json(helpers.MockDict().dummyContext), requests.AdminContextDesc)
+
+    def test_parity_user(self):
+        self.assertParity(as_json(helpers.MockDict().dummyUser), requests.AdminUserDesc)
+
+    def test_parity_list(self):
+        for message in [[], [{}], [{'id': u'x'}], {}, u'', 1, None]:
+            self.assertParity(message, requests.TipsOverviewDesc)
+
+    def test_parity_templates_not_in_requests(self):
+        template = {'key': '^(enable_two_way_comments|enable_notifications)$', 'value': bool}
+        self.assertParity({'key': u'enable_notifications', 'value': True}, template)
+        self.assertParity({'key': u'enable_notifications'}, u'antani')
+
+    def test_strip(self):
+        message = as_json(helpers.get_dummy_field())
+        message['creation_date'] = u'1970-01-01 00:00:00.000000'
+        message['options'][0]['creation_date'] = u'1970-01-01 00:00:00.000000'
+
+        self.assertTrue(validators.get_validator(requests.AdminFieldDesc)(message))
+        self.assertNotIn('creation_date', message)
+        self.assertNotIn('creation_date', message['options'][0])
+
+    def test_reject(self):
+        message = as_json(helpers.get_dummy_field())
+        message['options'][1]['score_points'] = u'antani'
+
+        self.assertRaises(errors.InvalidInputFormat,
+                          validators.get_validator(requests.AdminFieldDesc), message)
+
+    def benchmark(self, message, template):
+        self.assertEqual(execute(copy.deepcopy(message), template),
+                         interpret(copy.deepcopy(message), template))
+
+        messages = [copy.deepcopy(message) for _ in range(6)]
+
+        def interpreted():
+            BaseHandler.validate_jmessage(messages.pop(), template)
+
+        def compiled():
+            validators.get_validator(template)(messages.pop())
+
+        # the timings are only reported as they depend on the load of the host
+        interpreted_time = min(timeit.repeat(interpreted, number=1, repeat=3))
+        compiled_time = min(timeit.repeat(compiled, number=1, repeat=3))
+
+        log.debug("Validators benchmark: interpreted %fs, compiled %fs", interpreted_time, compiled_time)
+
+    def test_submission_benchmark(self):
+        self.benchmark(get_dummy_submission(1000, 1000), requests.SubmissionDesc)
+
+    def test_questionnaire_benchmark(self):
+        self.benchmark(get_dummy_questionnaire(10, 100), requests.AdminQuestionnaireDesc)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+import os
+from io import BytesIO
+
+from twisted.internet import defer, protocol, reactor
+from twisted.internet.endpoints import TCP4ClientEndpoint
+from twisted.test.proto_helpers import StringTransport
+from twisted.trial import unittest
+from twisted.web.client import Agent, FileBodyProducer, readBody
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+from globaleaks.utils.httpsproxy import BodyProducer, HTTPStreamFactory
+
+
+class UploadClient(protocol.Protocol):
+    """
+    Client sending only the first part of the body of a request
+    """
+    def __init__(self, length, data):
+        self.length = length
+        self.data = data
+        self.closed = defer.Deferred()
+
+    def connectionMade(self):
+        self.transport.write(b'POST / HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: %d\r\n\r\n' % self.length)
+        self.transport.write(self.data)
+
+    def connectionLost(self, reason=protocol.connectionDone):
+        self.closed.callback(None)
+
+
+class BackendResource(Resource):
+    isLeaf = True
+
+    def __init__(self):
+        Resource.__init__(self)
+        self.channels = set()
+        self.forwarded_for = []
+
+    def render(self, request):
+        self.channels.add(request.channel)
+        self.forwarded_for.append(request.getHeader(b'GL-Forwarded-For'))
+        request.setHeader(b'content-type', b'application/octet-stream')
+
+        return b'%d' % len(request.content.read())
+
+
+class TestHTTPStreamFactory(unittest.TestCase):
+    def setUp(self):
+        self.backend = BackendResource()
+        self.backend_port = reactor.listenTCP(0, Site(self.backend), interface='127.0.0.1')
+
+        proxy_url = 'http://127.0.0.1:%d' % self.backend_port.getHost().port
+        self.factory = HTTPStreamFactory(proxy_url, 2)
+        self.proxy_port = reactor.listenTCP(0, self.factory, interface='127.0.0.1')
+
+        self.url = b'http://127.0.0.1:%d/' % self.proxy_port.getHost().port
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        yield self.proxy_port.stopListening()
+        yield self.backend_port.stopListening()
+        yield self.factory.pool.closeCachedConnections()
+
+    @defer.inlineCallbacks
+    def fetch(self, method=b'GET', body=None):
+        # every request of the client is sent on a new connection to the proxy
+        producer = FileBodyProducer(body) if body is not None else None
+        response = yield Agent(reactor).request(method, self.url, bodyProducer=producer)
+        body = yield readBody(response)
+        defer.returnValue((response.code, body))
+
+    @defer.inlineCallbacks
+    def test_backend_connections_are_reused(self):
+        for _ in range(5):
+            code, body = yield self.fetch()
+            self.assertEqual(code, 200)
+            self.assertEqual(body, b'0')
+
+        self.assertEqual(len(self.backend.channels), 1)
+        self.assertEqual(self.backend.forwarded_for, [b'127.0.0.1'] * 5)
+
+        stats = self.factory.get_stats()
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['errors'], 0)
+        self.assertEqual(stats['backend_connections'], 1)
+        self.assertEqual(stats['reused'], 4)
+
+    @defer.inlineCallbacks
+    def test_body_is_streamed(self):
+        data = os.urandom(4 * 1024 * 1024)
+
+        code, body = yield self.fetch(b'POST', BytesIO(data))
+
+        self.assertEqual(code, 200)
+        self.assertEqual(body, b'%d' % len(data))
+
+        # the following requests use the same connection to the backend
+        code, body = yield self.fetch()
+        self.assertEqual(body, b'0')
+        self.assertEqual(self.factory.get_stats()['backend_connections'], 1)
+
+    @defer.inlineCallbacks
+    def test_backend_unavailable(self):
+        yield self.backend_port.stopListening()
+
+        code, _ = yield self.fetch()
+
+        self.assertEqual(code, 502)
+        self.assertEqual(self.factory.get_stats()['errors'], 1)
+
+    @defer.inlineCallbacks
+    def test_backend_unavailable_while_receiving_the_body(self):
+        yield self.backend_port.stopListening()
+
+        # the client, paused once the buffer of the body is full, is disconnected
+        client = UploadClient(4 * 1024 * 1024, b'a' * 1024 * 1024)
+        endpoint = TCP4ClientEndpoint(reactor, '127.0.0.1', self.proxy_port.getHost().port)
+        yield endpoint.connect(protocol.Factory.forProtocol(lambda: client))
+        yield client.closed
+
+        self.assertEqual(self.factory.get_stats()['errors'], 1)
+
+
+class Consumer(object):
+    def __init__(self):
+        self.data = b''
+
+    def write(self, data):
+        self.data += data
+
+
+class TestBodyProducer(unittest.TestCase):
+    def test_backpressure(self):
+        transport = StringTransport()
+        producer = BodyProducer(transport, BodyProducer.BUF_MAX_SIZE * 2)
+
+        # the data received before the connection to the backend is buffered
+        producer.write(b'a' * (BodyProducer.BUF_MAX_SIZE - 1))
+        self.assertEqual(transport.producerState, 'producing')
+
+        producer.write(b'a')
+        self.assertEqual(transport.producerState, 'paused')
+
+        consumer = Consumer()
+        d = producer.startProducing(consumer)
+        self.assertEqual(transport.producerState, 'producing')
+        self.assertEqual(len(consumer.data), BodyProducer.BUF_MAX_SIZE)
+
+        # the client is paused while the backend is not able to accept more data
+        producer.pauseProducing()
+        self.assertEqual(transport.producerState, 'paused')
+
+        producer.resumeProducing()
+        producer.write(b'b' * BodyProducer.BUF_MAX_SIZE)
+        producer.finish()
+
+        self.assertEqual(len(consumer.data), BodyProducer.BUF_MAX_SIZE * 2)
+
+        return d
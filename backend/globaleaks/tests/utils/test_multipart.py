@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+import os
+
+from twisted.test.proto_helpers import StringTransport
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+from globaleaks.rest import errors
+from globaleaks.state import State
+from globaleaks.tests import helpers
+from globaleaks.utils import multipart
+from globaleaks.utils.multipart import MultipartError, MultipartParser, StreamingRequest, Uploads, UploadsMonitor, \
+    get_file_upload
+
+BOUNDARY = b'----flowboundary'
+
+
+def build_body(fields, filename, content):
+    body = b''
+    for name, value in fields:
+        body += b'--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n' % (BOUNDARY, name, value)
+
+    body += b'--%s\r\nContent-Disposition: form-data; name="file"; filename="%s"\r\n' % (BOUNDARY, filename)
+    body += b'Content-Type: application/octet-stream\r\n\r\n%s\r\n--%s--\r\n' % (content, BOUNDARY)
+
+    return body
+
+
+class Part(object):
+    def __init__(self, headers, parts):
+        self.headers = headers
+        self.data = b''
+        self.closed = False
+        parts.append(self)
+
+    def write(self, data):
+        self.data += data
+
+    def close(self):
+        self.closed = True
+
+
+class TestMultipartParser(helpers.TestGL):
+    def parse(self, body, step):
+        parts = []
+        parser = MultipartParser(BOUNDARY, lambda headers: Part(headers, parts))
+
+        for i in range(0, len(body), step):
+            parser.feed(body[i:i + step])
+
+        parser.close()
+
+        return parts
+
+    def test_parse(self):
+        # the content includes pieces of the delimiter that should not split the part
+        content = os.urandom(10000) + b'\r\n--' + BOUNDARY[:-1] + b'\r\n' + os.urandom(100)
+        body = build_body([(b'flowChunkNumber', b'1'), (b'flowFilename', b'a.txt')], b'a.txt', content)
+
+        for step in [1, 7, 4096, len(body)]:
+            parts = self.parse(body, step)
+
+            self.assertEqual(len(parts), 3)
+            self.assertEqual([p.data for p in parts], [b'1', b'a.txt', content])
+            self.assertTrue(all(p.closed for p in parts))
+            self.assertEqual(parts[2].headers[b'content-type'], b'application/octet-stream')
+
+    def test_truncated_body(self):
+        body = build_body([], b'a.txt', b'content')
+
+        self.assertRaises(MultipartError, self.parse, body[:-10], 1)
+
+    def test_invalid_part_header(self):
+        body = b'--%s\r\ninvalid\r\n\r\ndata\r\n--%s--\r\n' % (BOUNDARY, BOUNDARY)
+
+        self.assertRaises(MultipartError, self.parse, body, 1)
+
+
+class UploadResource(Resource):
+    isLeaf = True
+
+    def __init__(self):
+        Resource.__init__(self)
+        self.requests = []
+
+    def render_POST(self, request):
+        try:
+            upload, upload_error = get_file_upload(request), None
+        except errors.GLException as excep:
+            upload, upload_error = None, excep
+
+        self.requests.append({
+            'args': dict((k, v) for k, v in request.args.items() if k != 'file'),
+            'upload_error': upload_error,
+            'content': upload['body'].read() if upload is not None else None
+        })
+
+        if upload is not None:
+            upload['body'].close()
+
+        return b''
+
+
+def flow_fields(chunk_number, total_chunks, total_size):
+    return [(b'flowChunkNumber', b'%d' % chunk_number),
+            (b'flowTotalChunks', b'%d' % total_chunks),
+            (b'flowTotalSize', b'%d' % total_size),
+            (b'flowIdentifier', b'flow-id'),
+            (b'flowFilename', b'a.txt')]
+
+
+class TestStreamingRequest(helpers.TestGL):
+    def setUp(self):
+        UploadsMonitor.reset()
+
+        return helpers.TestGL.setUp(self)
+
+    def tearDown(self):
+        for upload in Uploads.values():
+            upload.file.close()
+
+        Uploads.clear()
+
+        return helpers.TestGL.tearDown(self)
+
+    def post(self, body, step=1024, length=None):
+        resource = UploadResource()
+        channel = Site(resource, requestFactory=StreamingRequest).buildProtocol(None)
+        transport = StringTransport()
+        channel.makeConnection(transport)
+
+        channel.dataReceived(b'POST /upload HTTP/1.1\r\n'
+                             b'Host: www.globaleaks.org\r\n'
+                             b'Content-Type: multipart/form-data; boundary=%s\r\n'
+                             b'Content-Length: %d\r\n\r\n' % (BOUNDARY, len(body)))
+
+        # a length shorter than the body simulates a connection lost during the upload
+        body = body[:length]
+
+        for i in range(0, len(body), step):
+            channel.dataReceived(body[i:i + step])
+
+        channel.connectionLost(None)
+
+        return resource.requests, transport.value()
+
+    def test_upload(self):
+        content = os.urandom(multipart.UPLOAD_BUFFER_SIZE * 3 + 1)
+        body = build_body(flow_fields(1, 1, len(content)), b'a.txt', content)
+
+        requests, _ = self.post(body)
+
+        self.assertEqual(len(requests), 1)
+        self.assertIsNone(requests[0]['upload_error'])
+        self.assertEqual(requests[0]['args']['flowTotalSize'], [b'%d' % len(content)])
+        self.assertEqual(requests[0]['content'], content)
+        self.assertEqual(len(Uploads), 0)
+
+        stats = UploadsMonitor.get_stats()
+        self.assertEqual(stats['active'], 0)
+        self.assertEqual(stats['buffered'], 0)
+        self.assertTrue(0 < stats['buffered_peak'] < multipart.UPLOAD_BUFFER_SIZE + 1024)
+
+    def test_upload_chunks(self):
+        chunks = [os.urandom(multipart.UPLOAD_BUFFER_SIZE + 1), os.urandom(1000)]
+        total_size = sum(len(chunk) for chunk in chunks)
+
+        body = build_body(flow_fields(1, 2, total_size), b'a.txt', chunks[0])
+
+        # the retransmission of a chunk already received is ignored
+        for _ in range(2):
+            requests, _ = self.post(body)
+
+            self.assertIsNone(requests[0]['upload_error'])
+            self.assertIsNone(requests[0]['content'])
+            self.assertEqual(Uploads['flow-id'].chunks, 1)
+            self.assertEqual(Uploads['flow-id'].size, len(chunks[0]))
+
+        requests, _ = self.post(build_body(flow_fields(2, 2, total_size), b'a.txt', chunks[1]))
+
+        self.assertIsNone(requests[0]['upload_error'])
+        self.assertEqual(requests[0]['content'], b''.join(chunks))
+        self.assertEqual(len(Uploads), 0)
+        self.assertEqual(UploadsMonitor.get_stats()['active'], 0)
+
+    def test_upload_interrupted_chunk(self):
+        chunks = [os.urandom(1000), os.urandom(multipart.UPLOAD_BUFFER_SIZE * 2)]
+        total_size = sum(len(chunk) for chunk in chunks)
+
+        self.post(build_body(flow_fields(1, 2, total_size), b'a.txt', chunks[0]))
+
+        body = build_body(flow_fields(2, 2, total_size), b'a.txt', chunks[1])
+        requests, _ = self.post(body, length=len(body) - 1000)
+
+        self.assertEqual(requests, [])
+        self.assertEqual(Uploads['flow-id'].chunks, 1)
+        self.assertEqual(Uploads['flow-id'].size, len(chunks[0]))
+
+        requests, _ = self.post(body)
+
+        self.assertIsNone(requests[0]['upload_error'])
+        self.assertEqual(requests[0]['content'], b''.join(chunks))
+        self.assertEqual(UploadsMonitor.get_stats()['active'], 0)
+
+    def test_upload_unexpected_chunk(self):
+        requests, _ = self.post(build_body(flow_fields(2, 2, 10), b'a.txt', b'content'))
+
+        self.assertEqual(requests[0]['upload_error'].error_code, 3)
+        self.assertEqual(len(Uploads), 0)
+
+    def test_upload_rejected_on_total_size(self):
+        total_size = State.tenant_cache[1].maximum_filesize * 1024 * 1024 + 1
+        body = build_body(flow_fields(1, 1, total_size), b'a.txt', b'content')
+
+        requests, _ = self.post(body)
+
+        self.assertEqual(requests[0]['upload_error'].error_code, 39)
+        self.assertIsNone(requests[0]['content'])
+        self.assertEqual(UploadsMonitor.get_stats()['rejected'], 1)
+        self.assertEqual(UploadsMonitor.get_stats()['active'], 0)
+
+    def test_upload_rejected_on_size(self):
+        maximum_filesize = State.tenant_cache[1].maximum_filesize
+        State.tenant_cache[1].maximum_filesize = 0
+
+        try:
+            requests, _ = self.post(build_body(flow_fields(1, 1, 0), b'a.txt', b'content'))
+        finally:
+            State.tenant_cache[1].maximum_filesize = maximum_filesize
+
+        self.assertEqual(requests[0]['upload_error'].error_code, 39)
+        self.assertIsNone(requests[0]['content'])
+        self.assertEqual(len(Uploads), 0)
+        self.assertEqual(UploadsMonitor.get_stats()['active'], 0)
+
+    def test_invalid_body(self):
+        requests, response = self.post(b'--%s\r\ninvalid\r\n\r\ndata\r\n--%s--\r\n' % (BOUNDARY, BOUNDARY))
+
+        self.assertEqual(requests, [])
+        self.assertTrue(response.startswith(b'HTTP/1.1 400 Bad Request'))
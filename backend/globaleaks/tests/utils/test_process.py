@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import os
+import signal
+
+from globaleaks import security
+from globaleaks.handlers.authentication import random_login_delay
+from globaleaks.state import State
+from globaleaks.tests import helpers
+from globaleaks.utils.process import ProcessPool
+from twisted.internet.defer import inlineCallbacks, TimeoutError
+
+
+def failing_function():
+    raise ValueError
+
+
+def dying_function():
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+class TestProcessPool(helpers.TestGL):
+    @inlineCallbacks
+    def test_run(self):
+        pool = ProcessPool()
+        pool.start(1, 60)
+
+        try:
+            result = yield pool.run(security.hash_password, u'password', u'salt')
+            self.assertEqual(result, security.hash_password(u'password', u'salt'))
+
+            yield self.assertFailure(pool.run(failing_function), ValueError)
+
+            self.assertEqual(pool.get_stats()['pending'], 0)
+            self.assertEqual(pool.get_stats()['completed'], 2)
+        finally:
+            pool.stop()
+
+    @inlineCallbacks
+    def test_run_dying_process(self):
+        pool = ProcessPool()
+        pool.start(1, 1)
+
+        try:
+            yield self.assertFailure(pool.run(dying_function), TimeoutError)
+
+            self.assertEqual(pool.get_stats()['pending'], 0)
+
+            # the pool replaces the dead process
+            result = yield pool.run(security.hash_password, u'password', u'salt')
+            self.assertEqual(result, security.hash_password(u'password', u'salt'))
+        finally:
+            pool.stop()
+
+    @inlineCallbacks
+    def test_run_without_processes(self):
+        pool = ProcessPool()
+
+        result = yield pool.run(security.hash_password, u'password', u'salt')
+        self.assertEqual(result, security.hash_password(u'password', u'salt'))
+
+    def test_backlog_feeds_login_delay(self):
+        self.assertEqual(random_login_delay(), 0)
+
+        State.cpu_pool.pending = State.cpu_pool.processes + 5
+
+        try:
+            self.assertTrue(5 <= random_login_delay() <= 42)
+        finally:
+            State.cpu_pool.pending = 0
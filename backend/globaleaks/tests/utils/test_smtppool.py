@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import os
+from StringIO import StringIO
+
+from twisted.cred.checkers import InMemoryUsernamePasswordDatabaseDontUse
+from twisted.cred.portal import IRealm, Portal
+from twisted.internet import defer, reactor, ssl, task
+from twisted.mail import smtp
+from twisted.mail.imap4 import LOGINCredentials, PLAINCredentials
+from twisted.trial import unittest
+from zope.interface import implementer
+
+from globaleaks.settings import Settings
+from globaleaks.tests import helpers
+from globaleaks.utils.smtppool import SMTPPoolClass
+
+
+@implementer(smtp.IMessage)
+class FakeMessage(object):
+    def __init__(self, server):
+        self.server = server
+        self.lines = []
+
+    def lineReceived(self, line):
+        self.lines.append(line)
+
+    def eomReceived(self):
+        self.server.messages.append('\n'.join(self.lines))
+        return defer.succeed(None)
+
+    def connectionLost(self):
+        pass
+
+
+@implementer(smtp.IMessageDelivery)
+class FakeMessageDelivery(object):
+    def __init__(self, server):
+        self.server = server
+
+    def receivedHeader(self, helo, origin, recipients):
+        return 'Received: by fake smtp server'
+
+    def validateFrom(self, helo, origin):
+        return origin
+
+    def validateTo(self, user):
+        return lambda: FakeMessage(self.server)
+
+
+@implementer(IRealm)
+class FakeRealm(object):
+    def __init__(self, server):
+        self.server = server
+
+    def requestAvatar(self, avatarId, mind, *interfaces):
+        return smtp.IMessageDelivery, FakeMessageDelivery(self.server), lambda: None
+
+
+class FakeSMTPServerFactory(smtp.SMTPFactory):
+    """
+    Local ESMTP server supporting STARTTLS and AUTH used to test the pool
+    """
+    protocol = smtp.ESMTP
+
+    def __init__(self):
+        smtp.SMTPFactory.__init__(self)
+
+        https_data_dir = os.path.join(helpers.DATA_DIR, 'https', 'valid')
+        self.ctx = ssl.DefaultOpenSSLContextFactory(os.path.join(https_data_dir, 'priv_key.pem'),
+                                                    os.path.join(https_data_dir, 'cert.pem'))
+        self.portal = Portal(FakeRealm(self), [InMemoryUsernamePasswordDatabaseDontUse(user='password', user2='password')])
+        self.connections = []
+        self.messages = []
+
+    def buildProtocol(self, addr):
+        p = smtp.SMTPFactory.buildProtocol(self, addr)
+        p.ctx = self.ctx
+        p.challengers = {'LOGIN': LOGINCredentials, 'PLAIN': PLAINCredentials}
+        self.connections.append(p)
+        return p
+
+
+class TestSMTPPool(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeSMTPServerFactory()
+        self.port = reactor.listenTCP(0, self.server, interface='127.0.0.1')
+
+        self.pool = SMTPPoolClass()
+
+        self.smtp_pool_size = Settings.smtp_pool_size
+        Settings.smtp_pool_size = 2
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        Settings.smtp_pool_size = self.smtp_pool_size
+
+        self.pool.close()
+
+        yield self.port.stopListening()
+
+        while self.pool.sessions or any(p.transport.connected for p in self.server.connections):
+            yield task.deferLater(reactor, 0.01, lambda: None)
+
+    def get_config(self, **kwargs):
+        config = {
+            'host': u'127.0.0.1',
+            'port': self.port.getHost().port,
+            'security': u'TLS',
+            'username': u'user',
+            'password': u'password',
+            'anonymize': False
+        }
+
+        config.update(kwargs)
+
+        return config
+
+    def send(self, config, n):
+        return [self.pool.send(config,
+                               'sender@example.net',
+                               'receiver%d@example.net' % i,
+                               StringIO('Subject: test %d\n\nbody\n' % i)) for i in range(n)]
+
+    @defer.inlineCallbacks
+    def wait_idle_sessions(self, n):
+        # the sessions are parked once the server acknowledged the RSET following the last message
+        while len(self.pool.idle) < n:
+            yield task.deferLater(reactor, 0.01, lambda: None)
+
+    @defer.inlineCallbacks
+    def test_sessions_are_reused(self):
+        config = self.get_config()
+
+        results = yield defer.gatherResults(self.send(config, 10))
+
+        self.assertEqual(results, [True] * 10)
+        self.assertEqual(len(self.server.messages), 10)
+        self.assertEqual(len(self.server.connections), 2)
+
+        yield self.wait_idle_sessions(2)
+
+        stats = self.pool.get_stats()
+        self.assertEqual(stats['sessions'], 2)
+        self.assertEqual(stats['queue'], 0)
+        self.assertEqual(stats['sent'], 10)
+        self.assertEqual(stats['failed'], 0)
+
+        # the idle sessions are used for the following messages
+        yield defer.gatherResults(self.send(config, 3))
+
+        self.assertEqual(len(self.server.messages), 13)
+        self.assertEqual(len(self.server.connections), 2)
+
+    @defer.inlineCallbacks
+    def test_authentication_failure_puts_destination_in_backoff(self):
+        config = self.get_config(password=u'wrong')
+
+        for d in self.send(config, 3):
+            yield self.assertFailure(d, smtp.AUTHDeclinedError)
+
+        self.assertEqual(self.server.messages, [])
+        self.assertTrue(self.pool.get_backoff(config) > 0)
+        self.assertEqual(self.pool.get_stats()['failed'], 3)
+
+        connections = len(self.server.connections)
+
+        # no connection is attempted while in backoff
+        yield self.assertFailure(self.send(config, 1)[0], smtp.SMTPConnectError)
+        self.assertEqual(len(self.server.connections), connections)
+
+        # the backoff does not apply to the corrected credentials
+        config = self.get_config()
+        self.assertEqual(self.pool.get_backoff(config), 0)
+
+        yield defer.gatherResults(self.send(config, 1))
+        self.assertEqual(len(self.server.messages), 1)
+
+    @defer.inlineCallbacks
+    def test_configuration_change_closes_idle_sessions(self):
+        yield defer.gatherResults(self.send(self.get_config(), 2))
+
+        yield self.wait_idle_sessions(2)
+
+        yield defer.gatherResults(self.send(self.get_config(username=u'user2'), 1))
+
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(len(self.server.connections), 3)
+
+        # the sessions of the previous configuration are closed
+        while len(self.pool.sessions) > 1:
+            yield task.deferLater(reactor, 0.01, lambda: None)
@@ -53,3 +53,64 @@ class TestTempDict(helpers.TestGL):
                 self.assertEqual(len(xxx), size_limit)
                 self.assertEqual(xxx.get(x - size_limit + 1).id, x - size_limit + 1)
                 self.assertEqual(xxx.get(x - size_limit), None)
+
+    def test_get_refreshes_expiration(self):
+        xxx = TempDict(timeout=10)
+
+        xxx.set('a', TestObject(1))
+        xxx.set('b', TestObject(2))
+
+        self.test_reactor.advance(5)
+        self.assertEqual(xxx.get('a').id, 1)
+        self.assertEqual(xxx.get_expiration('a'), 15)
+        self.assertEqual(xxx.get_expiration('b'), 10)
+
+        self.test_reactor.advance(5)
+        self.assertEqual(list(xxx.keys()), ['a'])
+
+        self.test_reactor.advance(5)
+        self.assertEqual(len(xxx), 0)
+        self.assertEqual(self.test_reactor.getDelayedCalls(), [])
+
+    def test_delete(self):
+        expired = []
+
+        xxx = TempDict(timeout=10)
+        xxx.expireCallback = expired.append
+
+        xxx.set('a', TestObject(1))
+        xxx.delete('a')
+
+        self.assertRaises(Exception, xxx.delete, 'a')
+
+        self.test_reactor.advance(10)
+        self.assertEqual(expired, [])
+
+    def test_live_entries_benchmark(self):
+        entries = 100000
+        expired = []
+
+        xxx = TempDict(timeout=60)
+        xxx.expireCallback = expired.append
+
+        for x in range(entries):
+            xxx.set(x, TestObject(x))
+
+        # a single call is scheduled on the reactor regardless of the number of entries
+        self.assertEqual(len(self.test_reactor.getDelayedCalls()), 1)
+
+        self.test_reactor.advance(30)
+
+        for x in range(0, entries, 2):
+            xxx.get(x)
+
+        self.assertEqual(len(self.test_reactor.getDelayedCalls()), 1)
+
+        self.test_reactor.advance(30)
+        self.assertEqual(len(xxx), entries // 2)
+        self.assertEqual(len(expired), entries // 2)
+
+        self.test_reactor.advance(30)
+        self.assertEqual(len(xxx), 0)
+        self.assertEqual(len(expired), entries)
+        self.assertEqual(self.test_reactor.getDelayedCalls(), [])
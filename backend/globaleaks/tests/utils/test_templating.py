@@ -1,14 +1,33 @@
 # -*- coding: utf-8 -*-
+import copy
+import timeit
+
+from twisted.internet import defer
 from twisted.internet.defer import inlineCallbacks
 from globaleaks.handlers import admin, rtip
 from globaleaks.jobs.delivery_sched import DeliverySchedule
+from globaleaks.rest.apicache import ApiCache
 from globaleaks.tests import helpers
-from globaleaks.utils.templating import Templating, supported_template_types
+from globaleaks.utils.utility import log
+from globaleaks.utils.templating import Templating, TemplateCache, expand_keywords, \
+    supported_template_types
+
+blank_templates = [
+    u'{Blank}',
+    u'\n{Blank}\n',
+    u'a\n{Blank}\n{Blank}\nb',
+    u'a\n{Comments}\nb',
+    u'a\n{Comments}\n{Messages}\nb',
+    u'a\n{Comments}\n\n{Messages}\n{Blank}\n{TipID}',
+    u'{Comments}{Messages}',
+    u'{Foo} {TipID',
+    u''
+]
 
 
 class notifTemplateTest(helpers.TestGLWithPopulatedDB):
     @inlineCallbacks
-    def test_keywords_conversion(self):
+    def get_template_data(self):
         yield self.perform_full_submission_actions()
         yield DeliverySchedule().run()
 
@@ -35,7 +54,103 @@ class notifTemplateTest(helpers.TestGLWithPopulatedDB):
         files = yield rtip.receiver_get_rfile_list(data['tip']['id'])
         data['file'] = files[0]
 
+        defer.returnValue(data)
+
+    def assertParity(self, template, data):
+        keyword_converter = supported_template_types[data['type']](data)
+
+        self.assertEqual(Templating().format_template(template, data),
+                         expand_keywords(template, keyword_converter))
+
+    @inlineCallbacks
+    def test_keywords_conversion(self):
+        data = yield self.get_template_data()
+
         for key in ['tip', 'comment', 'message', 'file']:
             data['type'] = key
             template = ''.join(supported_template_types[key].keyword_list)
             Templating().format_template(template, data)
+
+    @inlineCallbacks
+    def test_parity(self):
+        data = yield self.get_template_data()
+
+        for key in ['tip', 'comment', 'message', 'file']:
+            data['type'] = key
+
+            self.assertParity(''.join(supported_template_types[key].keyword_list), data)
+            self.assertParity(data['notification'][key + '_mail_title'], data)
+            self.assertParity(data['notification'][key + '_mail_template'], data)
+
+            for template in blank_templates:
+                self.assertParity(template, data)
+
+        data['type'] = 'export_template'
+        self.assertParity(data['notification']['export_template'], data)
+
+    @inlineCallbacks
+    def test_parity_blank(self):
+        data = yield self.get_template_data()
+        data['type'] = 'tip'
+
+        # the empty comments and messages are rendered as {Blank}
+        for comments, messages in [([], []), (data['comments'], []), ([], data['messages'])]:
+            data['comments'] = comments
+            data['messages'] = messages
+
+            for template in blank_templates:
+                self.assertParity(template, data)
+
+    @inlineCallbacks
+    def test_parity_nested_keywords(self):
+        data = yield self.get_template_data()
+        data['type'] = 'tip'
+
+        # keywords contained in the values are expanded by the following passes
+        for value in [u'{TipID}', u'{RecipientName} {ContextName}', u'{NodeName}', u'{Tip', u'\n{Blank}\n']:
+            nested = copy.deepcopy(data)
+            nested['node']['name'] = value
+            nested['user']['name'] = u'{NodeName}'
+            nested['tip']['label'] = u'ID}'
+
+            for template in [u'{NodeName}', u'{RecipientName}', u'{NodeName}{TipLabel}',
+                             u'{TipLabel} {NodeName} {TipID}', u'a\n{NodeName}\nb'] + blank_templates:
+                self.assertParity(template, nested)
+
+    @inlineCallbacks
+    def test_cache(self):
+        data = yield self.get_template_data()
+        data['type'] = 'tip'
+        template = data['notification']['tip_mail_template']
+
+        for _ in range(3):
+            Templating().format_template(template, data)
+
+        self.assertEqual(TemplateCache.get_stats()['entries'], 1)
+        self.assertEqual(TemplateCache.get_stats()['hits'], 2)
+
+        # the compiled templates are dropped when the notification settings are updated
+        ApiCache.invalidate({'notification'})
+        Templating().format_template(template, data)
+        self.assertEqual(TemplateCache.get_stats()['misses'], 2)
+
+    @inlineCallbacks
+    def test_benchmark(self):
+        data = yield self.get_template_data()
+        data['type'] = 'tip'
+        template = data['notification']['tip_mail_template'] * 10
+
+        self.assertEqual(Templating().format_template(template, data),
+                         expand_keywords(template, supported_template_types['tip'](data)))
+
+        def interpreted():
+            expand_keywords(template, supported_template_types['tip'](data))
+
+        def compiled():
+            Templating().format_template(template, data)
+
+        # the timings are only reported as they depend on the load of the host
+        interpreted_time = min(timeit.repeat(interpreted, number=200, repeat=3))
+        compiled_time = min(timeit.repeat(compiled, number=200, repeat=3))
+
+        log.debug("Templating benchmark: interpreted %fs, compiled %fs", interpreted_time, compiled_time)
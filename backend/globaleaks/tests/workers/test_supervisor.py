@@ -11,6 +11,7 @@ from globaleaks.tests import helpers
 from globaleaks.tests.utils import test_tls
 from globaleaks.utils.sock import reserve_port_for_ip
 from globaleaks.workers import supervisor
+from globaleaks.workers.process import HTTPSProcProtocol, STATS_PREFIX
 from globaleaks.workers.worker_https import HTTPSProcess
 from twisted.internet import threads, reactor
 from twisted.internet.defer import inlineCallbacks
@@ -63,6 +64,19 @@ class TestProcessSupervisor(helpers.TestGL):
         self.assertFalse(p_s.shutting_down)
         self.assertFalse(p_s.is_running())
 
+    def test_worker_stats(self):
+        p_s = supervisor.ProcessSupervisor([], '127.0.0.1', 43435)
+        pp = HTTPSProcProtocol(p_s, p_s.tls_cfg)
+
+        stats = json.dumps({'requests': 10, 'reused': 9})
+
+        # the reports of the worker may be received in multiple reads
+        pp.childDataReceived(0, '[gl-https-proxy:1] log line\n' + STATS_PREFIX + stats[:5])
+        self.assertEqual(pp.stats, {})
+
+        pp.childDataReceived(0, stats[5:] + '\n')
+        self.assertEqual(pp.stats, {'requests': 10, 'reused': 9})
+
 
 @transact
 def wrap_db_tx(store, f, *args, **kwargs):
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+#
+# assets
+# ******
+#
+# Manifest of the files of the client application.
+#
+# Each asset is identified by the hash of its content: the references of
+# index.html to the other assets are versioned with it so that they can be
+# cached by the browsers indefinitely, while the other responses are
+# revalidated with their ETag. The compressible assets are served in their
+# gzip variant, read from the .gz file produced at build time when available
+# or compressed once and kept in memory.
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from globaleaks.rest.apicache import GZIP_MIN_SIZE, etag_matches, gzip_compress
+from globaleaks.utils.utility import log
+
+compressible_types = {
+    'application/javascript',
+    'application/json',
+    'application/x-javascript',
+    'image/svg+xml'
+}
+
+asset_reference_regexp = re.compile(r'(<(?:script|link)\b[^>]*?\b(?:src|href)=")([^":?#]+)(")')
+
+
+def is_compressible(path):
+    mime_type, _ = mimetypes.guess_type(path)
+    return mime_type is not None and (mime_type.startswith('text/') or mime_type in compressible_types)
+
+
+class Asset(object):
+    def __init__(self, path, data, stat):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.hash = hashlib.sha256(data).hexdigest()
+        self.version = self.hash[:16]
+        self.etag = b'"%s"' % self.hash
+
+        # the content of the asset when it is not served from its file
+        self.body = None
+
+        # the assets whose versions are referenced by the content
+        self.dependencies = []
+
+        self.gzip_path = None
+        self.gzip_body = None
+
+        if len(data) < GZIP_MIN_SIZE or not is_compressible(path):
+            return
+
+        gzip_path = path + '.gz'
+        if os.path.isfile(gzip_path) and os.stat(gzip_path).st_mtime >= self.mtime:
+            self.gzip_path = gzip_path
+        else:
+            gzip_body = gzip_compress(data, 9)
+            if len(gzip_body) < len(data):
+                self.gzip_body = gzip_body
+
+    def is_stale(self, stat):
+        if stat.st_size != self.size or stat.st_mtime != self.mtime:
+            return True
+
+        for asset in self.dependencies:
+            try:
+                if asset.is_stale(os.stat(asset.path)):
+                    return True
+            except OSError:
+                return True
+
+        return False
+
+    def is_fresh(self, request):
+        return etag_matches(request, self.etag)
+
+
+class AssetsManifest(object):
+    """
+    Manifest of the assets of the client keyed by their absolute path
+
+    The entries are created at startup by load() or at their first request
+    and are refreshed when their file is modified.
+    """
+    lock = threading.Lock()
+    entries = {}
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def get(cls, path):
+        """
+        @return: the `Asset` of the file
+        """
+        stat = os.stat(path)
+
+        with cls.lock:
+            asset = cls.entries.get(path)
+            if asset is not None and not asset.is_stale(stat):
+                cls.hits += 1
+                return asset
+
+            cls.misses += 1
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        asset = Asset(path, data, stat)
+
+        if os.path.basename(path) == 'index.html':
+            cls.version_references(asset, data)
+
+        with cls.lock:
+            cls.entries[path] = asset
+
+        return asset
+
+    @classmethod
+    def version_references(cls, asset, data):
+        """
+        Append the version to the references of the page to the other assets
+        """
+        root = os.path.dirname(asset.path)
+
+        def version(match):
+            path = os.path.abspath(os.path.join(root, match.group(2)))
+            if not path.startswith(root + '/') or not os.path.isfile(path):
+                return match.group(0)
+
+            dependency = cls.get(path)
+            asset.dependencies.append(dependency)
+
+            return '%s%s?v=%s%s' % (match.group(1), match.group(2), dependency.version, match.group(3))
+
+        body = asset_reference_regexp.sub(version, data)
+
+        asset.body = body
+        asset.gzip_path = None
+        asset.gzip_body = None
+        if len(body) >= GZIP_MIN_SIZE:
+            asset.gzip_body = gzip_compress(body, 9)
+
+        # the ETag of the page changes with the versions of the assets
+        asset.etag = b'"%s"' % hashlib.sha256(body).hexdigest()
+
+    @classmethod
+    def load(cls, root):
+        """
+        Create the manifest of all the assets of a directory
+        """
+        count = 0
+
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                if filename.endswith('.gz'):
+                    continue
+
+                try:
+                    cls.get(os.path.join(directory, filename))
+                    count += 1
+                except (IOError, OSError) as excep:
+                    log.err("Unable to load the asset %s: %s", filename, excep)
+
+        log.debug("Loaded the manifest of %d assets of %s", count, root)
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.entries.clear()
+            cls.hits = cls.misses = 0
+
+    @classmethod
+    def get_stats(cls):
+        return {
+            'entries': len(cls.entries),
+            'size': sum(len(a.body or b'') + len(a.gzip_body or b'') for a in cls.entries.values()),
+            'hits': cls.hits,
+            'misses': cls.misses
+        }
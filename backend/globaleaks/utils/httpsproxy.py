@@ -1,15 +1,39 @@
 import io
+import time
 import urlparse
 import zlib
 
 from twisted.internet import reactor, protocol, defer
 from twisted.internet.protocol import connectionDone
 from twisted.web import http
-from twisted.web.client import Agent
-from twisted.web.iweb import IBodyProducer
+from twisted.web.client import Agent, HTTPConnectionPool
+from twisted.web.iweb import IBodyProducer, UNKNOWN_LENGTH
 from twisted.web.server import NOT_DONE_YET
 from zope.interface import implements
 
+compressible_content_types = (
+    b'text/',
+    b'application/javascript',
+    b'application/json',
+    b'application/x-javascript',
+    b'image/svg+xml'
+)
+
+# headers related to the connection of the client that are not forwarded
+hop_by_hop_headers = (
+    b'connection',
+    b'content-length',
+    b'expect',
+    b'keep-alive',
+    b'proxy-connection',
+    b'te',
+    b'transfer-encoding',
+    b'upgrade'
+)
+
+# number of the persistent connections kept by each worker to the backend
+PROXY_POOL_SIZE = 8
+
 
 class BodyStreamer(protocol.Protocol):
     def __init__(self, streamfunction, finished):
@@ -42,102 +66,207 @@ class BodyGzipStreamer(BodyStreamer):
 
 
 class BodyProducer(object):
+    """
+    Producer streaming the body of a request to the backend while it is
+    received from the client.
+
+    The data received before the connection to the backend is established is
+    buffered; the connection of the client is paused when the buffer is full
+    and while the connection to the backend is not able to accept more data.
+    """
     implements(IBodyProducer)
 
-    BUF_MAX_SIZE = 64 * 1024 # TODO Use the hardcoded value for buf max size
-    length = 0
-    bytes_written = 0
-
-    deferred = None
-    inp_buf = None
-    rf_buf_fn = None
-    consumer = None
+    BUF_MAX_SIZE = 64 * 1024
 
-    def __init__(self, inp_buf, rf_buf_fn, length):
-        self.inp_buf = inp_buf
-        self.rf_buf_fn = rf_buf_fn
+    def __init__(self, transport, length):
+        self.transport = transport
         self.length = length
         self.deferred = defer.Deferred()
+        self.consumer = None
+        self.buf = []
+        self.buffered = 0
+        self.paused = False
+        self.finished = False
+
+    def write(self, data):
+        if self.deferred is None:
+            return
+
+        if self.consumer is not None:
+            self.consumer.write(data)
+            return
+
+        self.buf.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.BUF_MAX_SIZE:
+            self.transport.pauseProducing()
+
+    def finish(self):
+        self.finished = True
+
+        if self.consumer is not None and self.deferred is not None:
+            self.deferred.callback(None)
+
+    def fail(self, reason):
+        if self.deferred is not None:
+            d, self.deferred = self.deferred, None
+            d.errback(reason)
 
     def startProducing(self, consumer):
         self.consumer = consumer
-        return self.resumeProducing()
 
-    def resumeProducing(self):
-        chunk = self.inp_buf.read()
-        n = len(chunk)
-        if n != 0:
-            self.consumer.write(chunk)
-            self.bytes_written += n
-            if self.bytes_written > self.BUF_MAX_SIZE:
-                self.inp_buf = self.rf_buf_fn()
-                self.bytes_written = 0
-        else:
+        if self.buf:
+            consumer.write(b''.join(self.buf))
+            self.buf = []
+            self.buffered = 0
+
+        if not self.paused:
+            self.transport.resumeProducing()
+
+        if self.finished:
             self.deferred.callback(None)
 
         return self.deferred
 
+    def pauseProducing(self):
+        self.paused = True
+        self.transport.pauseProducing()
+
+    def resumeProducing(self):
+        self.paused = False
+        self.transport.resumeProducing()
+
     def stopProducing(self):
+        # the body is discarded when the connection to the backend is lost
         self.deferred = None
-        self.inp_buf.close()
-        self.rf_buf_fn = None
         self.consumer = None
+        self.buf = []
+        self.transport.resumeProducing()
 
-    def pauseProducing(self):
-        pass
+
+class ProxyConnectionPool(HTTPConnectionPool):
+    """
+    Pool of the persistent connections to the backend accounting their reuse
+    """
+    def __init__(self, reactor, size):
+        HTTPConnectionPool.__init__(self, reactor, persistent=True)
+        self.maxPersistentPerHost = size
+        self.requests = 0
+        self.connections = 0
+
+    def getConnection(self, key, endpoint):
+        self.requests += 1
+        return HTTPConnectionPool.getConnection(self, key, endpoint)
+
+    def _newConnection(self, key, endpoint):
+        self.connections += 1
+        return HTTPConnectionPool._newConnection(self, key, endpoint)
 
 
 class HTTPStreamProxyRequest(http.Request):
     gzip = False
+    body_producer = None
+    proxy_d = None
 
-    def __init__(self, *args, **kwargs):
-        http.Request.__init__(self, *args, **kwargs)
+    def gotLength(self, length):
+        # the body is forwarded while it is received instead of being stored
+        self.content = io.BytesIO()
 
-    def reset_buffer(self):
-        self.content.seek(0, 0)
-        self.content.truncate(0)
-        return self.content
+        if length or (length is None and self.requestHeaders.hasHeader(b'transfer-encoding')):
+            self.body_producer = BodyProducer(self.channel.transport, UNKNOWN_LENGTH if length is None else length)
+            self.proxyRequest()
 
-    def gotLength(self, length):
-        http.Request.gotLength(self, length)
-        if isinstance(self.content, file):
-            self.content.close()
-            self.content = io.BytesIO()
-            self.reset_buffer()
+    def handleContentChunk(self, data):
+        if self.body_producer is not None:
+            self.body_producer.write(data)
+        else:
+            http.Request.handleContentChunk(self, data)
 
-    def process(self):
+    def requestReceived(self, command, path, version):
+        # the arguments are processed like in twisted.web.http.Request.requestReceived
+        # except for the body that is not parsed by the proxy
+        self.args = {}
+
+        self.method, self.uri = command, path
+        self.clientproto = version
+        x = self.uri.split(b'?', 1)
+
+        if len(x) == 1:
+            self.path = self.uri
+        else:
+            self.path, argstring = x
+            self.args = http.parse_qs(argstring, 1)
+
+        self.client = self.channel.transport.getPeer()
+        self.host = self.channel.transport.getHost()
+
+        self.process()
+
+    def proxyRequest(self):
         proxy_url = bytes(urlparse.urljoin(self.channel.proxy_url, self.uri))
 
-        hdrs = self.requestHeaders
+        hdrs = self.requestHeaders.copy()
         hdrs.setRawHeaders('GL-Forwarded-For', [self.getClientIP()])
 
+        # the connection to the backend is managed by the agent
+        for h in hop_by_hop_headers:
+            hdrs.removeHeader(h)
+
+        self.proxy_d = self.channel.factory.agent.request(method=self.method,
+                                                          uri=proxy_url,
+                                                          headers=hdrs,
+                                                          bodyProducer=self.body_producer)
+
+        self.proxy_d.addErrback(self.proxyBodyError)
+
+    def proxyBodyError(self, fail):
+        # the failures caused by the disconnection of the client are handled by connectionLost
+        if self.body_producer is None or self.body_producer.finished or self._disconnected:
+            return fail
+
+        # the request failed while its body is still received, possibly with
+        # the client paused by the producer; no response could be sent before
+        # the end of the body so the connection of the client is aborted
+        self.channel.factory.errors += 1
+        self.body_producer.stopProducing()
+        self.channel.transport.abortConnection()
+
+    def process(self):
+        self.start_time = time.time()
+
         accept_encoding = self.getHeader('Accept-Encoding')
         if accept_encoding is not None and 'gzip' in accept_encoding:
             self.gzip = True
 
-        prod = None
-        content_length = self.getHeader('Content-Length')
-        if content_length is not None:
-            hdrs.removeHeader('Content-Length')
-            prod = BodyProducer(self.content, self.reset_buffer, int(content_length))
-            self.registerProducer(prod, streaming=True)
-
-        proxy_d = self.channel.http_agent.request(method=self.method,
-                                                  uri=proxy_url,
-                                                  headers=hdrs,
-                                                  bodyProducer=prod)
-        if prod is not None:
-            proxy_d.addBoth(self.proxyUnregister)
+        if self.proxy_d is None:
+            self.proxyRequest()
+        else:
+            self.body_producer.finish()
 
-        proxy_d.addCallback(self.proxySuccess)
-        proxy_d.addErrback(self.proxyError)
+        self.proxy_d.addCallback(self.proxySuccess)
+        self.proxy_d.addErrback(self.proxyError)
 
         return NOT_DONE_YET
 
     def proxySuccess(self, response):
+        self.channel.factory.account_request(time.time() - self.start_time)
+
         self.responseHeaders = response.headers
+
+        # Responses already compressed by the backend are forwarded as they are
+        if response.headers.hasHeader(b'content-encoding'):
+            self.gzip = False
+
+        # Partial responses and binary data, like file downloads and images, are
+        # forwarded as they are given that a compression would break the byte
+        # ranges and waste CPU
+        content_type = response.headers.getRawHeaders(b'content-type', [b''])[0]
+        if response.code == 206 or not content_type.startswith(compressible_content_types):
+            self.gzip = False
+
         if self.gzip:
             self.responseHeaders.setRawHeaders(b'content-encoding', [b'gzip'])
+            self.responseHeaders.removeHeader(b'content-length')
 
         self.responseHeaders.setRawHeaders('Strict-Transport-Security', ['max-age=31536000'])
 
@@ -153,19 +282,25 @@ class HTTPStreamProxyRequest(http.Request):
         d_forward.addBoth(self.forwardClose)
 
     def proxyError(self, fail):
+        self.channel.factory.errors += 1
+
         # Always apply the HSTS header. Compliant browsers using plain HTTP will ignore it.
         self.responseHeaders.setRawHeaders('Strict-Transport-Security', ['max-age=31536000'])
         self.setResponseCode(502)
         self.forwardClose()
 
-    def proxyUnregister(self, o):
-        self.unregisterProducer()
-        return o
-
     def forwardClose(self, *args):
         self.content.close()
         self.finish()
 
+    def connectionLost(self, reason):
+        http.Request.connectionLost(self, reason)
+
+        # the request to the backend is aborted when the body is not entirely received
+        if self.body_producer is not None and not self.body_producer.finished:
+            self.proxy_d.addErrback(lambda _: None)
+            self.body_producer.fail(reason)
+
 
 class HTTPStreamChannel(http.HTTPChannel):
     requestFactory = HTTPStreamProxyRequest
@@ -174,17 +309,43 @@ class HTTPStreamChannel(http.HTTPChannel):
         http.HTTPChannel.__init__(self, *args, **kwargs)
 
         self.proxy_url = proxy_url
-        self.http_agent = Agent(reactor, connectTimeout=30)
+
+    def allHeadersReceived(self):
+        # the request is forwarded as soon as its headers are received
+        req = self.requests[-1]
+        req.method, req.uri = self._command, self._path
+        req.client = self.transport.getPeer()
+
+        http.HTTPChannel.allHeadersReceived(self)
 
 
 class HTTPStreamFactory(http.HTTPFactory):
-    def __init__(self, proxy_url, *args, **kwargs):
+    """
+    Factory of the connections of the clients proxied by the worker
+
+    The requests are forwarded by an agent shared by all the connections
+    using a pool of persistent connections to the backend.
+    """
+    def __init__(self, proxy_url, pool_size=PROXY_POOL_SIZE, *args, **kwargs):
         http.HTTPFactory.__init__(self, *args, **kwargs)
         self.proxy_url = proxy_url
         self.active_connections = 0
 
+        self.pool = ProxyConnectionPool(reactor, pool_size)
+        self.agent = Agent(reactor, connectTimeout=30, pool=self.pool)
+
+        self.requests = 0
+        self.errors = 0
+        self.latency = 0
+
+    def account_request(self, latency):
+        self.requests += 1
+        self.latency += latency
+
     def buildProtocol(self, addr):
         proto = HTTPStreamChannel(self.proxy_url)
+        proto.factory = self
+
         _connectionMade = proto.connectionMade
         _connectionLost = proto.connectionLost
 
@@ -200,3 +361,18 @@ class HTTPStreamFactory(http.HTTPFactory):
         proto.connectionLost = connectionLost
 
         return proto
+
+    def stopFactory(self):
+        http.HTTPFactory.stopFactory(self)
+
+        return self.pool.closeCachedConnections()
+
+    def get_stats(self):
+        return {
+            'connections': self.active_connections,
+            'requests': self.requests,
+            'errors': self.errors,
+            'backend_connections': self.pool.connections,
+            'reused': self.pool.requests - self.pool.connections,
+            'latency': int(self.latency * 1000 / self.requests) if self.requests else 0
+        }
@@ -13,19 +13,16 @@ from email import utils, Charset  # pylint: disable=no-name-in-module
 from email.header import Header
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from txsocksx.client import SOCKS5ClientEndpoint
 
-from twisted.internet import reactor, defer
-from twisted.internet.endpoints import TCP4ClientEndpoint
-from twisted.mail.smtp import ESMTPSenderFactory, SMTPError
-from twisted.protocols import tls
+from twisted.internet import defer
+from twisted.mail.smtp import SMTPError
 from twisted.python.failure import Failure
 
 from globaleaks import __version__
 from globaleaks.state import State
 from globaleaks.security import encrypt_message, sha256
 from globaleaks.settings import Settings
-from globaleaks.utils.tls import TLSClientContextFactory
+from globaleaks.utils.smtppool import SMTPPool
 from globaleaks.utils.utility import log
 
 
@@ -54,10 +51,23 @@ def MIME_mail_build(src_name, src_mail, dest_name, dest_mail, title, mail_body):
     return StringIO.StringIO(multipart.as_string())
 
 
+def get_smtp_config():
+    return {
+        'host': State.tenant_cache[1].notif.server,
+        'port': State.tenant_cache[1].notif.port,
+        'security': State.tenant_cache[1].notif.security,
+        'username': State.tenant_cache[1].notif.username,
+        'password': State.tenant_cache[1].private.smtp_password,
+        'anonymize': State.tenant_cache[1].anonymize_outgoing_connections
+    }
+
+
 def sendmail(to_address, subject, body):
     """
     Send an email using SMTPS/SMTP+TLS and maybe torify the connection.
 
+    The mail is delivered through the sessions of the SMTP pool.
+
     @param to_address: the 'To:' field of the email
     @param subject: the mail subject
     @param body: the mail body
@@ -69,12 +79,7 @@ def sendmail(to_address, subject, body):
         if not to_address:
             return
 
-        authentication_username=State.tenant_cache[1].notif.username
-        authentication_password=State.tenant_cache[1].private.smtp_password
-        from_address=State.tenant_cache[1].notif.source_email
-        smtp_host=State.tenant_cache[1].notif.server
-        smtp_port=State.tenant_cache[1].notif.port
-        security=State.tenant_cache[1].notif.security
+        config = get_smtp_config()
 
         message = MIME_mail_build(State.tenant_cache[1].notif.source_name,
                                   State.tenant_cache[1].notif.source_email,
@@ -85,62 +90,24 @@ def sendmail(to_address, subject, body):
 
         log.debug('Sending email to %s using SMTP server [%s:%d] [%s]',
                   to_address,
-                  smtp_host,
-                  smtp_port,
-                  security)
-
-        context_factory = TLSClientContextFactory()
-
-        smtp_deferred = defer.Deferred()
-
-        factory = ESMTPSenderFactory(
-            authentication_username.encode('utf-8'),
-            authentication_password.encode('utf-8'),
-            from_address,
-            to_address,
-            message,
-            smtp_deferred,
-            contextFactory=context_factory,
-            requireAuthentication=True,
-            requireTransportSecurity=(security != 'SSL'),
-            retries=0,
-            timeout=Settings.mail_timeout)
-
-        if security == "SSL":
-            factory = tls.TLSMemoryBIOFactory(context_factory, True, factory)
-
-        if State.tenant_cache[1].anonymize_outgoing_connections:
-            socksProxy = TCP4ClientEndpoint(reactor, Settings.socks_host, Settings.socks_port, timeout=Settings.mail_timeout)
-            endpoint = SOCKS5ClientEndpoint(smtp_host.encode('utf-8'), smtp_port, socksProxy)
-        else:
-            endpoint = TCP4ClientEndpoint(reactor, smtp_host.encode('utf-8'), smtp_port, timeout=Settings.mail_timeout)
+                  config['host'],
+                  config['port'],
+                  config['security'])
 
         if Settings.testing:
             # during unit testing do not try to send the mail
             return defer.succeed(True)
 
-        conn_deferred = endpoint.connect(factory)
-
-        final = defer.DeferredList([conn_deferred, smtp_deferred], fireOnOneErrback=True, consumeErrors=True)
+        d = SMTPPool.send(config, State.tenant_cache[1].notif.source_email, to_address, message)
 
         def failure_cb(failure):
-            """
-            @param failure {Failure {twisted.internet.FirstError {Failure}}}
-            """
-            log.err("SMTP connection failed (Exception: %s)", failure.value.subFailure.value)
+            log.err("SMTP delivery failed (Exception: %s)", failure.value)
             log.debug(failure)
             return False
 
-        def success_cb(results):
-            """
-            @param results {list of (success, return_val) tuples}
-            """
-            return True
-
-        final.addCallback(success_cb)
-        final.addErrback(failure_cb)
+        d.addErrback(failure_cb)
 
-        return final
+        return d
 
     except Exception as excep:
         # avoids raising an exception inside email logic to avoid chained errors
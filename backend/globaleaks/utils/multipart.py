@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+#
+# multipart
+# *********
+#
+# Incremental multipart/form-data parsing of the request bodies.
+#
+# twisted.web buffers the whole body of a request and parses it with
+# cgi.parse_multipart only once it is completely received; the uploads are
+# instead parsed while they are received and the chunks of the flow.js
+# uploads are appended to the encrypted file of their upload in buffers of
+# UPLOAD_BUFFER_SIZE bytes, rejecting them as soon as they are known to exceed
+# the maximum file size configured for the node.
+import cgi
+import mimetypes
+import resource
+from io import BytesIO
+
+from twisted.web import http, server
+
+from globaleaks.rest import errors
+from globaleaks.security import SecureTemporaryFile
+from globaleaks.settings import Settings
+from globaleaks.state import State
+from globaleaks.utils.tempdict import TempDict
+from globaleaks.utils.utility import log
+
+# size of the buffers used to encrypt the uploaded files to disk
+UPLOAD_BUFFER_SIZE = 64 * 1024
+
+# size allowed for the form fields and the part headers of an upload
+MULTIPART_FIELDS_MAX_SIZE = 64 * 1024
+
+# seconds of inactivity after which an upload not completed is discarded
+UPLOAD_TIMEOUT = 2 * 60 * 60
+
+
+class MultipartError(Exception):
+    pass
+
+
+class MultipartParser(object):
+    """
+    Incremental parser of a multipart/form-data body
+
+    Each part is delivered to the object returned by part_factory(headers),
+    that is required to implement write(data) and close().
+    """
+    def __init__(self, boundary, part_factory):
+        self.delimiter = b'--' + boundary
+        self.part_delimiter = b'\r\n' + self.delimiter
+        self.part_factory = part_factory
+        self.part = None
+        self.state = 'preamble'
+        self.buf = b''
+
+    def feed(self, data):
+        self.buf += data
+
+        while self.buf:
+            if self.state == 'preamble':
+                i = self.buf.find(self.delimiter)
+                if i < 0:
+                    self.buf = self.buf[-len(self.delimiter):]
+                    return
+
+                self.buf = self.buf[i + len(self.delimiter):]
+                self.state = 'boundary'
+
+            elif self.state == 'boundary':
+                if len(self.buf) < 2:
+                    return
+
+                if self.buf[:2] == b'--':
+                    self.buf = b''
+                    self.state = 'epilogue'
+                    return
+
+                i = self.buf.find(b'\r\n')
+                if i < 0:
+                    if len(self.buf) > MULTIPART_FIELDS_MAX_SIZE:
+                        raise MultipartError("Invalid boundary")
+
+                    return
+
+                self.buf = self.buf[i + 2:]
+                self.state = 'headers'
+
+            elif self.state == 'headers':
+                i = self.buf.find(b'\r\n\r\n')
+                if i < 0:
+                    if len(self.buf) > MULTIPART_FIELDS_MAX_SIZE:
+                        raise MultipartError("Part headers too long")
+
+                    return
+
+                headers = {}
+                for line in self.buf[:i].split(b'\r\n'):
+                    name, sep, value = line.partition(b':')
+                    if not sep:
+                        raise MultipartError("Invalid part header")
+
+                    headers[name.strip().lower()] = value.strip()
+
+                self.buf = self.buf[i + 4:]
+                self.part = self.part_factory(headers)
+                self.state = 'data'
+
+            elif self.state == 'data':
+                i = self.buf.find(self.part_delimiter)
+                if i < 0:
+                    # the tail of the buffer may contain the beginning of the delimiter
+                    n = len(self.buf) - len(self.part_delimiter) + 1
+                    if n > 0:
+                        self.part.write(self.buf[:n])
+                        self.buf = self.buf[n:]
+
+                    return
+
+                self.part.write(self.buf[:i])
+                self.part.close()
+                self.part = None
+                self.buf = self.buf[i + len(self.part_delimiter):]
+                self.state = 'boundary'
+
+            else:
+                self.buf = b''
+
+    def close(self):
+        if self.state != 'epilogue':
+            raise MultipartError("Truncated body")
+
+
+class FormField(object):
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.data = BytesIO()
+
+    def write(self, data):
+        if self.data.tell() + len(data) > MULTIPART_FIELDS_MAX_SIZE:
+            raise MultipartError("Field %s too long" % self.name)
+
+        self.data.write(data)
+
+    def close(self):
+        self.args.setdefault(self.name, []).append(self.data.getvalue())
+
+
+class DiscardedPart(object):
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+class FormFile(object):
+    """
+    A chunk of a flow.js upload appended to the file of its upload while it
+    is received; the data of a chunk not completely received is removed
+    """
+    def __init__(self, request, flow_identifier, upload):
+        self.request = request
+        self.flow_identifier = flow_identifier
+        self.upload = upload
+        self.offset = upload.size
+        self.completed = False
+        self.buf = []
+        self.buffered = 0
+
+        upload.receiving = True
+        UploadsMonitor.active += 1
+
+    def write(self, data):
+        if self.upload is None:
+            return
+
+        if self.upload.size + self.buffered + len(data) > self.request.maximum_filesize:
+            Uploads.pop(self.flow_identifier, None)
+            self.upload.file.close()
+            self.request.reject_upload(errors.FileTooBig(State.tenant_cache[1].maximum_filesize))
+            return
+
+        self.buf.append(data)
+        self.buffered += len(data)
+        UploadsMonitor.buffer(len(data))
+
+        if self.buffered >= UPLOAD_BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.buf:
+            self.upload.file.write(b''.join(self.buf))
+            self.upload.size += self.buffered
+            UploadsMonitor.buffer(-self.buffered)
+            self.buf = []
+            self.buffered = 0
+
+    def close(self):
+        if self.upload is not None:
+            self.flush()
+            self.upload.chunks += 1
+            self.upload.receiving = False
+            self.completed = True
+
+    def discard(self):
+        if self.upload is None:
+            return
+
+        UploadsMonitor.buffer(-self.buffered)
+        UploadsMonitor.active -= 1
+        self.buf = []
+        self.buffered = 0
+
+        if not self.completed:
+            self.upload.receiving = False
+
+            if not self.upload.file.close_called:
+                self.upload.file.truncate(self.offset)
+                self.upload.size = self.offset
+
+        self.upload = None
+
+
+class FileUpload(object):
+    """
+    A flow.js upload whose chunks are appended to an encrypted temporary file
+    """
+    def __init__(self):
+        self.file = SecureTemporaryFile(Settings.tmp_upload_path)
+        self.chunks = 0
+        self.size = 0
+        self.receiving = False
+
+
+class UploadsFactory(TempDict):
+    def expireCallback(self, upload):
+        upload.file.close()
+
+    def pop_upload(self, flow_identifier):
+        return self.pop(flow_identifier)
+
+
+Uploads = UploadsFactory(timeout=UPLOAD_TIMEOUT)
+
+
+class UploadsMonitor(object):
+    """
+    Counters of the memory used by the uploads being received
+    """
+    active = 0
+    buffered = 0
+    buffered_peak = 0
+    rejected = 0
+
+    @classmethod
+    def buffer(cls, n):
+        cls.buffered += n
+        cls.buffered_peak = max(cls.buffered_peak, cls.buffered)
+
+    @classmethod
+    def reset(cls):
+        cls.active = cls.buffered = cls.buffered_peak = cls.rejected = 0
+
+    @classmethod
+    def get_stats(cls):
+        return {
+            'active': cls.active,
+            'buffered': cls.buffered,
+            'buffered_peak': cls.buffered_peak,
+            'rejected': cls.rejected,
+            # ru_maxrss is expressed in kilobytes on Linux
+            'rss_peak': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        }
+
+
+class StreamingRequest(server.Request):
+    """
+    Request parsing multipart/form-data bodies while they are received
+
+    The fields are made available in request.args as usual while the chunks
+    of the flow.js uploads are appended to their FileUpload in Uploads and
+    made available as FormFile objects; when the chunk is unexpected or the
+    upload exceeds the maximum file size the body is discarded and the error
+    is made available in request.upload_error.
+    """
+    multipart = None
+    multipart_invalid = False
+    upload_error = None
+
+    def gotLength(self, length):
+        server.Request.gotLength(self, length)
+
+        self.multipart_args = {}
+        self.multipart_files = []
+
+        ctype = self.requestHeaders.getRawHeaders(b'content-type')
+        if ctype is None:
+            return
+
+        key, pdict = cgi.parse_header(ctype[0])
+        if key != b'multipart/form-data' or not pdict.get('boundary'):
+            return
+
+        self.maximum_filesize = State.tenant_cache[1].maximum_filesize * 1024 * 1024
+        self.multipart = MultipartParser(pdict['boundary'], self.part_received)
+
+        if length is not None and length > self.maximum_filesize + MULTIPART_FIELDS_MAX_SIZE:
+            self.reject_upload(errors.FileTooBig(State.tenant_cache[1].maximum_filesize))
+
+    def part_received(self, headers):
+        _, params = cgi.parse_header(headers.get(b'content-disposition', b''))
+
+        if 'filename' not in params:
+            if self.upload_error is not None:
+                return DiscardedPart()
+
+            return FormField(params.get('name', b''), self.multipart_args)
+
+        if self.upload_error is not None:
+            return DiscardedPart()
+
+        # flow.js sends the parameters of the upload before the file
+        try:
+            total_size = int(self.multipart_args.get('flowTotalSize', [0])[0])
+            chunk_number = int(self.multipart_args['flowChunkNumber'][0])
+            flow_identifier = self.multipart_args['flowIdentifier'][0]
+        except (KeyError, ValueError):
+            self.reject_upload(errors.InvalidInputFormat("Invalid file upload"))
+            return DiscardedPart()
+
+        if total_size > self.maximum_filesize:
+            self.reject_upload(errors.FileTooBig(State.tenant_cache[1].maximum_filesize))
+            return DiscardedPart()
+
+        upload = Uploads.get(flow_identifier)
+        if upload is None and chunk_number == 1:
+            upload = FileUpload()
+            Uploads.set(flow_identifier, upload)
+
+        if upload is not None and chunk_number <= upload.chunks:
+            # the chunk was already received and it is retransmitted
+            part = DiscardedPart()
+        elif upload is None or upload.receiving or chunk_number != upload.chunks + 1:
+            self.reject_upload(errors.InvalidInputFormat("Unexpected file upload chunk"))
+            return DiscardedPart()
+        else:
+            part = FormFile(self, flow_identifier, upload)
+            self.multipart_files.append(part)
+
+        self.multipart_args.setdefault(params.get('name', b''), []).append(part)
+
+        return part
+
+    def reject_upload(self, error):
+        if self.upload_error is not None:
+            return
+
+        log.err("File upload request rejected: %s", error.reason)
+        self.upload_error = error
+        UploadsMonitor.rejected += 1
+
+        self.multipart = None
+        self.discard_files()
+
+    def discard_files(self):
+        for f in self.multipart_files:
+            f.discard()
+
+    def reject_body(self, excep):
+        log.err("Invalid multipart body: %s", excep)
+        self.multipart = None
+        self.multipart_invalid = True
+        self.discard_files()
+        http._respondToBadRequestAndDisconnect(self.channel.transport)
+
+    def handleContentChunk(self, data):
+        if self.multipart is None:
+            if self.upload_error is None and not self.multipart_invalid:
+                server.Request.handleContentChunk(self, data)
+
+            return
+
+        try:
+            self.multipart.feed(data)
+        except MultipartError as excep:
+            self.reject_body(excep)
+
+    def requestReceived(self, command, path, version):
+        if self.multipart_invalid:
+            return
+
+        if self.multipart is None and self.upload_error is None:
+            return server.Request.requestReceived(self, command, path, version)
+
+        if self.multipart is not None:
+            try:
+                self.multipart.close()
+            except MultipartError as excep:
+                self.reject_body(excep)
+                return
+
+        # the arguments are processed like in twisted.web.http.Request.requestReceived
+        self.content.seek(0, 0)
+        self.args = {}
+
+        self.method, self.uri = command, path
+        self.clientproto = version
+        x = self.uri.split(b'?', 1)
+
+        if len(x) == 1:
+            self.path = self.uri
+        else:
+            self.path, argstring = x
+            self.args = http.parse_qs(argstring, 1)
+
+        self.client = self.channel.transport.getPeer()
+        self.host = self.channel.transport.getHost()
+
+        self.args.update(self.multipart_args)
+
+        self.notifyFinish().addBoth(lambda _: self.discard_files())
+
+        self.process()
+
+    def connectionLost(self, reason):
+        self.discard_files()
+        server.Request.connectionLost(self, reason)
+
+
+def get_file_upload(request):
+    """
+    @return: the description of the file of the flow.js upload completed by
+             the chunk received with the request, otherwise None
+    """
+    if request.upload_error is not None:
+        raise request.upload_error
+
+    if 'flowFilename' not in request.args:
+        return None
+
+    try:
+        chunk_number = int(request.args['flowChunkNumber'][0])
+        total_chunks = int(request.args['flowTotalChunks'][0])
+        flow_identifier = request.args['flowIdentifier'][0]
+        chunk = request.args['file'][0]
+    except (KeyError, ValueError):
+        raise errors.InvalidInputFormat("Invalid file upload")
+
+    if isinstance(chunk, DiscardedPart):
+        # the chunk was already received and it is retransmitted
+        return None
+
+    if not isinstance(chunk, FormFile) or chunk.upload is None:
+        raise errors.InvalidInputFormat("Invalid file upload")
+
+    if chunk_number != total_chunks:
+        return None
+
+    upload = Uploads.pop_upload(flow_identifier)
+
+    mime_type, encoding = mimetypes.guess_type(request.args['flowFilename'][0])
+    if mime_type is None:
+        mime_type = 'application/octet-stream'
+
+    return {
+        'name': request.args['flowFilename'][0],
+        'type': mime_type,
+        'size': upload.size,
+        'path': upload.file.filepath,
+        'body': upload.file,
+        'description': request.args.get('description', [''])[0]
+    }
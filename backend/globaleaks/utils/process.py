@@ -1,9 +1,11 @@
 # -*- coding: utf-8
 import ctypes
+import multiprocessing
 import os
+import signal
 import sys
 
-from twisted.internet import reactor
+from twisted.internet import defer, reactor
 
 
 def set_proc_title(title):
@@ -42,3 +44,109 @@ def SigQUIT(SIG, FRM):
             sys.exit(0)
     except Exception:
         pass
+
+
+def pool_initializer():
+    # the handlers installed by the reactor of the parent would prevent
+    # the termination of the pool
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    set_pdeathsig(signal.SIGKILL)
+
+
+def pool_call(f, args):
+    """
+    Run a function inside a pool process returning the outcome and the
+    result or the raised exception
+    """
+    try:
+        return True, f(*args)
+    except Exception as e:
+        return False, e
+
+
+class ProcessPool(object):
+    """
+    A bounded pool of processes used to run CPU intensive functions
+    (e.g. the key derivation functions) out of the reactor and of the
+    threads of the ORM so that they also escape the GIL.
+
+    Functions submitted while the pool is not started run in the current
+    process.
+
+    The functions not completed within the timeout fail with a TimeoutError;
+    this is the only way to notice the loss of a function whose process
+    died as the pool of Python 2.7 does not report it.
+    """
+    def __init__(self):
+        self.pool = None
+        self.processes = 0
+        self.timeout = 0
+        self.pending = 0
+        self.completed = 0
+
+    def start(self, processes, timeout):
+        self.processes = processes
+        self.timeout = timeout
+        self.pool = multiprocessing.Pool(processes, initializer=pool_initializer)
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def get_backlog(self):
+        """
+        @return: the number of the submitted functions waiting for a free process
+        """
+        return max(0, self.pending - self.processes)
+
+    def get_stats(self):
+        return {
+            'processes': self.processes,
+            'pending': self.pending,
+            'backlog': self.get_backlog(),
+            'completed': self.completed
+        }
+
+    def _done(self, result):
+        self.pending -= 1
+        self.completed += 1
+        return result
+
+    def _fire(self, d, timeout, ret):
+        if d.called:
+            # the function completed after its timeout
+            return
+
+        timeout.cancel()
+
+        success, result = ret
+        if success:
+            d.callback(result)
+        else:
+            d.errback(result)
+
+    def run(self, f, *args):
+        """
+        Run the function on the pool
+
+        @param f: a module level function
+        @return: a `Deferred` firing with the result of the function
+        """
+        self.pending += 1
+
+        if self.pool is None:
+            d = defer.maybeDeferred(f, *args)
+        else:
+            d = defer.Deferred()
+
+            timeout = reactor.callLater(self.timeout, d.errback,
+                                        defer.TimeoutError("%s took longer than %d seconds" % (f.__name__, self.timeout)))
+
+            def callback(ret):
+                reactor.callFromThread(self._fire, d, timeout, ret)
+
+            self.pool.apply_async(pool_call, (f, args), callback=callback)
+
+        return d.addBoth(self._done)
@@ -0,0 +1,325 @@
+# -*- coding: utf-8
+#
+# smtppool
+# ********
+#
+# Pool of authenticated SMTP sessions used to deliver the mails.
+#
+# Each session is kept open after its first message and reused for the
+# following ones (MAIL/RCPT/DATA/RSET) until it stays idle for
+# Settings.smtp_pool_idle_timeout seconds; up to Settings.smtp_pool_size
+# sessions are run concurrently. Failures in establishing a session put the
+# destination server in exponential backoff; the backoff applies only to the
+# failing configuration so that a correction of the credentials or of the
+# security settings is attempted immediately.
+
+import time
+from collections import deque
+
+from txsocksx.client import SOCKS5ClientEndpoint
+
+from twisted.internet import defer, protocol, reactor
+from twisted.internet.endpoints import TCP4ClientEndpoint
+from twisted.mail.smtp import DNSNAME, ESMTPSender, SMTPClient, SMTPConnectError, SMTPDeliveryError, SUCCESS
+from twisted.protocols import tls
+
+from globaleaks.settings import Settings
+from globaleaks.utils.tls import TLSClientContextFactory
+from globaleaks.utils.utility import log
+
+
+class SMTPSession(ESMTPSender):
+    """
+    ESMTP client delivering the messages queued in the pool
+    """
+    def __init__(self, *args, **kwargs):
+        ESMTPSender.__init__(self, *args, **kwargs)
+        self.message = None
+        self.idle = False
+        self.ready = False
+        self.error = None
+
+    def smtpState_from(self, code, resp):
+        if not self.ready:
+            self.ready = True
+            self.factory.pool.session_ready(self)
+
+        self.message = self.factory.pool.get_message(self)
+
+        if self.message is not None:
+            SMTPClient.smtpState_from(self, code, resp)
+        elif self.factory.pool.park(self):
+            self.idle = True
+            self.setTimeout(Settings.smtp_pool_idle_timeout)
+        else:
+            self._disconnectFromServer()
+
+    def resume(self):
+        self.idle = False
+        self.setTimeout(self.timeout)
+        self.smtpState_from(250, '')
+
+    def timeoutConnection(self):
+        if self.idle:
+            self.idle = False
+            self.factory.pool.unpark(self)
+            self._disconnectFromServer()
+        else:
+            ESMTPSender.timeoutConnection(self)
+
+    def getMailFrom(self):
+        return self.message['from'] if self.message is not None else None
+
+    def getMailTo(self):
+        return [self.message['to']]
+
+    def getMailData(self):
+        return self.message['data']
+
+    def sentMail(self, code, resp, numOk, addresses, session_log):
+        message, self.message = self.message, None
+
+        if code in SUCCESS:
+            self.factory.pool.message_sent(message)
+        else:
+            self.factory.pool.message_failed(message, SMTPDeliveryError(code, resp, session_log.str(), addresses))
+
+    def sendError(self, exc):
+        self.error = exc
+
+        # the session is closed without the retry logic of the SenderMixin
+        SMTPClient.sendError(self, exc)
+
+    def connectionLost(self, reason=protocol.connectionDone):
+        ESMTPSender.connectionLost(self, reason)
+
+        message, self.message = self.message, None
+        self.factory.pool.session_lost(self, message, self.error or reason.value)
+
+
+class SMTPSessionFactory(protocol.ClientFactory):
+    domain = DNSNAME
+    protocol = SMTPSession
+
+    def __init__(self, pool, config):
+        self.pool = pool
+        self.config = config
+        self.pending = True
+
+    def buildProtocol(self, addr):
+        p = self.protocol(self.config['username'].encode('utf-8'),
+                          self.config['password'].encode('utf-8'),
+                          TLSClientContextFactory(),
+                          self.domain)
+
+        p.heloFallback = False
+        p.requireAuthentication = True
+        p.requireTransportSecurity = self.config['security'] != 'SSL'
+        p.factory = self
+        p.timeout = Settings.mail_timeout
+        return p
+
+
+class SMTPPoolClass(object):
+    """
+    Pool of SMTP sessions
+
+    Messages are delivered to the server configured by the last call of send;
+    sessions of a previous configuration are closed once their current
+    message is completed.
+    """
+    def __init__(self):
+        self.config = None
+        self.queue = deque()
+        self.sessions = set()
+        self.idle = []
+        self.connecting = 0
+        self.backoff = {}
+        self.sent = 0
+        self.failed = 0
+        self.latency = 0
+
+    @staticmethod
+    def get_destination(config):
+        return (config['host'], config['port'], config['security'],
+                config['username'], config['password'], config['anonymize'])
+
+    def get_backoff(self, config=None):
+        """
+        @return: the number of seconds the destination is still in backoff
+        """
+        config = config or self.config
+        if config is None:
+            return 0
+
+        backoff = self.backoff.get(self.get_destination(config))
+        if backoff is None:
+            return 0
+
+        return max(0, backoff['until'] - time.time())
+
+    def send(self, config, from_address, to_address, data):
+        """
+        @param config: a dict with host, port, security, username, password and anonymize
+        @param data: a file-like object with the message
+        @return: a {Deferred} firing when the message is accepted by the server
+        """
+        if config != self.config:
+            self.config = config
+
+            for session in self.idle:
+                session.idle = False
+                session._disconnectFromServer()
+
+            del self.idle[:]
+
+        message = {
+            'from': from_address,
+            'to': to_address,
+            'data': data,
+            'deferred': defer.Deferred(),
+            'time': time.time()
+        }
+
+        self.queue.append(message)
+
+        self.dispatch()
+
+        return message['deferred']
+
+    def dispatch(self):
+        while self.queue and self.idle:
+            self.idle.pop().resume()
+
+        if not self.queue:
+            return
+
+        if self.get_backoff():
+            if not self.sessions and not self.connecting:
+                self.fail_queue(SMTPConnectError(-1, "SMTP server in backoff for %d seconds" % self.get_backoff()))
+
+            return
+
+        while len(self.sessions) + self.connecting < Settings.smtp_pool_size and \
+                self.connecting < len(self.queue):
+            self.connect()
+
+    def connect(self):
+        config = self.config
+        session_factory = factory = SMTPSessionFactory(self, config)
+
+        if config['security'] == 'SSL':
+            factory = tls.TLSMemoryBIOFactory(TLSClientContextFactory(), True, factory)
+
+        if config['anonymize']:
+            socksProxy = TCP4ClientEndpoint(reactor, Settings.socks_host, Settings.socks_port, timeout=Settings.mail_timeout)
+            endpoint = SOCKS5ClientEndpoint(config['host'].encode('utf-8'), config['port'], socksProxy)
+        else:
+            endpoint = TCP4ClientEndpoint(reactor, config['host'].encode('utf-8'), config['port'], timeout=Settings.mail_timeout)
+
+        self.connecting += 1
+
+        d = endpoint.connect(factory)
+        d.addErrback(self.connection_failed, session_factory)
+
+    def connection_failed(self, failure, factory):
+        if factory.pending:
+            factory.pending = False
+            self.connecting -= 1
+            self.destination_failed(factory.config, failure.value)
+
+        self.dispatch()
+
+    def destination_failed(self, config, excep):
+        destination = self.get_destination(config)
+
+        backoff = self.backoff.setdefault(destination, {'failures': 0, 'until': 0})
+        backoff['failures'] += 1
+        delay = min(Settings.smtp_backoff_max, Settings.smtp_backoff_base * 2 ** (backoff['failures'] - 1))
+        backoff['until'] = time.time() + delay
+
+        log.err("SMTP connection to %s:%d failed (Exception: %s); retrying in %d seconds",
+                destination[0], destination[1], excep, delay)
+
+        if not self.sessions and not self.connecting:
+            self.fail_queue(excep)
+
+    def fail_queue(self, excep):
+        # the errbacks could queue new messages that are not part of the failure
+        queue, self.queue = self.queue, deque()
+
+        for message in queue:
+            self.message_failed(message, excep)
+
+    def session_ready(self, session):
+        session.factory.pending = False
+        self.connecting -= 1
+        self.sessions.add(session)
+        self.backoff.pop(self.get_destination(session.factory.config), None)
+
+    def session_lost(self, session, message, excep):
+        if session.factory.pending:
+            session.factory.pending = False
+            self.connecting -= 1
+            self.destination_failed(session.factory.config, excep)
+
+        self.sessions.discard(session)
+        self.unpark(session)
+
+        if message is not None:
+            self.message_failed(message, excep)
+
+        self.dispatch()
+
+    def get_message(self, session):
+        if session.factory.config != self.config or not self.queue:
+            return None
+
+        return self.queue.popleft()
+
+    def park(self, session):
+        """
+        @return: True if the session is kept open waiting for new messages
+        """
+        if session.factory.config != self.config:
+            return False
+
+        self.idle.append(session)
+        return True
+
+    def unpark(self, session):
+        if session in self.idle:
+            self.idle.remove(session)
+
+    def message_sent(self, message):
+        self.sent += 1
+        self.latency += time.time() - message['time']
+        message['deferred'].callback(True)
+
+    def message_failed(self, message, excep):
+        self.failed += 1
+        message['deferred'].errback(excep)
+
+    def close(self):
+        self.fail_queue(SMTPConnectError(-1, "SMTP pool closed"))
+
+        for session in list(self.sessions):
+            session.idle = False
+            session.transport.loseConnection()
+
+        del self.idle[:]
+
+    def get_stats(self):
+        return {
+            'sessions': len(self.sessions),
+            'idle': len(self.idle),
+            'connecting': self.connecting,
+            'queue': len(self.queue),
+            'sent': self.sent,
+            'failed': self.failed,
+            'latency': int(self.latency * 1000 / self.sent) if self.sent else 0,
+            'backoff': int(self.get_backoff())
+        }
+
+
+SMTPPool = SMTPPoolClass()
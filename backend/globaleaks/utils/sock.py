@@ -1,8 +1,54 @@
+import ctypes
+import ctypes.util
+import errno
+import os
 import socket
+import sys
 
 from twisted.protocols import tls
 
 
+def _load_sendfile():
+    if not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        f = libc.sendfile64
+    except (AttributeError, OSError):
+        return None
+
+    f.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_int64), ctypes.c_size_t]
+    f.restype = ctypes.c_ssize_t
+
+    return f
+
+
+_sendfile = _load_sendfile()
+
+
+def sendfile_available():
+    return _sendfile is not None
+
+
+def sendfile(out_fd, in_fd, offset, count):
+    """
+    Copy data from a file to a non blocking socket with sendfile(2)
+
+    @return: the number of bytes sent, 0 at the end of the file or None
+        if the socket is not writable
+    """
+    ret = _sendfile(out_fd, in_fd, ctypes.byref(ctypes.c_int64(offset)), count)
+    if ret < 0:
+        err = ctypes.get_errno()
+        if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+            return None
+
+        raise OSError(err, os.strerror(err))
+
+    return ret
+
+
 def listen_tcp_on_sock(reactor, fd, factory):
     return reactor.adoptStreamPort(fd, socket.AF_INET, factory)
 
@@ -87,3 +87,49 @@ def get_localized_values(dictionary, obj, keys, language):
             dictionary.update({key: value})
 
     return dictionary
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("%s object does not support modifications" % self.__class__.__name__)
+
+
+class ReadOnlyDict(dict):
+    """
+    Dictionary that could be shared safely given that it raises TypeError
+    on any modification; its copies are the object itself like for tuples.
+    """
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class ReadOnlyList(list):
+    """
+    List that could be shared safely given that it raises TypeError on any
+    modification; its copies are the object itself like for tuples.
+    """
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = \
+        append = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze(obj):
+    """
+    @return: a read-only rendering of the dictionaries and lists nested in obj
+    """
+    if isinstance(obj, dict):
+        return ReadOnlyDict((key, freeze(value)) for key, value in obj.items())
+
+    if isinstance(obj, list):
+        return ReadOnlyList(freeze(value) for value in obj)
+
+    return obj
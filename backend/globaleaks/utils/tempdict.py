@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-
+import math
 from collections import OrderedDict
 
 from twisted.internet import reactor as _reactor
@@ -10,11 +10,27 @@ reactor = _reactor
 
 
 class TempDict(OrderedDict):
+    """
+    Dictionary whose items expire after a timeout since their last access
+
+    The deadlines are grouped in buckets of `resolution` seconds swept by a
+    single periodic tick, instead of scheduling a call on the reactor for
+    each item; an access updates only the deadline of the item, that is
+    moved to its new bucket when the previous one is swept.
+    """
     expireCallback = None
 
+    # granularity in seconds of the expiration of the items
+    resolution = 1
+
     def __init__(self, timeout=None, size_limit=None):
         self.timeout = timeout
         self.size_limit = size_limit
+        self._deadlines = {}
+        self._buckets = {}
+        self._cursor = 0
+        self._tick_call = None
+        self._tick_reactor = None
         OrderedDict.__init__(self)
 
         self._check_size_limit()
@@ -29,27 +45,36 @@ class TempDict(OrderedDict):
 
     def set(self, key, item):
         self._check_size_limit()
-        timeout = self.get_timeout()
-        item.expireCall = reactor.callLater(timeout, self._expire, key)
         self[key] = item
+        self._schedule(key)
 
     def get(self, key):
         if key in self:
-            if self[key].expireCall is not None:
-                self[key].expireCall.reset(self.get_timeout())
-
+            self._deadlines[key] = reactor.seconds() + self.get_timeout()
             return self[key]
 
         return None
 
+    def get_expiration(self, key):
+        """
+        @return: the time at which the item expires if not accessed meanwhile
+        """
+        return self._deadlines.get(key)
+
     def delete(self, key):
         if key in self:
-            item = self.pop(key)
-            item.expireCall.cancel() # pylint: disable=no-member
-            self._expire(key)
+            del self[key]
         else:
             raise Exception("Failed to delete %s from %s" % (key, self.__class__))
 
+    def __delitem__(self, key):
+        OrderedDict.__delitem__(self, key)
+        self._deadlines.pop(key, None)
+
+    def clear(self):
+        OrderedDict.clear(self)
+        self._deadlines.clear()
+        self._buckets.clear()
 
     def _check_size_limit(self):
         size_limit = self.get_size_limit()
@@ -59,6 +84,67 @@ class TempDict(OrderedDict):
                 k = next(self.iterkeys())
                 self.delete(k)
 
+    def _bucket(self, deadline):
+        return max(int(math.ceil(deadline / self.resolution)), self._cursor)
+
+    def _schedule(self, key):
+        now = reactor.seconds()
+
+        # the reactor is compared in order to allow UT override
+        if self._tick_reactor is not reactor:
+            self._cursor = int(now // self.resolution)
+            self._tick_call = None
+
+        deadline = now + self.get_timeout()
+        self._deadlines[key] = deadline
+        self._buckets.setdefault(self._bucket(deadline), []).append(key)
+
+        if self._tick_call is None:
+            self._cursor = max(self._cursor, int(now // self.resolution))
+            self._tick_reactor = reactor
+            self._tick_call = reactor.callLater((self._cursor + 1) * self.resolution - now, self._tick)
+
+    def _tick(self):
+        self._tick_call = None
+
+        now = reactor.seconds()
+        current = int(now // self.resolution)
+
+        if current - self._cursor > len(self._buckets):
+            due = sorted(b for b in self._buckets if b <= current)
+        else:
+            due = [b for b in range(self._cursor, current + 1) if b in self._buckets]
+
+        self._cursor = current + 1
+
+        expired = []
+        for b in due:
+            for key in self._buckets.pop(b):
+                deadline = self._deadlines.get(key)
+                if deadline is None:
+                    continue
+
+                if deadline > now:
+                    # the item has been accessed after its insertion in the bucket
+                    self._buckets.setdefault(self._bucket(deadline), []).append(key)
+                else:
+                    expired.append((deadline, key))
+
+        # the items are expired in the order of their deadlines
+        expired.sort(key=lambda x: x[0], reverse=True)
+
+        try:
+            while expired:
+                self._expire(expired.pop()[1])
+        finally:
+            # the items left by a failing callback are expired at the next tick
+            if expired:
+                self._buckets.setdefault(self._cursor, []).extend(key for _, key in expired)
+
+            if self._buckets:
+                self._tick_reactor = reactor
+                self._tick_call = reactor.callLater((current + 1) * self.resolution - now, self._tick)
+
     def _expire(self, key):
         if key in self:
             if self.expireCallback is not None:
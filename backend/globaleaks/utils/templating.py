@@ -10,11 +10,15 @@
 
 import collections
 import copy
+import re
+import threading
 
 from globaleaks import __version__
 from globaleaks import models
 from globaleaks.security import encrypt_message
 from globaleaks.rest import errors
+from globaleaks.rest.apicache import ApiCache
+from globaleaks.settings import Settings
 from globaleaks.utils.utility import ISO8601_to_pretty_str, ISO8601_to_day_str, \
     datetime_now, bytes_to_pretty_str
 
@@ -460,31 +464,163 @@ supported_template_types = {
 }
 
 
-class Templating(object):
-    def format_template(self, raw_template, data):
-        keyword_converter = supported_template_types[data['type']](data)
-        for _ in range(3):
-            count = 0
+def substitute_blanks(raw_template):
+    # remobe lines with only {Blank}
+    raw_template = raw_template.replace('\n{Blank}\n', '\n')
+
+    # remove remaining $Blank% tokens
+    return raw_template.replace('\n{Blank}\n', '')
+
+
+def expand_keywords(raw_template, keyword_converter):
+    """
+    Reference implementation of the expansion of the keywords of a template
+
+    The keywords are replaced in the order of the keyword_list of the
+    converter, and those contained in the values of the keywords are
+    expanded by the following passes.
+    """
+    for _ in range(3):
+        count = 0
+
+        for kw in keyword_converter.keyword_list:
+            if raw_template.count(kw):
+                # if %SomeKeyword% matches, call keyword_converter.SomeKeyword function
+                variable_content = getattr(keyword_converter, kw[1:-1])()
+                raw_template = raw_template.replace(kw, variable_content)
+
+                count += 1
+
+        raw_template = substitute_blanks(raw_template)
+
+        if count == 0:
+            # finally!
+            break
+
+    return raw_template
+
+
+class CompiledTemplate(object):
+    """
+    A template parsed in the list of its literals and keywords
+
+    The segments at the odd positions are the keywords, replaced at render
+    time by the values returned by the methods of the keyword class.
+    """
+    def __init__(self, raw_template, keyword_class):
+        self.raw_template = raw_template
+
+        keywords = []
+        for kw in keyword_class.keyword_list:
+            if kw not in keywords and kw in raw_template:
+                keywords.append(kw)
+
+        self.keywords = [(kw, getattr(keyword_class, kw[1:-1])) for kw in keywords]
+
+        if keywords:
+            self.segments = re.split('(%s)' % '|'.join(re.escape(kw) for kw in keywords), raw_template)
+        else:
+            self.segments = [raw_template]
+
+        self.keyword_regexp = re.compile('|'.join(re.escape(kw) for kw in set(keyword_class.keyword_list)))
+
+    def contains_keywords(self, text):
+        return '{' in text and self.keyword_regexp.search(text) is not None
 
-            for kw in keyword_converter.keyword_list:
-                if raw_template.count(kw):
-                    # if %SomeKeyword% matches, call keyword_converter.SomeKeyword function
-                    variable_content = getattr(keyword_converter, kw[1:-1])()
-                    raw_template = raw_template.replace(kw, variable_content)
+    def render(self, keyword_converter):
+        values = {kw: method(keyword_converter) for kw, method in self.keywords}
 
-                    count += 1
+        parts = list(self.segments)
+        for i in range(1, len(parts), 2):
+            parts[i] = values[parts[i]]
 
-            # remobe lines with only {Blank}
-            raw_template = raw_template.replace('\n{Blank}\n', '\n')
+        text = self.raw_template[:0].join(parts)
 
-            # remove remaining $Blank% tokens
-            raw_template = raw_template.replace('\n{Blank}\n', '')
+        # the keywords introduced by the values require the passes of the reference
+        # implementation, given that they are expanded depending on their order
+        if self.contains_keywords(text):
+            return expand_keywords(self.raw_template, keyword_converter)
 
-            if count == 0:
-                # finally!
-                break
+        if '{Blank}' in text:
+            text = substitute_blanks(text)
+
+        if self.keywords:
+            # the reference implementation does a last pass after the one expanding the keywords
+            if self.contains_keywords(text):
+                return expand_keywords(self.raw_template, keyword_converter)
+
+            if '{Blank}' in text:
+                text = substitute_blanks(text)
+
+        return text
+
+
+class TemplateCache(object):
+    """
+    LRU cache of the compiled templates keyed by text and type.
+
+    The cache is dropped when the notification settings are invalidated in
+    the API cache, so that the templates of the previous settings are not kept.
+    """
+    lock = threading.Lock()
+    entries = collections.OrderedDict()
+    generation = None
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    @classmethod
+    def get(cls, raw_template, template_type):
+        key = (raw_template, template_type)
+        generation = ApiCache.get_tags_generation({'notification'})
+
+        with cls.lock:
+            if generation != cls.generation:
+                cls.entries.clear()
+                cls.generation = generation
+
+            ret = cls.entries.pop(key, None)
+            if ret is not None:
+                cls.hits += 1
+                cls.entries[key] = ret
+                return ret
+
+            cls.misses += 1
+
+        ret = CompiledTemplate(raw_template, supported_template_types[template_type])
+
+        with cls.lock:
+            cls.entries[key] = ret
+
+            while len(cls.entries) > Settings.templates_cache_size:
+                cls.entries.popitem(last=False)
+                cls.evictions += 1
+
+        return ret
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.entries.clear()
+            cls.generation = None
+            cls.hits = cls.misses = cls.evictions = 0
+
+    @classmethod
+    def get_stats(cls):
+        return {
+            'entries': len(cls.entries),
+            'max_entries': Settings.templates_cache_size,
+            'hits': cls.hits,
+            'misses': cls.misses,
+            'evictions': cls.evictions
+        }
+
+
+class Templating(object):
+    def format_template(self, raw_template, data):
+        keyword_converter = supported_template_types[data['type']](data)
 
-        return raw_template
+        return TemplateCache.get(raw_template, data['type']).render(keyword_converter)
 
     def get_mail_subject_and_body(self, data):
         subject_template = ''
@@ -11,6 +11,9 @@ from twisted.internet.protocol import ProcessProtocol
 from globaleaks.utils.process import set_proc_title, set_pdeathsig
 from globaleaks.utils.utility import log
 
+# prefix of the lines by which the workers report their metrics to the supervisor
+STATS_PREFIX = 'STATS '
+
 
 class Process(object):
     cfg = {}
@@ -60,6 +63,9 @@ class Process(object):
         if self.cfg.get('debug', False):
             self._log('[%s:%d] %s\n' % (self.name, self.pid, m))
 
+    def send_stats(self, stats):
+        self._log('%s%s\n' % (STATS_PREFIX, json.dumps(stats)))
+
 
 class CfgFDProcProtocol(ProcessProtocol):
     def __init__(self, supervisor, cfg, cfg_fd=42):
@@ -71,6 +77,9 @@ class CfgFDProcProtocol(ProcessProtocol):
 
         self.startup_promise = defer.Deferred()
 
+        self.buf = ''
+        self.stats = {}
+
     def connectionMade(self):
         self.transport.writeToChild(self.cfg_fd, self.cfg)
         self.transport.closeChildFD(self.cfg_fd)
@@ -78,8 +87,13 @@ class CfgFDProcProtocol(ProcessProtocol):
         self.startup_promise.callback(None)
 
     def childDataReceived(self, childFD, data):
-        for line in data.split('\n'):
-            if line:
+        lines = (self.buf + data).split('\n')
+        self.buf = lines.pop()
+
+        for line in lines:
+            if line.startswith(STATS_PREFIX):
+                self.stats = json.loads(line[len(STATS_PREFIX):])
+            elif line:
                 log.debug(line)
 
     def processEnded(self, reason):
@@ -7,6 +7,7 @@ from sys import executable
 
 from globaleaks.models.config import PrivateFactory, load_tls_dict_list
 from globaleaks.orm import transact
+from globaleaks.settings import Settings
 from globaleaks.utils import tls
 from globaleaks.utils.utility import log, datetime_now, datetime_to_ISO8601
 from globaleaks.workers.process import HTTPSProcProtocol
@@ -38,6 +39,7 @@ class ProcessSupervisor(object):
         self.tls_cfg = {
           'proxy_ip': proxy_ip,
           'proxy_port': proxy_port,
+          'proxy_pool_size': Settings.https_proxy_pool_size,
           'debug': log.loglevel <= logging.DEBUG,
           'site_cfgs': [],
         }
@@ -176,6 +178,12 @@ class ProcessSupervisor(object):
 
         return s
 
+    def get_stats(self):
+        """
+        @return: the last metrics reported by each worker keyed by its pid
+        """
+        return {str(pp.transport.pid): pp.stats for pp in self.tls_process_pool if pp.transport is not None}
+
     def shutdown(self):
         log.debug('Starting shutdown of %d children', len(self.tls_process_pool))
 
@@ -13,7 +13,7 @@ from globaleaks.workers.process import Process
 from globaleaks.utils.sock import listen_tls_on_sock
 from globaleaks.utils.sni import SNIMap
 from globaleaks.utils.tls import TLSServerContextFactory, ChainValidator
-from globaleaks.utils.httpsproxy import HTTPStreamFactory
+from globaleaks.utils.httpsproxy import HTTPStreamFactory, PROXY_POOL_SIZE
 from globaleaks.utils.utility import datetime_now
 
 
@@ -28,12 +28,16 @@ class HTTPSProcess(Process):
     name = 'gl-https-proxy'
     ports = []
 
+    # seconds between the reports of the metrics of the proxy to the supervisor
+    stats_interval = 10
+    stats_loop = None
+
     def __init__(self, *args, **kwargs):
         super(HTTPSProcess, self).__init__(*args, **kwargs)
 
         proxy_url = 'http://' + self.cfg['proxy_ip'] + ':' + str(self.cfg['proxy_port'])
 
-        self.http_proxy_factory = HTTPStreamFactory(proxy_url)
+        self.http_proxy_factory = HTTPStreamFactory(proxy_url, self.cfg.get('proxy_pool_size', PROXY_POOL_SIZE))
 
         for site_cfg in self.cfg['site_cfgs']:
             cv = ChainValidator()
@@ -60,6 +64,12 @@ class HTTPSProcess(Process):
             self.ports.append(port)
             self.log("HTTPS proxy listening on %s" % port)
 
+        self.stats_loop = LoopingCall(self.report_stats)
+        self.stats_loop.start(self.stats_interval, now=False)
+
+    def report_stats(self):
+        self.send_stats(self.http_proxy_factory.get_stats())
+
     def sigusr1(self):
         self.shutdown()
         reactor.stop()
@@ -80,6 +90,9 @@ class HTTPSProcess(Process):
         reactor.callFromThread(_sigusr2)
 
     def shutdown(self):
+        if self.stats_loop is not None and self.stats_loop.running:
+            self.stats_loop.stop()
+
         for port in self.ports:
             port.connectionLost(None)
 
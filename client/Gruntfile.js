@@ -343,6 +343,17 @@ module.exports = function(grunt) {
     rm_rf('tmp');
   });
 
+  // The gzip variants of the assets are served by the backend as they are
+  grunt.registerTask('compressAssets', function() {
+    var zlib = require('zlib');
+
+    grunt.file.recurse('build/', function(absdir) {
+      if (/\.(css|html|js|json|svg|txt)$/.test(absdir)) {
+        fs.writeFileSync(absdir + '.gz', zlib.gzipSync(fs.readFileSync(absdir), {level: 9}));
+      }
+    });
+  });
+
   function str_escape (val) {
       if (typeof(val) !== "string") {
         return val;
@@ -913,7 +924,7 @@ module.exports = function(grunt) {
   grunt.registerTask('updateTranslations', ['fetchTranslations', 'makeAppData', 'verifyAppData']);
   // Run this to build your app. You should have run updateTranslations before you do so, if you have changed something in your translations.
   grunt.registerTask('build',
-    ['clean', 'copy:sources', 'copy:build', 'includeExternalFiles', 'ngtemplates', 'useminPrepare', 'concat', 'usemin', 'string-replace', 'cleanupWorkingDirectory']);
+    ['clean', 'copy:sources', 'copy:build', 'includeExternalFiles', 'ngtemplates', 'useminPrepare', 'concat', 'usemin', 'string-replace', 'cleanupWorkingDirectory', 'compressAssets']);
 
   grunt.registerTask('generateCoverallsJson', function() {
     var done = this.async();